@@ -6,8 +6,29 @@ from django.utils import timezone
 from django.db.models import Count, Q
 from .models import (
     Category, Client, Organization, TicketStatus, Ticket, TicketAudit, 
-    TicketComment, TicketAttachment, TicketTemplate, UserTelegramAccess, TelegramMessage, TelegramGroup, TelegramRoute
+    TicketComment, TicketAttachment, TicketTemplate, UserTelegramAccess, TelegramMessage, TelegramGroup, TelegramRoute,
+    TelegramOutboxMessage, TelegramMessageLink, Tag, ExportJob,
+    TelegramSenderClient,
 )
+from . import caches, search
+
+
+class SlaListFilter(admin.SimpleListFilter):
+    """Фильтр по SLA — диапазонный запрос по индексу (status_is_final, sla_deadline)"""
+    title = 'SLA'
+    parameter_name = 'sla'
+
+    def lookups(self, request, model_admin):
+        return [('overdue', 'Просрочено'), ('in_time', 'В срок'), ('final', 'Завершено')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'overdue':
+            return queryset.filter(Ticket.overdue_filter())
+        if self.value() == 'in_time':
+            return queryset.filter(status_is_final__in=[False], sla_deadline__gte=timezone.now())
+        if self.value() == 'final':
+            return queryset.filter(status_is_final=True)
+        return queryset
 
 
 @admin.register(Category)
@@ -151,12 +172,13 @@ class TicketAdmin(admin.ModelAdmin):
         'assigned_to', 'priority', 'created_at', 'sla_status', 'working_time_display'
     ]
     list_filter = [
-        'status', 'priority', 'category', 'organization', 'assigned_to', 'created_at',
+        'status', SlaListFilter, 'priority', 'category', 'organization', 'assigned_to', 'created_at',
         ('category__parent', admin.EmptyFieldListFilter),
     ]
+    # Поиск полнотекстовый (tickets/search.py); search_fields нужны для autocomplete
     search_fields = ['title', 'description', 'client__name', 'tags']
     list_editable = ['assigned_to', 'priority']
-    readonly_fields = ['created_by', 'updated_at', 'working_time_display', 'sla_status']
+    readonly_fields = ['created_by', 'updated_at', 'working_time_display', 'sla_deadline', 'sla_status']
     date_hierarchy = 'created_at'
     
     fieldsets = (
@@ -175,7 +197,7 @@ class TicketAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Дополнительно', {
-            'fields': ('external_message_id', 'created_by', 'updated_at', 'working_time_display', 'sla_status'),
+            'fields': ('external_message_id', 'created_by', 'updated_at', 'working_time_display', 'sla_deadline', 'sla_status'),
             'classes': ('collapse',)
         }),
     )
@@ -183,6 +205,9 @@ class TicketAdmin(admin.ModelAdmin):
     inlines = [TicketCommentInline, TicketAttachmentInline, TicketAuditInline]
     autocomplete_fields = ['client', 'organization', 'category', 'status', 'assigned_to']
     
+    def get_search_results(self, request, queryset, search_term):
+        return search.filter_tickets(queryset, search_term), False
+    
     def title_short(self, obj):
         return obj.title[:50] + '...' if len(obj.title) > 50 else obj.title
     title_short.short_description = 'Заголовок'
@@ -195,12 +220,10 @@ class TicketAdmin(admin.ModelAdmin):
     status_colored.short_description = 'Статус'
     
     def sla_status(self, obj):
+        # Считается по сохранённым sla_deadline и status_is_final, без обращения к категории и статусу
         if obj.is_overdue:
-            if obj.status.is_final:
-                return format_html('<span style="color: red;">⚠ Просрочено</span>')
-            else:
-                return format_html('<span style="color: red;">⚠ Просрочено</span>')
-        elif obj.status.is_final:
+            return format_html('<span style="color: red;">⚠ Просрочено</span>')
+        elif obj.status_is_final:
             return format_html('<span style="color: green;">✓ Завершено</span>')
         else:
             time_left = obj.time_to_deadline
@@ -243,7 +266,8 @@ class TicketAdmin(admin.ModelAdmin):
 class TicketCommentAdmin(admin.ModelAdmin):
     list_display = ['ticket', 'get_author_display', 'content_short', 'is_internal', 'created_at']
     list_filter = ['is_internal', 'author_type', 'created_at', 'author', 'author_client']
-    search_fields = ['content', 'ticket__title', 'author__username', 'author_client__name']
+    # Точные совпадения; текст комментария ищется полнотекстовым поиском
+    search_fields = ['=ticket__id', '=author__username']
     # Разрешаем редактировать дату/время комментария
     readonly_fields = []
     autocomplete_fields = ['ticket', 'author_client']
@@ -257,6 +281,12 @@ class TicketCommentAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        exact, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return exact, may_have_duplicates
+        return exact | search.filter_comments(queryset, search_term), may_have_duplicates
+    
     def get_author_display(self, obj):
         return obj.get_author_name()
     get_author_display.short_description = 'Автор'
@@ -348,10 +378,17 @@ class UserTelegramAccessAdmin(admin.ModelAdmin):
 class TelegramMessageAdmin(admin.ModelAdmin):
     list_display = ['message_date', 'chat_title', 'from_username', 'from_user_id', 'media_type', 'text_short', 'reply_to_message_id', 'linked_ticket']
     list_filter = ['media_type', 'chat_title']
-    search_fields = ['text', 'from_username', 'from_user_id', 'chat_title', 'chat_id', 'reply_to_message_id']
+    # Точные совпадения по ID; текст и отправитель ищутся полнотекстовым поиском
+    search_fields = ['=from_user_id', '=chat_id', '=reply_to_message_id']
     readonly_fields = ['message_id', 'reply_to_message_id', 'chat_id', 'chat_title', 'from_user_id', 'from_username', 'from_fullname', 'text', 'media_type', 'message_date', 'created_at', 'linked_ticket', 'linked_action', 'processed_at']
     ordering = ['-message_date']
 
+    def get_search_results(self, request, queryset, search_term):
+        exact, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return exact, may_have_duplicates
+        return exact | search.filter_messages(queryset, search_term), may_have_duplicates
+
     def text_short(self, obj):
         return obj.text[:80] + '...' if len(obj.text) > 80 else obj.text
     text_short.short_description = 'Текст'
@@ -359,14 +396,69 @@ class TelegramMessageAdmin(admin.ModelAdmin):
 
 @admin.register(TelegramGroup)
 class TelegramGroupAdmin(admin.ModelAdmin):
-    list_display = ['title', 'chat_id', 'is_blocked', 'write_to_stream', 'updated_at']
+    list_display = ['title', 'chat_id', 'is_blocked', 'write_to_stream', 'retention_days', 'updated_at']
     list_filter = ['is_blocked', 'write_to_stream']
     search_fields = ['title', 'chat_id']
 
+
+@admin.action(description='Повторить отправку')
+def retry_outbox_messages(modeladmin, request, queryset):
+    queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now(), locked_by='', locked_at=None)
+
+
+@admin.register(TelegramOutboxMessage)
+class TelegramOutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'action', 'status', 'chat_title', 'text_short', 'attempts', 'next_attempt_at', 'ticket', 'result_message_id']
+    list_filter = ['status', 'action', 'linked_action']
+    search_fields = ['chat_id', 'chat_title', 'text', 'last_error', 'result_message_id']
+    readonly_fields = ['locked_by', 'locked_at', 'result_message_id', 'created_at', 'sent_at']
+    raw_id_fields = ['ticket', 'comment', 'author']
+    actions = [retry_outbox_messages]
+
+    def text_short(self, obj):
+        return obj.text[:80] + '...' if len(obj.text) > 80 else obj.text
+    text_short.short_description = 'Текст'
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'ticket_count']
+    search_fields = ['name']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(ticket_count=Count('ticket_links'))
+
+    def ticket_count(self, obj):
+        return obj.ticket_count
+    ticket_count.short_description = 'Количество обращений'
+    ticket_count.admin_order_field = 'ticket_count'
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'format', 'status', 'progress', 'row_count', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'format']
+    raw_id_fields = ['created_by']
+    readonly_fields = ['progress', 'row_count', 'total_rows', 'file', 'error', 'created_at', 'started_at', 'finished_at', 'locked_by', 'locked_at']
+
+
+@admin.register(TelegramSenderClient)
+class TelegramSenderClientAdmin(admin.ModelAdmin):
+    list_display = ['from_user_id', 'client', 'created_at']
+    search_fields = ['from_user_id', 'client__name']
+    raw_id_fields = ['client']
+
+
+@admin.register(TelegramMessageLink)
+class TelegramMessageLinkAdmin(admin.ModelAdmin):
+    list_display = ['chat_id', 'message_id', 'ticket', 'comment', 'created_at']
+    search_fields = ['chat_id', 'message_id']
+    raw_id_fields = ['ticket', 'comment']
+
+
 # Кастомные действия для админки
 @admin.action(description='Взять в работу')
 def take_tickets(modeladmin, request, queryset):
-    working_status = TicketStatus.objects.filter(is_working=True).first()
+    working_status = caches.get_working_status()
     if working_status:
         for ticket in queryset:
             ticket.assigned_to = request.user
@@ -384,7 +476,7 @@ def take_tickets(modeladmin, request, queryset):
 
 @admin.action(description='Закрыть обращения')
 def close_tickets(modeladmin, request, queryset):
-    closed_status = TicketStatus.objects.filter(is_final=True).first()
+    closed_status = caches.get_final_status()
     if closed_status:
         for ticket in queryset:
             ticket.status = closed_status
@@ -0,0 +1,151 @@
+"""Холодный архив сообщений потока Telegram.
+
+Команда ``archive_stream`` переносит старые сообщения из TelegramMessage в
+сжатые сегменты на диске — gzip, одна JSON-строка на сообщение, файл на день
+(локальная дата сообщения) и запуск::
+
+    TELEGRAM_ARCHIVE_DIR/2024/05/2024-05-17.20240901030000.jsonl.gz
+
+Перенос идёт пачками через retention.purge(): пачка дописывается в сегменты,
+в ArchivedTelegramMessage записываются её ключи (chat_id, message_id) → сегмент
+(ключ уникален; повторно перенесённое сообщение ссылается на новый сегмент),
+и строки удаляются из горячей таблицы — индекс и удаление в одной транзакции.
+Так поток и его запросы работают с небольшой таблицей.
+
+find_messages() читает архивные сообщения по ключам (цитаты в обращении и в
+потоке, link_replies) и возвращает несохранённые объекты TelegramMessage.
+Прочитанные сегменты держатся в LRU-кэше процесса.
+"""
+import gzip
+import json
+import logging
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caches
+from .models import ArchivedTelegramMessage, TelegramMessage
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FIELDS = [
+    field.attname for field in TelegramMessage._meta.concrete_fields if field.get_internal_type() == 'DateTimeField'
+]
+
+# сегмент -> {(chat_id, message_id): строка}; сегменты не меняются, кроме дописываемых сейчас
+segment_cache = caches.LRUCache(3600, 16)
+
+
+def archive_root() -> Path:
+    return Path(getattr(settings, 'TELEGRAM_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'telegram'))
+
+
+class SegmentWriter:
+    """Приёмник для retention.purge(): раскладывает пачки по сегментам дней и пишет индекс"""
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else archive_root()
+        self.stamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        self.files = {}
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for fileobj in self.files.values():
+            fileobj.close()
+
+    @property
+    def segments(self) -> list:
+        return sorted(self.files)
+
+    def _segment(self, day) -> str:
+        name = f'{day:%Y}/{day:%m}/{day.isoformat()}.{self.stamp}.jsonl.gz'
+        if name not in self.files:
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.files[name] = gzip.open(path, 'at', encoding='utf-8')
+        return name
+
+    def write(self, rows):
+        entries = []
+        touched = set()
+        for row in rows:
+            segment = self._segment(timezone.localdate(row['message_date']))
+            line = {
+                key: value.isoformat() if key in DATETIME_FIELDS and value else value
+                for key, value in row.items()
+            }
+            self.files[segment].write(json.dumps(line, ensure_ascii=False))
+            self.files[segment].write('\n')
+            touched.add(segment)
+            entries.append(ArchivedTelegramMessage(
+                chat_id=row['chat_id'], message_id=row['message_id'], message_date=row['message_date'], segment=segment,
+            ))
+        # Индекс ссылается на сегмент — данные должны быть на диске до фиксации транзакции
+        for segment in touched:
+            self.files[segment].flush()
+        # Сообщение, уже перенесённое раньше (например, загруженное в поток повторно), указывает на новый сегмент
+        ArchivedTelegramMessage.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['chat_id', 'message_id'],
+            update_fields=['message_date', 'segment', 'archived_at'],
+        )
+        self.rows += len(entries)
+
+
+def _read_segment(segment: str) -> dict:
+    rows = {}
+    path = archive_root() / segment
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+            for line in fileobj:
+                row = json.loads(line)
+                rows[(row['chat_id'], row['message_id'])] = row
+    except FileNotFoundError:
+        logger.error(f"Archive segment is missing: {path}")
+    except EOFError:
+        # Сегмент ещё дописывается archive_stream — всё, что сброшено на диск, прочитано
+        pass
+    return rows
+
+
+def _segment_rows(segment: str, keys) -> dict:
+    rows = segment_cache.get(segment)
+    if rows is caches.MISSING or any(key not in rows for key in keys):
+        rows = _read_segment(segment)
+        segment_cache.set(segment, rows)
+    return rows
+
+
+def _message(row) -> TelegramMessage:
+    values = dict(row)
+    for key in DATETIME_FIELDS:
+        if values.get(key):
+            values[key] = parse_datetime(values[key])
+    return TelegramMessage(**values)
+
+
+def find_messages(message_ids, chat_id=None) -> list:
+    """Архивные сообщения с такими message_id (в чате chat_id, если задан) — несохранённые TelegramMessage по id"""
+    message_ids = {str(message_id) for message_id in message_ids if message_id}
+    if not message_ids:
+        return []
+    entries = ArchivedTelegramMessage.objects.filter(message_id__in=message_ids)
+    if chat_id:
+        entries = entries.filter(chat_id=str(chat_id))
+
+    keys_by_segment = defaultdict(set)
+    for entry_chat_id, entry_message_id, segment in entries.values_list('chat_id', 'message_id', 'segment'):
+        keys_by_segment[segment].add((entry_chat_id, entry_message_id))
+
+    found = []
+    for segment, keys in keys_by_segment.items():
+        rows = _segment_rows(segment, keys)
+        found.extend(_message(rows[key]) for key in keys if key in rows)
+    return sorted(found, key=lambda msg: msg.id or 0)
@@ -0,0 +1,129 @@
+"""Определение автора комментария по отправителю сообщения Telegram.
+
+Правило то же, что и при автосвязывании ответов в боте:
+- отправитель с разрешённым доступом (UserTelegramAccess) — пользователь системы;
+- иначе клиент, закреплённый за отправителем (TelegramSenderClient), или клиент
+  с external_id = ID отправителя (заведённый вручную или до появления таблицы);
+- иначе создаётся клиент «Неизвестный клиент (username)».
+
+``resolve_authors`` делает это для многих отправителей сразу: по одному запросу
+на допуски, закреплённых клиентов и клиентов по external_id и один bulk_create
+для новых клиентов. Результат запоминается в caches.author_cache (LRU + TTL),
+поэтому повторное сообщение того же отправителя не требует запросов.
+
+Новый клиент закрепляется за отправителем вставкой в TelegramSenderClient с
+ignore_conflicts: если параллельный процесс успел закрепить своего клиента,
+наш удаляется и используется его — дублей «Неизвестный клиент (...)» нет.
+
+Им пользуются бот (ответы на комментарии), автосвязывание ответов
+(``link_replies``) и действия потока сообщений (массовый комментарий,
+«в работу», «в ожидание»).
+"""
+from django.db import transaction
+
+from . import autocomplete, caches
+from .models import Client, TelegramSenderClient, UserTelegramAccess
+
+NO_AUTHOR = ('client', None, None)
+
+
+def unknown_client_name(user_id: str, username: str = '') -> str:
+    return f'Неизвестный клиент ({username or user_id})'
+
+
+def resolve_authors(senders: dict, create_missing: bool = True) -> dict:
+    """Определяет авторов для отправителей.
+
+    senders: {from_user_id: (username, fullname)}
+    Возвращает {from_user_id: (author_type, user, client)}. Отправители без ID
+    считаются клиентами без карточки: ('client', None, None).
+    """
+    result = {}
+    lookup = []
+    for user_id in senders:
+        author = caches.author_cache.get(user_id) if user_id else NO_AUTHOR
+        if author is caches.MISSING:
+            lookup.append(user_id)
+        else:
+            result[user_id] = author
+    if not lookup:
+        return result
+
+    found = {}
+    accesses = UserTelegramAccess.objects.filter(telegram_user_id__in=lookup, is_allowed=True).select_related('user')
+    for access in accesses:
+        found[access.telegram_user_id] = ('user', access.user, None)
+
+    client_ids = [user_id for user_id in lookup if user_id not in found]
+    if client_ids:
+        for user_id, client in sender_clients(client_ids, senders, create_missing).items():
+            found[user_id] = ('client', None, client)
+
+    for user_id, author in found.items():
+        caches.author_cache.set(user_id, author)
+    result.update(found)
+    for user_id in lookup:
+        result.setdefault(user_id, NO_AUTHOR)
+    return result
+
+
+def sender_clients(user_ids: list, senders: dict, create_missing: bool = True) -> dict:
+    """Клиенты отправителей {from_user_id: Client}; недостающие создаются (если create_missing)"""
+    clients = {
+        link.from_user_id: link.client
+        for link in TelegramSenderClient.objects.filter(from_user_id__in=user_ids).select_related('client')
+    }
+    rest = [user_id for user_id in user_ids if user_id not in clients]
+    if not rest:
+        return clients
+
+    # Клиенты с external_id, ещё не закреплённые за отправителем
+    existing = {}
+    for client in Client.objects.filter(external_id__in=rest).order_by('id'):
+        existing.setdefault(client.external_id, client)
+    if not create_missing:
+        clients.update(existing)
+        return clients
+
+    with transaction.atomic():
+        created = Client.objects.bulk_create([
+            Client(
+                name=unknown_client_name(user_id, senders[user_id][0]),
+                external_id=user_id,
+                contact_person=senders[user_id][1] or senders[user_id][0] or 'Не указано',
+            )
+            for user_id in rest
+            if user_id not in existing
+        ])
+        candidates = dict(existing, **{client.external_id: client for client in created})
+        TelegramSenderClient.objects.bulk_create(
+            [TelegramSenderClient(from_user_id=user_id, client=client) for user_id, client in candidates.items()],
+            ignore_conflicts=True,
+        )
+        owners = dict(
+            TelegramSenderClient.objects.filter(from_user_id__in=rest).values_list('from_user_id', 'client_id')
+        )
+        # Параллельный процесс успел закрепить своего клиента — наш лишний
+        extra = {client.pk for client in created if owners.get(client.external_id) != client.pk}
+        if extra:
+            Client.objects.filter(pk__in=extra).delete()
+
+    by_pk = {client.pk: client for client in candidates.values() if client.pk not in extra}
+    by_pk.update(Client.objects.in_bulk([pk for pk in owners.values() if pk not in by_pk]))
+    for user_id in rest:
+        if owners.get(user_id) in by_pk:
+            clients[user_id] = by_pk[owners[user_id]]
+
+    # bulk_create не вызывает сигналы — добавляем новых клиентов в автокомплит сами
+    autocomplete.index('client', [client for client in created if client.pk not in extra])
+    return clients
+
+
+def message_senders(messages) -> dict:
+    """Отправители сообщений TelegramMessage в формате аргумента resolve_authors"""
+    return {msg.from_user_id: (msg.from_username, msg.from_fullname) for msg in messages}
+
+
+def resolve_message_author(msg) -> tuple:
+    """(author_type, user, client) для автора одного сообщения"""
+    return resolve_authors(message_senders([msg])).get(msg.from_user_id, NO_AUTHOR)
@@ -0,0 +1,231 @@
+"""Индекс подсказок автокомплита.
+
+Слова из названий клиентов, организаций, категорий, групп Telegram и
+пользователей хранятся в AutocompleteEntry в нормализованном виде (нижний
+регистр, ё → е). Запрос разбивается на слова; каждое слово ищется как префикс
+диапазонным запросом ``token >= слово AND token < слово + U+10FFFF`` по индексу
+— без LIKE/REGEXP по каждой строке таблицы объектов. Объект подходит, если
+для каждого слова запроса у него есть слово с таким началом.
+
+Ранжирование стабильное: точное совпадение слова, затем позиция слова
+(начало названия выше, слова доп. полей ниже), затем само слово и id.
+``search`` читает строки индекса сразу в этом порядке и останавливается на
+limit подходящих объектах (см. его описание).
+
+Индекс поддерживается сигналами (tickets/signals.py) и вызовами index()
+после bulk_create/bulk_update. Полная перестройка — ``rebuild_autocomplete``.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import AutocompleteEntry
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+RANGE_END = '\U0010ffff'
+
+MAX_QUERY_LENGTH = 64
+MAX_QUERY_WORDS = 5
+TOKEN_LENGTH = AutocompleteEntry._meta.get_field('token').max_length
+
+# Позиции слов доп. полей (контакт, телефон, описание и т.п.) и связанных объектов
+EXTRA_FIELD_POSITION = 100
+RELATED_POSITION = 200
+MAX_POSITION = 32767
+
+
+def normalize(text: str) -> str:
+    return (text or '').lower().replace('ё', 'е')
+
+
+def words(text: str) -> list:
+    return WORD_RE.findall(normalize(text))
+
+
+def _client_fields(client):
+    digits = ''.join(ch for ch in client.phone or '' if ch.isdigit())
+    return [
+        (client.name, 0),
+        (client.contact_person, EXTRA_FIELD_POSITION),
+        (client.phone, EXTRA_FIELD_POSITION),
+        (digits, EXTRA_FIELD_POSITION),
+        (client.email, EXTRA_FIELD_POSITION),
+        (client.organization.name if client.organization_id else '', RELATED_POSITION),
+    ]
+
+
+def _organization_fields(organization):
+    return [(organization.name, 0), (organization.comment, EXTRA_FIELD_POSITION)]
+
+
+def _category_fields(category):
+    return [(category.name, 0), (category.description, EXTRA_FIELD_POSITION)]
+
+
+def _group_fields(group):
+    return [(group.title, 0), (group.chat_id, EXTRA_FIELD_POSITION)]
+
+
+def _user_fields(user):
+    return [
+        (user.first_name, 0),
+        (user.last_name, 0),
+        (user.username, 0),
+        (user.email, EXTRA_FIELD_POSITION),
+    ]
+
+
+# kind → (модель, поля для индекса, select_related)
+SOURCES = {
+    'client': ('tickets.Client', _client_fields, ('organization',)),
+    'organization': ('tickets.Organization', _organization_fields, ()),
+    'category': ('tickets.Category', _category_fields, ()),
+    'group': ('tickets.TelegramGroup', _group_fields, ()),
+    'user': ('auth.User', _user_fields, ()),
+}
+
+
+def tokens_for(kind: str, obj) -> dict:
+    """{слово: позиция} объекта (для повторяющегося слова — минимальная позиция)"""
+    result = {}
+    for text, base in SOURCES[kind][1](obj):
+        for offset, word in enumerate(words(text)):
+            word = word[:TOKEN_LENGTH]
+            position = min(base + offset, MAX_POSITION)
+            if position < result.get(word, MAX_POSITION + 1):
+                result[word] = position
+    return result
+
+
+def _entries(kind, objs, Entry=AutocompleteEntry):
+    return [
+        Entry(kind=kind, object_id=obj.pk, token=token, position=position)
+        for obj in objs
+        for token, position in tokens_for(kind, obj).items()
+    ]
+
+
+def index(kind: str, objs):
+    """Переиндексирует объекты одного вида"""
+    objs = [obj for obj in objs if obj.pk]
+    if not objs:
+        return
+    with transaction.atomic():
+        AutocompleteEntry.objects.filter(kind=kind, object_id__in=[obj.pk for obj in objs]).delete()
+        AutocompleteEntry.objects.bulk_create(_entries(kind, objs))
+
+
+def index_queryset(kind: str, qs, chunk_size=1000):
+    """Переиндексирует объекты из qs пачками"""
+    related = SOURCES[kind][2]
+    batch = []
+    for obj in qs.select_related(*related).order_by('pk').iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) >= chunk_size:
+            index(kind, batch)
+            batch = []
+    index(kind, batch)
+
+
+def remove(kind: str, pk):
+    AutocompleteEntry.objects.filter(kind=kind, object_id=pk).delete()
+
+
+def _prefix(qs, word):
+    return qs.filter(token__gte=word, token__lt=word + RANGE_END)
+
+
+def _query_words(query: str) -> list:
+    return [word[:TOKEN_LENGTH] for word in words((query or '')[:MAX_QUERY_LENGTH])][:MAX_QUERY_WORDS]
+
+
+def filter_queryset(kind: str, qs, query: str):
+    """Объекты qs, у которых для каждого слова запроса есть слово с таким началом"""
+    query_words = _query_words(query)
+    if not query_words:
+        return qs if not (query or '').strip() else qs.none()
+    entries = AutocompleteEntry.objects.filter(kind=kind)
+    for word in query_words:
+        qs = qs.filter(pk__in=_prefix(entries, word).values('object_id'))
+    return qs
+
+
+def _having_words(kind: str, entries, words_needed):
+    """entries, у объектов которых есть слова с началом из words_needed (проверка по индексу (kind, object_id, token))"""
+    for word in words_needed:
+        entries = entries.filter(Exists(
+            _prefix(AutocompleteEntry.objects.filter(kind=kind, object_id=OuterRef('object_id')), word)
+        ))
+    return entries
+
+
+def search(kind: str, qs, query: str, limit: int = 10) -> list:
+    """До limit объектов qs по запросу, в порядке релевантности.
+
+    Порядок: точное совпадение самого длинного слова запроса, позиция слова,
+    само слово, id. Строки индекса этого слова читаются в таком порядке,
+    остальные слова и qs проверяются для каждой строки по индексу, и чтение
+    останавливается, как только набрано limit объектов:
+    1. token = слово — по индексу (kind, token, position, object_id);
+    2. token с этим началом — по позициям по возрастанию, каждая по индексу
+       (kind, position, token, object_id).
+    Объекты загружаются только для найденных id.
+    """
+    query_words = _query_words(query)
+    if not query_words:
+        return []
+
+    entries = AutocompleteEntry.objects.filter(kind=kind)
+    # Слово, которого нет ни у одного объекта, — ответ пустой без перебора строк остальных слов
+    if not all(_prefix(entries, word).exists() for word in set(query_words)):
+        return []
+
+    driver = max(query_words, key=len)
+    candidates = _having_words(kind, entries, [word for word in dict.fromkeys(query_words) if word != driver])
+    candidates = candidates.filter(Exists(qs.order_by().filter(pk=OuterRef('object_id'))))
+
+    found = []
+
+    def take(object_ids):
+        for object_id in object_ids:
+            if object_id not in found and len(found) < limit:
+                found.append(object_id)
+
+    take(candidates.filter(token=driver).order_by('position', 'object_id').values_list('object_id', flat=True)[:limit])
+
+    prefixed = candidates.filter(token__gt=driver, token__lt=driver + RANGE_END)
+    position = -1
+    while len(found) < limit:
+        position = entries.filter(position__gt=position).order_by('position').values_list('position', flat=True).first()
+        if position is None:
+            break
+        # Уже найденные объекты могут встретиться снова — берём строк с запасом на них
+        take(prefixed.filter(position=position).order_by('token', 'object_id').values_list('object_id', flat=True)[:limit])
+
+    objects = qs.in_bulk(found)
+    return [objects[object_id] for object_id in found if object_id in objects]
+
+
+def rebuild(get_model, kinds=None, chunk_size=2000, progress=None):
+    """Заполняет индекс заново. get_model(label) — apps.get_model (подходит и для миграций)"""
+    Entry = get_model('tickets.AutocompleteEntry')
+    total = 0
+    for kind in kinds or SOURCES:
+        label, _, related = SOURCES[kind]
+        Entry.objects.filter(kind=kind).delete()
+        batch = []
+        objs = get_model(label).objects.select_related(*related).order_by('pk')
+        for obj in objs.iterator(chunk_size=chunk_size):
+            batch.extend(_entries(kind, [obj], Entry))
+            if len(batch) >= chunk_size:
+                Entry.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+                if progress:
+                    progress(kind, total)
+        Entry.objects.bulk_create(batch)
+        total += len(batch)
+        if progress:
+            progress(kind, total)
+    return total
@@ -0,0 +1,232 @@
+"""Внутрипроцессные кэши редко меняющихся справочников.
+
+- группы Telegram и допуски к боту;
+- авторы сообщений по ID отправителя (author_cache, см. tickets/authors.py) —
+  LRU, не больше TELEGRAM_AUTHOR_CACHE_SIZE записей;
+- справочные данные обращений: статусы, категории, категория по умолчанию
+  и «Неизвестный клиент» (get_status(), get_default_category(), get_unknown_client() и т. д.).
+  Статусы и категории загружаются целиком одним запросом и отдаются из памяти,
+  поэтому повторные обращения к ним в одном запросе и между запросами бесплатны.
+  Возвращаемые объекты общие для всех запросов процесса — их нельзя менять.
+
+Записи живут не дольше TTL. В своём процессе кэш сбрасывается сигналами
+post_save/post_delete (см. tickets/signals.py); изменения, сделанные другим
+процессом (например, в админке при запущенном боте), подхватываются не позже
+чем через TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Category, Client, TelegramGroup, TicketStatus, UserTelegramAccess
+
+MISSING = object()
+
+
+class TTLCache:
+    """Простой словарь с ограниченным временем жизни записей"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                self._data.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=MISSING):
+        """Сбрасывает одну запись или, без аргумента, весь кэш"""
+        with self._lock:
+            if key is MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+class LRUCache(TTLCache):
+    """TTLCache с ограниченным числом записей: при переполнении вытесняются давно не читавшиеся"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        value = super().get(key, MISSING)
+        if value is MISSING:
+            return default
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+def _ttl() -> float:
+    return float(getattr(settings, 'TELEGRAM_BOT_CACHE_TTL', 60))
+
+
+# chat_id -> TelegramGroup
+group_cache = TTLCache(_ttl())
+# telegram_user_id -> User с разрешённым доступом или None
+access_cache = TTLCache(_ttl())
+# from_user_id -> (author_type, user, client)
+author_cache = LRUCache(_ttl(), int(getattr(settings, 'TELEGRAM_AUTHOR_CACHE_SIZE', 10000)))
+# 'statuses' -> [TicketStatus], 'categories' -> [Category], 'unknown_client' -> Client
+reference_cache = TTLCache(_ttl())
+
+UNKNOWN_CLIENT_NAME = 'Неизвестный клиент'
+DEFAULT_CATEGORY_NAME = 'Обращения от поставщиков'
+WORKING_STATUS_NAME = 'В работе'
+WAITING_STATUS_NAME = 'Ожидает ответа'
+RESOLVED_STATUS_NAME = 'Решено'
+
+
+def get_access_user(telegram_user_id: str):
+    """Пользователь системы, которому разрешён доступ к боту с этого Telegram ID, иначе None"""
+    telegram_user_id = str(telegram_user_id)
+    user = access_cache.get(telegram_user_id)
+    if user is MISSING:
+        access = UserTelegramAccess.objects.filter(
+            telegram_user_id=telegram_user_id, is_allowed=True
+        ).select_related('user').first()
+        user = access.user if access else None
+        access_cache.set(telegram_user_id, user)
+    return user
+
+
+def get_groups(chat_ids) -> dict:
+    """Группы по chat_id: из кэша, недостающие — одним запросом. Неизвестных групп в ответе нет"""
+    groups = {}
+    missing = []
+    for chat_id in chat_ids:
+        grp = group_cache.get(chat_id)
+        if grp is MISSING:
+            missing.append(chat_id)
+        else:
+            groups[chat_id] = grp
+    if missing:
+        for grp in TelegramGroup.objects.filter(chat_id__in=missing):
+            group_cache.set(grp.chat_id, grp)
+            groups[grp.chat_id] = grp
+    return groups
+
+
+def remember_groups(groups):
+    """Кладёт в кэш группы, созданные или изменённые без сигналов (bulk_create/bulk_update)"""
+    for grp in groups:
+        group_cache.set(grp.chat_id, grp)
+
+
+# --- Справочные данные обращений ---------------------------------------------
+
+def get_statuses() -> list:
+    """Все статусы в порядке отображения (order, name)"""
+    statuses = reference_cache.get('statuses')
+    if statuses is MISSING:
+        statuses = list(TicketStatus.objects.order_by('order', 'name'))
+        reference_cache.set('statuses', statuses)
+    return statuses
+
+
+def get_status(name: str):
+    """Статус с таким названием или None"""
+    return next((status for status in get_statuses() if status.name == name), None)
+
+
+def get_status_by_id(status_id):
+    """Статус по id или None"""
+    return next((status for status in get_statuses() if status.id == status_id), None)
+
+
+def get_initial_status():
+    """Статус новых обращений: первый нефинальный (или просто первый)"""
+    statuses = get_statuses()
+    return next((status for status in statuses if not status.is_final), statuses[0] if statuses else None)
+
+
+def get_working_status(exclude_waiting: bool = False):
+    """Первый статус «в работе»; exclude_waiting — не считая «Ожидает ответа»"""
+    return next((
+        status for status in get_statuses()
+        if status.is_working and not (exclude_waiting and status.name == WAITING_STATUS_NAME)
+    ), None)
+
+
+def get_final_status():
+    """Первый финальный статус"""
+    return next((status for status in get_statuses() if status.is_final), None)
+
+
+def get_resolved_status():
+    """Статус «Решено», а если его нет — первый финальный"""
+    return get_status(RESOLVED_STATUS_NAME) or get_final_status()
+
+
+def get_categories() -> list:
+    """Все категории (с родителями) в порядке Category.Meta.ordering"""
+    categories = reference_cache.get('categories')
+    if categories is MISSING:
+        categories = list(Category.objects.select_related('parent'))
+        reference_cache.set('categories', categories)
+    return categories
+
+
+def get_sla_categories(limit: int = 6) -> list:
+    """Активные категории с самым коротким SLA (подсказка на форме обращения)"""
+    active = [category for category in get_categories() if category.is_active]
+    return sorted(active, key=lambda category: (category.sla_hours, category.name))[:limit]
+
+
+def get_category(category_id):
+    """Категория по id (число или строка из запроса) или None"""
+    if not str(category_id or '').isdigit():
+        return None
+    category_id = int(category_id)
+    return next((category for category in get_categories() if category.id == category_id), None)
+
+
+def get_default_category():
+    """Категория обращений, для которых не нашлось маршрута: «Обращения от поставщиков» или первая"""
+    categories = get_categories()
+    name = DEFAULT_CATEGORY_NAME.casefold()
+    return next(
+        (category for category in categories if category.parent_id is None and name in category.name.casefold()),
+        categories[0] if categories else None,
+    )
+
+
+def get_unknown_client():
+    """Клиент «Неизвестный клиент» (создаётся при первом обращении)"""
+    client = reference_cache.get('unknown_client')
+    if client is MISSING:
+        client = Client.objects.filter(name=UNKNOWN_CLIENT_NAME).order_by('pk').first()
+        if not client:
+            client = Client.objects.create(name=UNKNOWN_CLIENT_NAME)
+        reference_cache.set('unknown_client', client)
+    return client
+
+
+def invalidate_references(key=MISSING):
+    """Сбрасывает справочные данные: 'statuses', 'categories', 'unknown_client' или все"""
+    reference_cache.invalidate(key)
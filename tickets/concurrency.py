@@ -0,0 +1,97 @@
+"""Параллельная обработка обновлений Telegram с сохранением порядка внутри чата.
+
+``PerChatUpdateProcessor`` подключается к приложению бота через
+``ApplicationBuilder.concurrent_updates``. Обновления разных чатов
+обрабатываются одновременно (не более ``concurrency``), обновления
+одного чата — строго по очереди, в порядке поступления. Синхронные обращения
+к БД из обработчиков выполняются в собственном ограниченном пуле потоков
+(``sync_to_async`` процессора), а не в единственном потоке thread_sensitive.
+
+Потоки пула живут всё время работы бота, а Django закрывает устаревшие
+соединения только на границах HTTP-запроса. Поэтому каждый вызов в пуле
+обрамлён ``close_old_connections()``: соединение, оборванное или старше
+CONN_MAX_AGE, не переживает вызов.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def with_fresh_connections(func):
+    """func с close_old_connections() до и после вызова — как на границах HTTP-запроса"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик обновлений: параллельно между чатами, последовательно внутри чата"""
+
+    def __init__(self, max_concurrent_updates: int, db_threads: int = None, max_pending_updates: int = None):
+        # Базовый класс ограничивает число принятых в работу обновлений, включая ждущие своей
+        # очереди в чате; собственный семафор (do_process_update) — число выполняемых одновременно.
+        # Иначе несколько обновлений одного чата заняли бы все слоты, ожидая друг друга.
+        super().__init__(max_pending_updates or max_concurrent_updates * 32)
+        self.concurrency = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._db_threads = db_threads or max_concurrent_updates
+        self._executor = None
+        self._chat_locks = {}
+        self._chat_waiters = {}
+
+    @staticmethod
+    def chat_key(update):
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                # Больше никто не ждёт этот чат — блокировка не нужна
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def initialize(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._db_threads, thread_name_prefix='bot-db')
+            logger.info(f"Update processor started: concurrency={self.concurrency}, db_threads={self._db_threads}")
+
+    async def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def sync_to_async(self, func):
+        """sync_to_async в пуле потоков процессора (до initialize — обычный thread_sensitive)"""
+        if self._executor is None:
+            return sync_to_async(func)
+        return sync_to_async(with_fresh_connections(func), thread_sensitive=False, executor=self._executor)
@@ -0,0 +1,74 @@
+"""Фильтры по периоду в локальных датах.
+
+Фильтры «с даты — по дату» на страницах (поток, аналитика, выгрузки) заданы
+в локальных датах (TIME_ZONE). Условие ``created_at__date__gte`` оборачивает
+колонку в функцию даты, и индекс по ней не используется — каждый запрос читает
+всю таблицу. Поэтому даты переводятся в полуоткрытый интервал datetime с
+часовым поясом:
+
+    [начало date_from, начало дня после date_to)
+
+и фильтр сравнивает саму колонку: ``field >= start AND field < end``.
+"""
+from datetime import date, datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def parse_date(value):
+    """date из 'ГГГГ-ММ-ДД' (или date); пустое или неверное значение — None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def day_start(day):
+    """Начало локального дня — aware datetime"""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def day_range(date_from=None, date_to=None):
+    """(start, end): [начало date_from, начало дня после date_to); None — граница не задана"""
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    start = day_start(date_from) if date_from else None
+    end = day_start(date_to + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def range_q(field: str, start=None, end=None) -> Q:
+    """Q(field >= start, field < end) для заданных границ"""
+    conditions = {}
+    if start:
+        conditions[f'{field}__gte'] = start
+    if end:
+        conditions[f'{field}__lt'] = end
+    return Q(**conditions)
+
+
+def filter_dates(queryset, field: str, date_from=None, date_to=None):
+    """queryset с field в локальных днях date_from..date_to включительно"""
+    return queryset.filter(range_q(field, *day_range(date_from, date_to)))
+
+
+def days_q(field: str, days) -> Q:
+    """Q для набора локальных дней: подряд идущие дни объединяются в один интервал"""
+    spans = []
+    for day in sorted(set(filter(None, map(parse_date, days)))):
+        if spans and spans[-1][1] + timedelta(days=1) == day:
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    if not spans:
+        return Q(pk__in=[])
+    condition = Q()
+    for first, last in spans:
+        condition |= range_q(field, *day_range(first, last))
+    return condition
@@ -0,0 +1,131 @@
+"""Фоновые выгрузки обращений.
+
+Страница аналитики ставит задание (``enqueue``) и сразу перенаправляет на его
+страницу, которая опрашивает прогресс. Команда ``export_worker`` забирает
+задания (``claim``) и выполняет ``run`` в пуле процессов: файл пишется в
+MEDIA_ROOT/exports/ под временным именем и переименовывается, когда готов.
+
+Во время выгрузки обработчик обновляет прогресс и locked_at; задание, по
+которому отметок нет дольше lease_seconds (обработчик упал), возвращается
+в очередь.
+"""
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import exports
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'exports'
+# Как часто записывать прогресс, сек
+PROGRESS_INTERVAL = 1.0
+
+
+def enqueue(user, export_format: str, filters: dict) -> ExportJob:
+    if export_format not in exports.FORMATS:
+        export_format = 'xlsx'
+    return ExportJob.objects.create(created_by=user, format=export_format, filters=filters)
+
+
+def claim(limit: int, lease_seconds: int = 600) -> list:
+    """Забирает до limit заданий из очереди; возвращает их id"""
+    now = timezone.now()
+    ExportJob.objects.filter(
+        status='running',
+        locked_at__lt=now - timezone.timedelta(seconds=lease_seconds),
+    ).update(status='pending', locked_by='', locked_at=None, progress=0, row_count=0)
+
+    token = uuid.uuid4().hex
+    ids = list(ExportJob.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    ExportJob.objects.filter(id__in=ids, status='pending').update(
+        status='running', locked_by=token, locked_at=now, started_at=now, error='',
+    )
+    return list(ExportJob.objects.filter(locked_by=token, status='running').order_by('id').values_list('id', flat=True))
+
+
+def _artifact_name(job) -> str:
+    extension, _ = exports.FORMATS[job.format]
+    timestamp = timezone.localtime(job.created_at).strftime('%Y%m%d%H%M%S')
+    return f'{EXPORT_DIR}/analytics_export_{job.id}_{timestamp}{extension}'
+
+
+def run(job_id: int) -> str:
+    """Выполняет задание (в процессе пула export_worker). Возвращает итоговый статус"""
+    job = ExportJob.objects.get(pk=job_id)
+    jobs = ExportJob.objects.filter(pk=job_id, locked_by=job.locked_by)
+    name = _artifact_name(job)
+    path = Path(settings.MEDIA_ROOT) / name
+    partial = path.with_name(path.name + '.part')
+
+    try:
+        total = exports.filter_tickets(job.filters).count()
+        jobs.update(total_rows=total, locked_at=timezone.now())
+
+        last_report = time.monotonic()
+
+        def progress(rows):
+            nonlocal last_report
+            if time.monotonic() - last_report < PROGRESS_INTERVAL:
+                return
+            last_report = time.monotonic()
+            jobs.update(
+                row_count=rows,
+                progress=min(99, rows * 100 // total) if total else 0,
+                locked_at=timezone.now(),
+            )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(partial, 'wb') as fileobj:
+            rows = exports.write_export(fileobj, job.format, job.filters, progress)
+        os.replace(partial, path)
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}", exc_info=True)
+        partial.unlink(missing_ok=True)
+        jobs.update(status='failed', error=f'{type(e).__name__}: {e}', finished_at=timezone.now(), locked_by='')
+        return 'failed'
+
+    jobs.update(
+        status='done', progress=100, row_count=rows, file=name, finished_at=timezone.now(), locked_by='',
+    )
+    return 'done'
+
+
+def mark_failed(job_id: int, error: str):
+    ExportJob.objects.filter(pk=job_id, status='running').update(
+        status='failed', error=error, finished_at=timezone.now(), locked_by='',
+    )
+
+
+def purge_expired(days: int) -> int:
+    """Удаляет задания старше days дней вместе с файлами"""
+    expired = ExportJob.objects.filter(created_at__lt=timezone.now() - timezone.timedelta(days=days)).exclude(status='running')
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def as_dict(job) -> dict:
+    """Состояние задания для опроса со страницы"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'row_count': job.row_count,
+        'total_rows': job.total_rows,
+        'error': job.error,
+        'ready': job.status == 'done' and bool(job.file),
+    }
@@ -0,0 +1,391 @@
+"""Выгрузка обращений (XLSX, CSV, колоночный ZIP) с постоянным расходом памяти.
+
+Строки читаются из базы пачками (values_list + iterator) и сразу пишутся
+XML-потоком в zip-архив книги (write_xlsx) — в памяти не бывает больше пачки
+строк, сколько бы их ни было. Ширина колонок оценивается по первым
+WIDTH_SAMPLE_ROWS строкам (в XLSX она задаётся до данных листа).
+Готовый файл сохраняется в MEDIA_ROOT и отдаётся через FileResponse кусками.
+
+Книга минимальная: строки — inline-строки, числа — числа, без стилей и формул.
+openpyxl (даже в режиме write_only без lxml) пишет 200 тыс. строк в разы медленнее.
+
+Колоночный формат — ZIP, в котором каждая колонка лежит отдельным файлом
+(одно JSON-значение на строку) и schema.json с именами, типами и числом строк:
+нужные колонки читаются без разбора остальных и хорошо сжимаются. Это замена
+Parquet без зависимости от pyarrow.
+
+Большие выгрузки строятся в фоне (tickets/export_jobs.py, ``export_worker``).
+"""
+import csv
+import io
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+from contextlib import ExitStack
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import date_ranges, rollups
+from .models import Ticket
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CHUNK_SIZE = 2000
+WIDTH_SAMPLE_ROWS = 500
+MIN_WIDTH = 10
+MAX_WIDTH = 60
+# Столько строк листа собирается в один кусок перед записью в архив
+WRITE_BATCH_ROWS = 500
+
+# Управляющие символы, недопустимые в XML (встречаются в текстах из Telegram)
+ILLEGAL_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def format_datetime(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y %H:%M') if value else ''
+
+
+def _assignee_name(first_name, last_name, username):
+    full_name = f'{first_name or ""} {last_name or ""}'.strip()
+    return full_name or username or ''
+
+
+# (имя колонки, заголовок, поля values_list, преобразование значений полей в ячейку)
+TICKET_COLUMNS = [
+    ('id', 'ID', ('id',), None),
+    ('title', 'Заголовок', ('title',), None),
+    ('client', 'Клиент', ('client__name',), None),
+    ('contact_person', 'Контактное лицо', ('client__contact_person',), None),
+    ('organization', 'Организация', ('organization__name',), None),
+    ('category', 'Категория', ('category__name',), None),
+    ('status', 'Статус', ('status__name',), None),
+    ('assigned_to', 'Исполнитель', ('assigned_to__first_name', 'assigned_to__last_name', 'assigned_to__username'), _assignee_name),
+    ('created_at', 'Создано', ('created_at',), format_datetime),
+    ('resolved_at', 'Дата выполнения', ('resolved_at',), format_datetime),
+    ('tags', 'Теги', ('tags',), None),
+]
+
+
+def ticket_headers():
+    return [header for _, header, _, _ in TICKET_COLUMNS]
+
+
+def ticket_column_names():
+    return [name for name, _, _, _ in TICKET_COLUMNS]
+
+
+def ticket_rows(tickets, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки обращений (новые сверху); в памяти одновременно не больше chunk_size строк"""
+    fields = [field for _, _, column_fields, _ in TICKET_COLUMNS for field in column_fields]
+    for values in tickets.order_by('-created_at', '-id').values_list(*fields).iterator(chunk_size=chunk_size):
+        row = []
+        position = 0
+        for _, _, column_fields, convert in TICKET_COLUMNS:
+            column_values = values[position:position + len(column_fields)]
+            position += len(column_fields)
+            value = convert(*column_values) if convert else column_values[0]
+            row.append('' if value is None else value)
+        yield row
+
+
+# --- Фильтры страницы аналитики ---------------------------------------------
+
+def analytics_filters(params) -> dict:
+    """Фильтры выгрузки из параметров страницы аналитики (GET или POST)"""
+    def first_non_empty(param_name):
+        for value in params.getlist(param_name):
+            if value not in (None, '', 'None', 'null', 'NULL'):
+                return value
+        return ''
+
+    return {
+        'category_id': first_non_empty('category_id'),
+        'category': first_non_empty('category'),
+        'client_id': first_non_empty('client_id') or first_non_empty('client'),
+        'organization_id': first_non_empty('organization_id') or first_non_empty('organization'),
+        'date_from': _iso_date(params.get('date_from')),
+        'date_to': _iso_date(params.get('date_to')),
+    }
+
+
+def _iso_date(value) -> str:
+    day = date_ranges.parse_date(value)
+    return day.isoformat() if day else ''
+
+
+def filter_tickets(filters: dict):
+    """Обращения по фильтрам страницы аналитики"""
+    qs = Ticket.objects.all()
+    category_id = str(filters.get('category_id') or '')
+    client_id = str(filters.get('client_id') or '')
+    organization_id = str(filters.get('organization_id') or '')
+    if category_id.isdigit():
+        cid = int(category_id)
+        qs = qs.filter(Q(category_id=cid) | Q(category__parent_id=cid))
+    elif filters.get('category'):
+        qs = qs.filter(Q(category__name__icontains=filters['category']) | Q(category__parent__name__icontains=filters['category']))
+    if client_id.isdigit():
+        qs = qs.filter(client_id=int(client_id))
+    if organization_id.isdigit():
+        qs = qs.filter(organization_id=int(organization_id))
+    return date_ranges.filter_dates(qs, 'created_at', filters.get('date_from'), filters.get('date_to'))
+
+
+def day_rows(filters: dict) -> list:
+    """Строки листа «По дням»: как график аналитики — из сводок, с фильтром по клиенту — по обращениям"""
+    if str(filters.get('client_id') or '').isdigit():
+        by_day = list(
+            filter_tickets(filters).annotate(day=TruncDate('created_at')).values('day').order_by('day').annotate(cnt=Count('id'))
+        )
+    else:
+        by_day = rollups.counts_by_day(rollups.daily_stats(**rollups.analytics_filters(
+            filters.get('category_id'), filters.get('category'), filters.get('organization_id'),
+            filters.get('date_from'), filters.get('date_to'),
+        )))
+    return [[item['day'].strftime('%d.%m.%Y'), item['cnt']] for item in by_day]
+
+
+# --- XLSX --------------------------------------------------------------------
+
+def column_letter(index: int) -> str:
+    """1 → A, 27 → AA"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _width(value):
+    return len(str(value)) if value not in (None, '') else 0
+
+
+def _cell(reference, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    text = escape(ILLEGAL_XML_CHARS_RE.sub('', str(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(number, letters, values):
+    cells = ''.join(_cell(f'{letter}{number}', value) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def write_sheet(stream, headers, rows):
+    """Пишет XML листа в поток; ширина колонок — по заголовкам и первым строкам. Возвращает число строк"""
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+    letters = [column_letter(index) for index in range(1, len(headers) + 1)]
+
+    columns = ''.join(
+        f'<col min="{index}" max="{index}" width="{min(max(MIN_WIDTH, width + 2), MAX_WIDTH)}" customWidth="1"/>'
+        for index, width in enumerate(
+            (max([_width(header)] + [_width(row[position]) for row in sample]) for position, header in enumerate(headers)),
+            start=1,
+        )
+    )
+    stream.write((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<cols>{columns}</cols><sheetData>'
+    ).encode())
+
+    number = 1
+    batch = [_row(number, letters, headers)]
+    for row in sample:
+        number += 1
+        batch.append(_row(number, letters, row))
+    for row in rows:
+        number += 1
+        batch.append(_row(number, letters, row))
+        if len(batch) >= WRITE_BATCH_ROWS:
+            stream.write(''.join(batch).encode())
+            batch = []
+    batch.append('</sheetData></worksheet>')
+    stream.write(''.join(batch).encode())
+    return number - 1
+
+
+def write_xlsx(fileobj, sheets):
+    """Записывает книгу в fileobj. sheets: [(название, заголовки, строки)]. Возвращает число строк по листам"""
+    counts = []
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+        titles = []
+        for index, (title, headers, rows) in enumerate(sheets, start=1):
+            titles.append(title[:31])
+            with archive.open(f'xl/worksheets/sheet{index}.xml', 'w') as stream:
+                counts.append(write_sheet(stream, headers, rows))
+
+        sheet_numbers = range(1, len(titles) + 1)
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for number in sheet_numbers
+            )
+            + '</Types>'
+        ))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(
+                f'<sheet name={quoteattr(title)} sheetId="{number}" r:id="rId{number}"/>'
+                for number, title in zip(sheet_numbers, titles)
+            )
+            + '</sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{number}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>'
+                for number in sheet_numbers
+            )
+            + '</Relationships>'
+        ))
+    return counts
+
+
+# --- CSV ---------------------------------------------------------------------
+
+def write_csv(fileobj, headers, rows):
+    """CSV для Excel: UTF-8 с BOM, разделитель «;». Возвращает число строк"""
+    stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    writer = csv.writer(stream, delimiter=';')
+    writer.writerow(headers)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    stream.flush()
+    stream.detach()
+    return count
+
+
+# --- Колоночный ZIP ----------------------------------------------------------
+
+def _value_type(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'number'
+    return 'string'
+
+
+def _column_type(types):
+    """Тип колонки: единственный тип непустых значений, иначе строка"""
+    types = types - {None}
+    return types.pop() if len(types) == 1 else 'string'
+
+
+def write_columnar(fileobj, names, headers, rows):
+    """ZIP: schema.json и по файлу на колонку (JSON Lines). Возвращает число строк"""
+    count = 0
+    types = [set() for _ in names]
+    with ExitStack() as stack:
+        column_files = [stack.enter_context(tempfile.TemporaryFile()) for _ in names]
+        buffers = [[] for _ in names]
+        for row in rows:
+            for index, value in enumerate(row):
+                buffers[index].append(json.dumps(None if value == '' else value, ensure_ascii=False))
+                types[index].add(_value_type(value))
+            count += 1
+            if count % WRITE_BATCH_ROWS == 0:
+                for column_file, buffer in zip(column_files, buffers):
+                    column_file.write(('\n'.join(buffer) + '\n').encode())
+                    buffer.clear()
+        for column_file, buffer in zip(column_files, buffers):
+            if buffer:
+                column_file.write(('\n'.join(buffer) + '\n').encode())
+
+        schema = {
+            'format': 'columns-jsonl',
+            'version': 1,
+            'rows': count,
+            'columns': [
+                {
+                    'name': name,
+                    'title': header,
+                    'type': _column_type(column_types),
+                    'nullable': None in column_types,
+                    'file': f'columns/{name}.jsonl',
+                }
+                for name, header, column_types in zip(names, headers, types)
+            ],
+        }
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('schema.json', json.dumps(schema, ensure_ascii=False, indent=2))
+            for column, column_file in zip(schema['columns'], column_files):
+                column_file.seek(0)
+                with archive.open(column['file'], 'w') as stream:
+                    shutil.copyfileobj(column_file, stream)
+    return count
+
+
+# --- Выгрузка целиком --------------------------------------------------------
+
+# формат → (расширение файла, Content-Type)
+FORMATS = {
+    'xlsx': ('.xlsx', XLSX_CONTENT_TYPE),
+    'csv': ('.csv', 'text/csv'),
+    'columnar': ('.columns.zip', 'application/zip'),
+}
+
+
+def _counted(rows, progress, every=1000):
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % every == 0:
+            progress(count)
+    progress(count)
+
+
+def write_export(fileobj, export_format: str, filters: dict, progress=None) -> int:
+    """Пишет выгрузку обращений по фильтрам аналитики. progress(строк) вызывается каждые 1000 строк"""
+    rows = ticket_rows(filter_tickets(filters))
+    if progress:
+        rows = _counted(rows, progress)
+    if export_format == 'xlsx':
+        return write_xlsx(fileobj, [
+            ('Обращения', ticket_headers(), rows),
+            ('По дням', ['День', 'Обращений'], day_rows(filters)),
+        ])[0]
+    if export_format == 'csv':
+        return write_csv(fileobj, ticket_headers(), rows)
+    if export_format == 'columnar':
+        return write_columnar(fileobj, ticket_column_names(), ticket_headers(), rows)
+    raise ValueError(f'Unknown export format: {export_format}')
+
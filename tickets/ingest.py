@@ -0,0 +1,217 @@
+"""Буфер записи сообщений Telegram в поток.
+
+Бот не пишет каждое сообщение группы отдельной транзакцией: записи копятся в
+буфере и сбрасываются пачкой, когда набралось ``max_size`` сообщений или прошло
+``max_delay_ms`` миллисекунд с момента первого сообщения в буфере. Сама запись
+пачки (``flush_func``) — обычная синхронная функция, она выполняется в потоке
+через ``sync_to_async`` (или переданную обёртку ``to_async``).
+
+Если запись пачки не удалась (например, БД заблокирована), пачка возвращается
+в начало буфера и запись повторяется с нарастающей паузой. После ``max_retries``
+неудач подряд (и при остановке бота) пачка сбрасывается на диск в ``spill_dir``
+— файл JSONL; ``replay_spilled`` дописывает такие файлы в поток при следующем
+запуске. Сообщения не теряются.
+
+``add(item, wait=True)`` возвращается только после того, как пачка с сообщением
+записана или сброшена на диск (режим webhook: Telegram получает ответ, когда
+сообщение уже не пропадёт при падении процесса).
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Максимальная пауза между повторами записи, сек
+MAX_RETRY_DELAY = 30.0
+
+
+class StreamBuffer:
+    """Асинхронный буфер с пакетным сбросом и метриками"""
+
+    def __init__(self, flush_func, max_size: int = 100, max_delay_ms: int = 250, to_async=sync_to_async,
+                 max_retries: int = 5, retry_delay: float = 0.5, spill_dir=None, datetime_fields=('message_date',)):
+        self.flush_func = flush_func
+        self.to_async = to_async
+        self.max_size = max(1, int(max_size))
+        self.max_delay = max(0, int(max_delay_ms)) / 1000
+        self.max_retries = max(0, int(max_retries))
+        self.retry_delay = retry_delay
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.datetime_fields = datetime_fields
+        self._items = []
+        # Ожидающие записи (Future или None) — параллельно _items
+        self._waiters = []
+        self._timer = None
+        # Неудачных записей подряд и время, раньше которого не повторяем
+        self.failures = 0
+        self._retry_at = 0.0
+        # Сбросы выполняются строго по очереди, чтобы сохранить порядок сообщений
+        self._flush_lock = asyncio.Lock()
+
+        # Метрики
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.max_batch = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.spilled_messages = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    async def add(self, item, wait: bool = False):
+        """Добавляет сообщение. wait — дождаться записи пачки с ним (или сброса на диск)"""
+        waiter = asyncio.get_running_loop().create_future() if wait else None
+        self._items.append(item)
+        self._waiters.append(waiter)
+        if len(self._items) >= self.max_size and time.monotonic() >= self._retry_at:
+            await self.flush()
+        else:
+            self._schedule(self.max_delay)
+        if waiter is not None:
+            await waiter
+
+    @staticmethod
+    def _resolve(waiters, error=None):
+        for waiter in waiters:
+            if waiter is not None and not waiter.done():
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+
+    def _schedule(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        await self.flush()
+
+    async def flush(self, final: bool = False):
+        """Записывает накопленные сообщения одной пачкой.
+
+        final — последняя попытка при остановке: не удалось записать — пачка уходит на диск.
+        """
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+        async with self._flush_lock:
+            if not self._items:
+                return
+            wait = self._retry_at - time.monotonic()
+            if wait > 0 and not final:
+                # Ждём паузу после неудачной записи
+                self._schedule(wait)
+                return
+            batch, self._items = self._items, []
+            waiters, self._waiters = self._waiters, []
+            started = time.monotonic()
+            try:
+                await self.to_async(self.flush_func)(batch)
+            except Exception as e:
+                self._flush_failed(batch, waiters, e, final)
+                return
+            self._resolve(waiters)
+            self.failures = 0
+            self._retry_at = 0.0
+            latency = time.monotonic() - started
+            self._record(len(batch), latency)
+
+    def _flush_failed(self, batch, waiters, error, final: bool):
+        self.failures += 1
+        if (final or self.failures > self.max_retries) and self.spill_dir:
+            try:
+                path = self._spill(batch)
+            except OSError as spill_error:
+                logger.error(f"Could not spill stream batch to {self.spill_dir}: {spill_error}", exc_info=True)
+            else:
+                logger.error(
+                    f"Stream flush failed {self.failures} times, {len(batch)} messages spilled to {path}: {error}",
+                    exc_info=error,
+                )
+                self._resolve(waiters)
+                self.failures = 0
+                self._retry_at = 0.0
+                self._schedule(self.max_delay)
+                return
+        if final:
+            logger.error(f"Stream flush failed on shutdown, {len(batch)} messages lost: {error}", exc_info=error)
+            self._resolve(waiters, error)
+            return
+
+        # Пачка возвращается в начало буфера — порядок сообщений сохраняется
+        self._items[:0] = batch
+        self._waiters[:0] = waiters
+        delay = min(self.retry_delay * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+        self._retry_at = time.monotonic() + delay
+        self._schedule(delay)
+        logger.warning(
+            f"Stream flush failed ({self.failures}), {len(batch)} messages re-queued, retry in {delay:.1f}s: {error}"
+        )
+
+    def _spill(self, batch) -> Path:
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        name = f"stream-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+        partial = self.spill_dir / (name + '.part')
+        with open(partial, 'w', encoding='utf-8') as fileobj:
+            for item in batch:
+                fileobj.write(json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False))
+                fileobj.write('\n')
+        path = partial.rename(self.spill_dir / name)
+        self.spilled_messages += len(batch)
+        return path
+
+    def _load(self, path) -> list:
+        items = []
+        with open(path, encoding='utf-8') as fileobj:
+            for line in fileobj:
+                item = json.loads(line)
+                for field in self.datetime_fields:
+                    if item.get(field):
+                        item[field] = parse_datetime(item[field])
+                items.append(item)
+        return items
+
+    async def replay_spilled(self) -> int:
+        """Записывает сброшенные на диск пачки (при запуске бота). Возвращает число сообщений"""
+        if not self.spill_dir or not self.spill_dir.is_dir():
+            return 0
+        total = 0
+        for path in sorted(self.spill_dir.glob('stream-*.jsonl')):
+            try:
+                batch = self._load(path)
+                await self.to_async(self.flush_func)(batch)
+            except Exception as e:
+                logger.error(f"Could not replay spilled stream batch {path}: {e}", exc_info=True)
+                break
+            path.unlink()
+            total += len(batch)
+            logger.info(f"Spilled stream batch replayed: {path.name} ({len(batch)} messages)")
+        return total
+
+    def _record(self, size: int, latency: float):
+        self.flushes += 1
+        self.flushed_messages += size
+        self.max_batch = max(self.max_batch, size)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        logger.info(
+            f"stream_flush: batch={size} latency_ms={latency * 1000:.1f} "
+            f"flushes={self.flushes} messages={self.flushed_messages} "
+            f"avg_batch={self.flushed_messages / self.flushes:.1f} max_batch={self.max_batch} "
+            f"avg_latency_ms={self.total_latency / self.flushes * 1000:.1f} max_latency_ms={self.max_latency * 1000:.1f}"
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets import archive, retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые сообщения потока Telegram в сжатые сегменты архива по дням '
+        '(цитаты и link_replies читают их оттуда) и удаляет их из рабочей таблицы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=getattr(settings, 'TELEGRAM_ARCHIVE_AFTER_DAYS', 90),
+                            help='Переносить сообщения старше стольких дней')
+        parser.add_argument('--group', help='Только группа с этим chat_id')
+        parser.add_argument('--chunk-size', type=int, default=retention.CHUNK_SIZE, help='Сообщений в одной пачке')
+        parser.add_argument('--sleep', type=float, default=retention.CHUNK_PAUSE, help='Пауза между пачками, сек')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не переносить')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🗄️ АРХИВАЦИЯ ПОТОКА TELEGRAM'))
+        self.stdout.write('=' * 50)
+
+        border = timezone.now() - timezone.timedelta(days=options['older_than_days'])
+        queryset = retention.messages_in_period(end=border, chat_id=options['group'])
+        self.stdout.write(f'📅 Сообщения до {timezone.localtime(border):%d.%m.%Y %H:%M}')
+
+        if options['dry_run']:
+            self.stdout.write(f'🔎 Будет перенесено: {queryset.count()}')
+            return
+
+        started = time.monotonic()
+
+        def progress(moved):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'⏳ Перенесено {moved}, {moved / elapsed if elapsed else 0:.0f} сообщ./с')
+
+        # Переносятся все старые сообщения, и связанные с обращениями тоже: связанное сообщение всегда уже
+        # обработано (processed_at ставится вместе с linked_ticket), а цитаты и link_replies находят его в архиве
+        with archive.SegmentWriter() as writer:
+            moved = retention.purge(
+                queryset, keep_linked=False, chunk_size=options['chunk_size'], pause=options['sleep'],
+                archive=writer, progress=progress,
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Готово: перенесено {moved} сообщений в {len(writer.segments)} сегм. за {elapsed:.1f} с '
+            f'({moved / elapsed if elapsed else 0:.0f} сообщ./с), каталог {writer.root}'
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает контрольный срок SLA (sla_deadline) и признак завершённости у существующих обращений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Диапазон id обращений, обновляемый в одной транзакции (по умолчанию 5000)',
+        )
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Только обращения без рассчитанного срока',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        queryset = Ticket.objects.all()
+        if options['only_missing']:
+            queryset = queryset.filter(sla_deadline__isnull=True)
+
+        self.stdout.write(self.style.SUCCESS('⏰ ПЕРЕСЧЕТ СРОКОВ SLA'))
+        self.stdout.write('=' * 50)
+
+        bounds = queryset.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('✅ Обращений для пересчета нет')
+            return
+
+        started = time.monotonic()
+        total = 0
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            with transaction.atomic():
+                total += Ticket.recalculate_sla(queryset.filter(id__gte=start, id__lt=start + chunk_size))
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'⏳ Обновлено {total} обращений, {total / elapsed if elapsed else 0:.0f} обр./с')
+
+        overdue = Ticket.objects.filter(Ticket.overdue_filter()).count()
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Готово: {total} обращений за {time.monotonic() - started:.1f} с, просрочено сейчас: {overdue}')
+        )
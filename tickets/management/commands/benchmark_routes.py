@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tickets.models import Client, Organization, TelegramGroup, TelegramRoute
+from tickets.routing import route_index
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск маршрута через индекс в памяти с каскадом запросов к БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=500, help='Количество поисков маршрута')
+        parser.add_argument('--seed', type=int, default=1, help='Seed генератора случайных комбинаций')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        samples = self.build_samples(rnd, options['samples'])
+        if not samples:
+            self.stdout.write(self.style.WARNING('Нет групп, клиентов и организаций для проверки'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('🚦 БЕНЧМАРК ПОИСКА МАРШРУТОВ'))
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Активных маршрутов: {TelegramRoute.objects.filter(is_active=True).count()}')
+        self.stdout.write(f'Поисков: {len(samples)}')
+
+        db_results, db_queries, db_time = self.measure(TelegramRoute.find_route_in_db, samples)
+
+        # Построение индекса считаем отдельно: оно происходит один раз на процесс (и после изменений маршрутов)
+        route_index.invalidate()
+        with CaptureQueriesContext(connection) as build_ctx:
+            route_index.routes()
+        index_results, index_queries, index_time = self.measure(route_index.find, samples)
+
+        self.report('Каскад запросов к БД', db_queries, db_time)
+        self.report('Индекс в памяти', index_queries, index_time)
+        self.stdout.write(f'Построение индекса: {len(build_ctx.captured_queries)} запрос(ов)')
+
+        mismatches = sum(1 for a, b in zip(db_results, index_results) if a != b)
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'❌ Расхождений с каскадом: {mismatches}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Результаты индекса совпадают с каскадом'))
+
+    def build_samples(self, rnd, count):
+        groups = list(TelegramGroup.objects.values_list('id', flat=True)) + [None]
+        clients = list(Client.objects.values_list('id', flat=True)) + [None]
+        organizations = list(Organization.objects.values_list('id', flat=True)) + [None]
+        if len(groups) == len(clients) == len(organizations) == 1:
+            return []
+
+        # Половина выборки — условия существующих маршрутов, чтобы проверить и совпадения
+        route_keys = list(TelegramRoute.objects.values_list('telegram_group_id', 'client_id', 'organization_id'))
+        samples = []
+        for i in range(count):
+            if route_keys and i % 2 == 0:
+                samples.append(rnd.choice(route_keys))
+            else:
+                samples.append((rnd.choice(groups), rnd.choice(clients), rnd.choice(organizations)))
+        return samples
+
+    def measure(self, find, samples):
+        results = []
+        per_lookup = []
+        started = time.perf_counter()
+        for group_id, client_id, organization_id in samples:
+            with CaptureQueriesContext(connection) as ctx:
+                route = find(telegram_group=group_id, client=client_id, organization=organization_id)
+            per_lookup.append(len(ctx.captured_queries))
+            results.append(route.pk if route else None)
+        elapsed = time.perf_counter() - started
+        return results, per_lookup, elapsed
+
+    def report(self, title, queries, elapsed):
+        self.stdout.write(f'\n{title}:')
+        self.stdout.write(f'  Запросов на поиск: среднее {sum(queries) / len(queries):.2f}, максимум {max(queries)}')
+        self.stdout.write(f'  Время: {elapsed * 1000:.1f} мс всего, {elapsed / len(queries) * 1_000_000:.0f} мкс на поиск')
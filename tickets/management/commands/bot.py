@@ -2,13 +2,17 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
-from asgiref.sync import sync_to_async
 
-from tickets.models import Ticket, Category, Client, TicketStatus, UserTelegramAccess, TelegramMessage, TelegramGroup, TicketComment
+from tickets import autocomplete, caches, search
+from tickets.authors import resolve_message_author
+from tickets.concurrency import PerChatUpdateProcessor
+from tickets.ingest import StreamBuffer
+from tickets.models import Ticket, Client, UserTelegramAccess, TelegramMessage, TelegramGroup, TelegramMessageLink, TicketComment
 from django.contrib.auth.models import User
 
-from telegram import Update
+from telegram import Bot, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+import asyncio
 import logging
 
 
@@ -21,6 +25,61 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--token', type=str, help='Telegram bot token (overrides settings.TELEGRAM_BOT_TOKEN)')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'TELEGRAM_STREAM_BATCH_SIZE', 100),
+                            help='Сбрасывать буфер потока, когда в нём набралось столько сообщений')
+        parser.add_argument('--flush-ms', type=int, default=getattr(settings, 'TELEGRAM_STREAM_FLUSH_MS', 250),
+                            help='Сбрасывать буфер потока не реже, чем раз в столько миллисекунд')
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'TELEGRAM_BOT_CONCURRENT_UPDATES', 8),
+                            help='Сколько обновлений разных чатов обрабатывать одновременно')
+        parser.add_argument('--db-threads', type=int, default=getattr(settings, 'TELEGRAM_BOT_DB_THREADS', None),
+                            help='Размер пула потоков для обращений к БД (по умолчанию равен --concurrency)')
+        parser.add_argument('--set-webhook', type=str, metavar='URL',
+                            help='Зарегистрировать webhook (https://.../tickets/telegram/webhook/) и выйти')
+        parser.add_argument('--delete-webhook', action='store_true',
+                            help='Удалить webhook и выйти (для возврата к long polling)')
+
+    def build_application(self, token: str, batch_size: int = None, flush_ms: int = None,
+                          concurrent_updates: int = None, db_threads: int = None, webhook: bool = False) -> Application:
+        """Создаёт приложение бота с обработчиками. Используется и для polling, и для webhook"""
+        # Обновления разных чатов обрабатываются параллельно, одного чата — по порядку
+        self.update_processor = PerChatUpdateProcessor(
+            max_concurrent_updates=concurrent_updates or get_setting('TELEGRAM_BOT_CONCURRENT_UPDATES', 8),
+            db_threads=db_threads or get_setting('TELEGRAM_BOT_DB_THREADS', None),
+        )
+        # Сообщения групп пишутся в поток пачками. В режиме webhook обработчик ждёт записи
+        # сообщения: Telegram получает 200 только за то, что уже не потеряется
+        self.webhook = webhook
+        if flush_ms is None:
+            flush_ms = get_setting('TELEGRAM_WEBHOOK_STREAM_FLUSH_MS' if webhook else 'TELEGRAM_STREAM_FLUSH_MS', 250)
+        self.stream_buffer = StreamBuffer(
+            self._write_stream_batch_sync,
+            max_size=batch_size or get_setting('TELEGRAM_STREAM_BATCH_SIZE', 100),
+            max_delay_ms=flush_ms,
+            to_async=self.db,
+            max_retries=get_setting('TELEGRAM_STREAM_FLUSH_RETRIES', 5),
+            spill_dir=get_setting('TELEGRAM_STREAM_SPILL_DIR', None),
+        )
+
+        builder = (
+            Application.builder()
+            .token(token)
+            .base_url(get_setting('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot'))
+            .concurrent_updates(self.update_processor)
+            # Пачки, сброшенные на диск при прошлых сбоях записи, дописываем при запуске
+            .post_init(self._on_start)
+            # Буфер дописываем до остановки пула потоков процессора
+            .post_stop(self._on_stop)
+        )
+        if webhook:
+            # Обновления приходят через webhook-представление, опрашивать Telegram не нужно
+            builder = builder.updater(None)
+        application = builder.build()
+
+        # Обрабатываем /start только в личных чатах
+        application.add_handler(CommandHandler('start', self.start, filters=filters.ChatType.PRIVATE))
+        # Логируем любые сообщения
+        application.add_handler(MessageHandler(filters.ALL, self.on_message))
+        return application
 
     def handle(self, *args, **options):
         token = options.get('token') or get_setting('TELEGRAM_BOT_TOKEN')
@@ -28,16 +87,54 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR('TELEGRAM_BOT_TOKEN is not set. Provide via settings or --token.'))
             return
 
-        application = Application.builder().token(token).build()
+        if options.get('set_webhook') or options.get('delete_webhook'):
+            asyncio.run(self.configure_webhook(token, options.get('set_webhook')))
+            return
 
-        # Обрабатываем /start только в личных чатах
-        application.add_handler(CommandHandler('start', self.start, filters=filters.ChatType.PRIVATE))
-        # Логируем любые сообщения
-        application.add_handler(MessageHandler(filters.ALL, self.on_message))
+        application = self.build_application(
+            token,
+            batch_size=options['batch_size'],
+            flush_ms=options['flush_ms'],
+            concurrent_updates=options['concurrency'],
+            db_threads=options['db_threads'],
+        )
 
         self.stdout.write(self.style.SUCCESS('Telegram bot started. Press Ctrl+C to stop.'))
         application.run_polling(allowed_updates=Update.ALL_TYPES)
 
+    async def configure_webhook(self, token: str, url: str | None):
+        """Регистрирует или удаляет webhook бота"""
+        bot = Bot(token=token, base_url=get_setting('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot'))
+        async with bot:
+            if not url:
+                await bot.delete_webhook()
+                self.stdout.write(self.style.SUCCESS('Webhook deleted.'))
+                return
+            secret = get_setting('TELEGRAM_WEBHOOK_SECRET', None)
+            if not secret:
+                self.stderr.write(self.style.ERROR('TELEGRAM_WEBHOOK_SECRET is not set.'))
+                return
+            await bot.set_webhook(
+                url=url,
+                secret_token=secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=get_setting('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', 40),
+            )
+            self.stdout.write(self.style.SUCCESS(f'Webhook set: {url}'))
+
+    async def _on_start(self, application):
+        replayed = await self.stream_buffer.replay_spilled()
+        if replayed:
+            logging.info(f"Replayed {replayed} spilled stream messages")
+
+    async def _on_stop(self, application):
+        # Дописываем то, что осталось в буфере (не получилось — сбрасываем на диск)
+        await self.stream_buffer.flush(final=True)
+
+    def db(self, func):
+        """Обёртка для синхронных обращений к БД из обработчиков (пул потоков процессора)"""
+        return self.update_processor.sync_to_async(func)
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Обрабатывать команду только в личке, и отвечать только авторизованным
         if update.effective_chat and (update.effective_chat.type or '').lower() != 'private':
@@ -101,15 +198,14 @@ class Command(BaseCommand):
             # Переслано из канала/группы
             external_id = str(message.forward_from_chat.id)
 
-        # Решаем: логировать ли сообщение в поток
+        # Сообщения групп/каналов ставим в буфер потока; личные чаты в поток не пишем
         chat_type = (message.chat.type or '').lower()
-        should_log = await sync_to_async(self._should_log_to_stream)(message)
-        if should_log:
-            await sync_to_async(self._log_message_sync)(message, text, media_type)
-        try:
-            logging.info("tg_logged: chat_type=%s msg_id=%s", getattr(message.chat, 'type', None), getattr(message, 'message_id', None))
-        except Exception:
-            pass
+        if chat_type != 'private':
+            await self.stream_buffer.add(self._stream_entry(message, text, media_type), wait=self.webhook)
+            try:
+                logging.info("tg_buffered: chat_type=%s msg_id=%s", getattr(message.chat, 'type', None), getattr(message, 'message_id', None))
+            except Exception:
+                pass
 
         # Создаём тикет только для личных чатов. В группах/каналах — только логируем
         if chat_type != 'private':
@@ -128,7 +224,7 @@ class Command(BaseCommand):
             return
 
         # Создаём тикет (заголовок будет сформирован по шаблону маршрута)
-        ticket = await sync_to_async(self._create_ticket_sync)(
+        ticket = await self.db(self._create_ticket_sync)(
             author_telegram_id=str(user.id),
             text=text,
             external_client_id=external_id,
@@ -147,18 +243,17 @@ class Command(BaseCommand):
 
     async def _is_allowed_user(self, telegram_user_id: int) -> bool:
         telegram_id_str = str(telegram_user_id)
-        def _check():
-            return UserTelegramAccess.objects.filter(telegram_user_id=telegram_id_str, is_allowed=True).exists()
-        return await sync_to_async(_check)()
+        # Попадание в кэш обходится без перехода в поток и запроса к БД
+        user = caches.access_cache.get(telegram_id_str)
+        if user is caches.MISSING:
+            user = await self.db(caches.get_access_user)(telegram_id_str)
+        return user is not None
 
     def _create_ticket_sync(self, author_telegram_id: str, text: str, external_client_id: str | None, created_at_override, message_id: str | None, chat_id: str | None = None, chat_title: str | None = None, override_title: str | None = None):
         with transaction.atomic():
             # Пользователь-создатель — по профилю телеграм
             # Пытаемся найти по множественным доступам
-            creator = None
-            access = UserTelegramAccess.objects.filter(telegram_user_id=author_telegram_id, is_allowed=True).select_related('user').first()
-            if access:
-                creator = access.user
+            creator = caches.get_access_user(author_telegram_id)
             # fallback больше не используем UserProfile
             if not creator:
                 # Фолбэк: берём первого суперпользователя/админа
@@ -171,15 +266,12 @@ class Command(BaseCommand):
 
             if not client:
                 # Используем существующего клиента "Неизвестный клиент" или создаём один раз
-                client = Client.objects.filter(name='Неизвестный клиент').first()
-                if not client:
-                    client = Client.objects.create(name='Неизвестный клиент')
+                client = caches.get_unknown_client()
 
             # Определяем группу Telegram
             telegram_group = None
             if chat_id:
-                from tickets.models import TelegramGroup
-                telegram_group = TelegramGroup.objects.filter(chat_id=chat_id).first()
+                telegram_group = caches.get_groups([chat_id]).get(chat_id)
 
             # Ищем подходящий маршрут
             from tickets.models import TelegramRoute
@@ -206,15 +298,12 @@ class Command(BaseCommand):
                     title = override_title
             else:
                 # Используем значения по умолчанию
-                category = (
-                    Category.objects.filter(name__icontains='Обращения от поставщиков', parent__isnull=True).first()
-                    or Category.objects.first()
-                )
+                category = caches.get_default_category()
                 priority = 'normal'
                 title = (override_title if override_title else (text[:100] if text else 'Сообщение из Telegram'))
 
             # Статус новый — возьмём первый не финальный
-            status = TicketStatus.objects.filter(is_final=False).order_by('order').first() or TicketStatus.objects.first()
+            status = caches.get_initial_status()
 
             ticket = Ticket(
                 title=title,
@@ -234,172 +323,184 @@ class Command(BaseCommand):
             if created_at_override:
                 ticket.created_at = created_at_override
             ticket.save()
+            TelegramMessageLink.remember(chat_id, message_id, ticket)
 
             return ticket
 
-    def _log_message_sync(self, message, text: str, media_type: str):
+    def _stream_entry(self, message, text: str, media_type: str) -> dict:
+        """Данные сообщения для записи в поток (без обращения к БД)"""
         chat = message.chat
-        chat_id = str(chat.id)
-        chat_title = chat.title or chat.username or ''
         from_user = message.from_user
         # Получаем ID сообщения, на которое отвечают (если есть)
         reply_to_message_id = ''
         if getattr(message, 'reply_to_message', None):
             reply_to_message_id = str(message.reply_to_message.message_id)
+        return {
+            'message_id': str(message.message_id),
+            'reply_to_message_id': reply_to_message_id,
+            'chat_id': str(chat.id),
+            'chat_title': chat.title or chat.username or '',
+            'from_user_id': str(from_user.id) if from_user else '',
+            'from_username': (from_user.username if from_user and from_user.username else ''),
+            'from_fullname': (from_user.full_name if from_user else ''),
+            'text': text,
+            'media_type': media_type,
+            'message_date': (timezone.make_aware(message.date) if timezone.is_naive(message.date) else message.date),
+        }
+
+    def _allowed_stream_chats(self, entries) -> set:
+        """Возвращает chat_id групп, сообщения которых пишутся в поток.
+        Группы/каналы логируем только если группа не заблокирована и включена запись в поток.
+        При первом попадании неизвестной группы — создаём запись с write_to_stream=True по умолчанию.
+        """
+        titles = {}
+        for entry in entries:
+            titles[entry['chat_id']] = entry['chat_title'] or titles.get(entry['chat_id'], '')
+
+        groups = caches.get_groups(titles)
+        missing = [
+            TelegramGroup(chat_id=chat_id, title=title, is_blocked=False, write_to_stream=True)
+            for chat_id, title in titles.items() if chat_id not in groups
+        ]
+        if missing:
+            TelegramGroup.objects.bulk_create(missing, ignore_conflicts=True)
+            created = list(TelegramGroup.objects.filter(chat_id__in=[g.chat_id for g in missing]))
+            caches.remember_groups(created)
+            autocomplete.index('group', created)
+            groups.update({g.chat_id: g for g in created})
+
+        # Обновим названия при необходимости
+        renamed = []
+        now = timezone.now()
+        for chat_id, title in titles.items():
+            grp = groups.get(chat_id)
+            if grp and title and grp.title != title:
+                grp.title = title
+                grp.updated_at = now
+                renamed.append(grp)
+        if renamed:
+            TelegramGroup.objects.bulk_update(renamed, ['title', 'updated_at'])
+            caches.remember_groups(renamed)
+            autocomplete.index('group', renamed)
+
+        return {chat_id for chat_id, grp in groups.items() if not grp.is_blocked and grp.write_to_stream}
+
+    def _write_stream_batch_sync(self, entries):
+        """Записывает пачку сообщений в поток одной транзакцией"""
+        with transaction.atomic():
+            allowed = self._allowed_stream_chats(entries)
+
+            # Одно и то же сообщение могло прийти несколько раз (правки) — берём последнюю версию
+            latest = {}
+            for entry in entries:
+                if entry['chat_id'] in allowed:
+                    latest[(entry['chat_id'], entry['message_id'])] = entry
+            if not latest:
+                return
 
-        # Проверяем, существует ли уже сообщение с таким ID
-        existing_message = TelegramMessage.objects.filter(
-            message_id=str(message.message_id),
-            chat_id=chat_id
-        ).first()
-
-        if existing_message:
-            # Обновляем существующее сообщение
-            existing_message.text = text
-            existing_message.media_type = media_type
-            existing_message.from_username = (from_user.username if from_user and from_user.username else '')
-            existing_message.from_fullname = (from_user.full_name if from_user else '')
-            existing_message.message_date = (timezone.make_aware(message.date) if timezone.is_naive(message.date) else message.date)
-            existing_message.save()
-            telegram_message = existing_message
-            logging.info(f"Updated existing Telegram message: {message.message_id} in chat {chat_id}")
-        else:
-            # Создаем новое сообщение в потоке
-            telegram_message = TelegramMessage.objects.create(
-                message_id=str(message.message_id),
-                reply_to_message_id=reply_to_message_id,
-                chat_id=chat_id,
-                chat_title=chat_title,
-                from_user_id=str(from_user.id) if from_user else '',
-                from_username=(from_user.username if from_user and from_user.username else ''),
-                from_fullname=(from_user.full_name if from_user else ''),
-                text=text,
-                media_type=media_type,
-                message_date=(timezone.make_aware(message.date) if timezone.is_naive(message.date) else message.date),
-            )
-            logging.info(f"Created new Telegram message: {message.message_id} in chat {chat_id}")
-
-        # Если это ответ на сообщение, проверяем, связано ли исходное сообщение с комментарием
-        if reply_to_message_id:
-            self._check_and_link_reply_to_comment(telegram_message, reply_to_message_id, chat_id)
+            existing = {}
+            for msg in TelegramMessage.objects.filter(
+                chat_id__in={chat_id for chat_id, _ in latest},
+                message_id__in={message_id for _, message_id in latest},
+            ).order_by('id'):
+                existing.setdefault((msg.chat_id, msg.message_id), msg)
+
+            to_update = []
+            to_create = []
+            for key, entry in latest.items():
+                msg = existing.get(key)
+                if msg:
+                    # Обновляем существующее сообщение
+                    msg.text = entry['text']
+                    msg.media_type = entry['media_type']
+                    msg.from_username = entry['from_username']
+                    msg.from_fullname = entry['from_fullname']
+                    msg.message_date = entry['message_date']
+                    to_update.append(msg)
+                else:
+                    to_create.append(TelegramMessage(**entry))
+
+            if to_update:
+                TelegramMessage.objects.bulk_update(to_update, ['text', 'media_type', 'from_username', 'from_fullname', 'message_date'])
+            if to_create:
+                to_create = TelegramMessage.objects.bulk_create(to_create)
+            # bulk_create/bulk_update не вызывают сигналы — обновляем поисковый индекс сами
+            search.index_messages(to_update + to_create)
+            logging.info(f"Stream batch written: created={len(to_create)} updated={len(to_update)}")
+
+            # Ответы на сообщения, связанные с комментариями, превращаем в комментарии.
+            # Повторная доставка (правка) уже записанного ответа комментарий не дублирует.
+            replies = [msg for msg in to_create if msg.reply_to_message_id]
+            if replies:
+                self._link_replies_to_comments(replies)
+
+    def _link_replies_to_comments(self, replies):
+        """Пакетная версия _check_and_link_reply_to_comment: связи исходных сообщений ищутся одним запросом"""
+        links = TelegramMessageLink.objects.filter(
+            chat_id__in={msg.chat_id for msg in replies},
+            message_id__in={msg.reply_to_message_id for msg in replies},
+            comment__isnull=False,
+        ).select_related('comment__ticket')
+        comments = {(link.chat_id, link.message_id): link.comment for link in links}
+
+        for msg in replies:
+            original_comment = comments.get((msg.chat_id, msg.reply_to_message_id))
+            if not original_comment:
+                continue
+            # Точка сохранения: ошибка одного ответа откатывает только его записи, а не всю пачку.
+            # Исключение должно выйти из atomic(), иначе точка сохранения не откатится
+            try:
+                with transaction.atomic():
+                    new_comment = self._link_reply_to_comment(msg, original_comment)
+            except Exception as e:
+                logging.error(f"Failed to auto-link reply to comment: {e}", exc_info=True)
+                continue
+            # Ответ на этот ответ может быть в той же пачке
+            comments[(msg.chat_id, msg.message_id)] = new_comment
 
     def _check_and_link_reply_to_comment(self, telegram_message, reply_to_message_id: str, chat_id: str):
         """Проверяет, является ли ответ на сообщение, связанное с комментарием, и если да - добавляет ответ как комментарий"""
         try:
-            # Ищем исходное сообщение в потоке
-            original_message = TelegramMessage.objects.filter(
-                message_id=reply_to_message_id,
-                chat_id=chat_id
-            ).first()
-            
-            if not original_message:
-                return
-            
-            # Проверяем, связано ли исходное сообщение с обращением через комментарий
-            # Ищем комментарий, который имеет telegram_message_id равный ID исходного сообщения
-            original_comment = TicketComment.objects.filter(
-                telegram_message_id=reply_to_message_id
-            ).first()
-            
+            # Комментарий, связанный с исходным сообщением именно в этом чате
+            original_comment = TelegramMessageLink.find_comment(chat_id, reply_to_message_id)
             if not original_comment:
                 return
-            
-            # Если нашли комментарий, создаем новый комментарий для ответа
-            # Определяем автора комментария
-            author_type = 'client'
-            author_client = None
-            author_user = None
-            
-            # Сначала проверяем, является ли отправитель системным пользователем
-            if telegram_message.from_user_id:
-                try:
-                    # Проверяем, есть ли пользователь в UserTelegramAccess
-                    from tickets.models import UserTelegramAccess
-                    telegram_access = UserTelegramAccess.objects.filter(
-                        telegram_user_id=telegram_message.from_user_id,
-                        is_allowed=True
-                    ).select_related('user').first()
-                    
-                    if telegram_access:
-                        # Это системный пользователь
-                        author_type = 'user'
-                        author_user = telegram_access.user
-                        logging.info(f"Reply from system user: {telegram_access.user.username}")
-                    else:
-                        # Это клиент, ищем по external_id
-                        author_client = Client.objects.filter(external_id=telegram_message.from_user_id).first()
-                        if not author_client:
-                            # Если клиент не найден, ищем существующего "Неизвестного клиента" или создаем нового
-                            existing_unknown = Client.objects.filter(
-                                name='Неизвестный клиент',
-                                external_id=telegram_message.from_user_id
-                            ).first()
-                            
-                            if existing_unknown:
-                                author_client = existing_unknown
-                            else:
-                                # Создаем нового клиента с уникальным именем
-                                author_client = Client.objects.create(
-                                    name=f'Неизвестный клиент ({telegram_message.from_username or telegram_message.from_user_id})',
-                                    external_id=telegram_message.from_user_id,
-                                    contact_person=telegram_message.from_fullname or telegram_message.from_username or 'Не указано'
-                                )
-                except Exception as e:
-                    # Если произошла любая ошибка, создаем комментарий от неизвестного клиента
-                    logging.warning(f"Error determining author type for external_id {telegram_message.from_user_id}: {e}")
-                    try:
-                        author_client = Client.objects.create(
-                            name=f'Неизвестный клиент ({telegram_message.from_username or telegram_message.from_user_id})',
-                            external_id=telegram_message.from_user_id,
-                            contact_person=telegram_message.from_fullname or telegram_message.from_username or 'Не указано'
-                        )
-                    except Exception as create_error:
-                        logging.error(f"Failed to create client: {create_error}")
-                        author_client = None
-            
-            # Создаем новый комментарий
-            new_comment = TicketComment.objects.create(
-                ticket=original_comment.ticket,
-                author=author_user,
-                author_type=author_type,
-                author_client=author_client,
-                content=telegram_message.text,
-                is_internal=False,
-                telegram_message_id=telegram_message.message_id,
-                created_at=telegram_message.message_date
-            )
-            
-            # Обновляем сообщение в потоке, связывая его с обращением
-            telegram_message.linked_ticket = original_comment.ticket
-            telegram_message.linked_action = 'add_comment'
-            telegram_message.save()
-            
-            logging.info(f"Auto-linked reply to comment: message_id={telegram_message.message_id}, comment_id={new_comment.id}, ticket_id={original_comment.ticket.id}")
-            
+
+            with transaction.atomic():
+                self._link_reply_to_comment(telegram_message, original_comment)
         except Exception as e:
             logging.error(f"Failed to auto-link reply to comment: {e}", exc_info=True)
 
-    def _should_log_to_stream(self, message) -> bool:
-        """Определяет, нужно ли писать сообщение в поток.
-        - Личные чаты: не логируем
-        - Группы/каналы: логируем только если группа не заблокирована и включена запись в поток
-        При первом попадании неизвестной группы — создаём запись с write_to_stream=True по умолчанию.
-        """
-        chat = message.chat
-        chat_type = (chat.type or '').lower()
-        if chat_type == 'private':
-            return False
-        chat_id = str(chat.id)
-        title = chat.title or chat.username or ''
-        grp, created = TelegramGroup.objects.get_or_create(chat_id=chat_id, defaults={
-            'title': title,
-            'is_blocked': False,
-            'write_to_stream': True,
-        })
-        # Обновим название при необходимости
-        if not created and title and grp.title != title:
-            grp.title = title
-            grp.save(update_fields=['title', 'updated_at'])
-        return (not grp.is_blocked) and grp.write_to_stream
-
+    def _link_reply_to_comment(self, telegram_message, original_comment):
+        """Добавляет ответ на сообщение комментария как новый комментарий обращения.
 
+        Ошибки не перехватывает: вызывающий код выполняет его в transaction.atomic()
+        и логирует исключение снаружи, чтобы недописанная связь откатилась.
+        """
+        # Если нашли комментарий, создаем новый комментарий для ответа.
+        # Автор — пользователь системы или клиент отправителя (из кэша авторов, без запросов при попадании)
+        author_type, author_user, author_client = resolve_message_author(telegram_message)
+        if author_user:
+            logging.info(f"Reply from system user: {author_user.username}")
+
+        # Создаем новый комментарий
+        new_comment = TicketComment.objects.create(
+            ticket=original_comment.ticket,
+            author=author_user,
+            author_type=author_type,
+            author_client=author_client,
+            content=telegram_message.text,
+            is_internal=False,
+            telegram_message_id=telegram_message.message_id,
+            created_at=telegram_message.message_date
+        )
+        # На ответ тоже могут ответить — связываем его с новым комментарием
+        TelegramMessageLink.remember(telegram_message.chat_id, telegram_message.message_id, original_comment.ticket, new_comment)
+        
+        # Обновляем сообщение в потоке, связывая его с обращением
+        telegram_message.linked_ticket = original_comment.ticket
+        telegram_message.linked_action = 'add_comment'
+        telegram_message.save()
+        
+        logging.info(f"Auto-linked reply to comment: message_id={telegram_message.message_id}, comment_id={new_comment.id}, ticket_id={original_comment.ticket.id}")
+        return new_comment
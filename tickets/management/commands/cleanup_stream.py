@@ -0,0 +1,104 @@
+import time
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tickets import date_ranges, retention
+from tickets.models import TelegramGroup
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет старые сообщения потока Telegram по срокам хранения групп (TelegramGroup.retention_days) '
+        'или за указанный период — пачками, с паузой между ними и, при желании, с архивом в gzip JSONL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='Только группа с этим chat_id')
+        parser.add_argument('--date-from', help='Начало периода (ГГГГ-ММ-ДД) — вместо сроков хранения групп')
+        parser.add_argument('--date-to', help='Конец периода включительно (ГГГГ-ММ-ДД)')
+        parser.add_argument('--include-linked', action='store_true',
+                            help='За период удалять и сообщения, связанные с обращениями')
+        parser.add_argument('--chunk-size', type=int, default=retention.CHUNK_SIZE, help='Сообщений в одной пачке')
+        parser.add_argument('--sleep', type=float, default=retention.CHUNK_PAUSE, help='Пауза между пачками, сек')
+        parser.add_argument('--archive-dir', help='Перед удалением сохранять сообщения в этот каталог (gzip JSONL)')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удалять')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🧹 ОЧИСТКА ПОТОКА TELEGRAM'))
+        self.stdout.write('=' * 50)
+
+        jobs = self.collect_jobs(options)
+        if not jobs:
+            self.stdout.write('✅ Сроки хранения не заданы ни для одной группы')
+            return
+
+        archive_dir = Path(options['archive_dir']) if options['archive_dir'] else None
+        if archive_dir:
+            archive_dir.mkdir(parents=True, exist_ok=True)
+
+        started = time.monotonic()
+        total = 0
+        for label, queryset, keep_linked, archive_name in jobs:
+            if options['dry_run']:
+                count = retention.count(queryset, keep_linked)
+                self.stdout.write(f'🔎 {label}: будет удалено {count}')
+                total += count
+                continue
+
+            group_started = time.monotonic()
+
+            def progress(deleted):
+                elapsed = time.monotonic() - group_started
+                self.stdout.write(f'⏳ {label}: удалено {deleted}, {deleted / elapsed if elapsed else 0:.0f} сообщ./с')
+
+            if archive_dir:
+                with retention.ArchiveWriter(archive_dir / archive_name) as archive:
+                    deleted = retention.purge(
+                        queryset, keep_linked, options['chunk_size'], options['sleep'], archive, progress,
+                    )
+                if deleted:
+                    self.stdout.write(f'📦 Архив: {archive.path}')
+                else:
+                    archive.path.unlink(missing_ok=True)
+            else:
+                deleted = retention.purge(queryset, keep_linked, options['chunk_size'], options['sleep'], progress=progress)
+            total += deleted
+
+        elapsed = time.monotonic() - started
+        verb = 'будет удалено' if options['dry_run'] else 'удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Готово: {verb} {total} сообщений за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.0f} сообщ./с)'
+        ))
+
+    def collect_jobs(self, options):
+        """[(подпись, queryset, не трогать связанные, имя файла архива)]"""
+        stamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        if options['date_from'] or options['date_to']:
+            try:
+                date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+                date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+            except ValueError as e:
+                raise CommandError(f'Неверная дата: {e}')
+            start, end = date_ranges.day_range(date_from, date_to)
+            queryset = retention.messages_in_period(start, end, chat_id=options['group'])
+            name = f"stream_{options['group'] or 'all'}_{stamp}.jsonl.gz"
+            return [(f"{date_from or '…'} — {date_to or '…'}", queryset, not options['include_linked'], name)]
+
+        groups = retention.groups_with_retention()
+        if options['group']:
+            groups = groups.filter(chat_id=options['group'])
+            if not TelegramGroup.objects.filter(chat_id=options['group']).exists():
+                raise CommandError(f"Группа {options['group']} не найдена")
+        now = timezone.now()
+        return [
+            (
+                f'{group} (>{group.retention_days} дн.)',
+                retention.expired_messages(group, now),
+                group.retention_keep_linked,
+                f'stream_{group.chat_id}_{stamp}.jsonl.gz',
+            )
+            for group in groups
+        ]
@@ -0,0 +1,88 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tickets import export_jobs
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять устаревшие выгрузки, сек
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые выгрузки обращений (XLSX, CSV, колоночный ZIP) в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'EXPORT_WORKER_PROCESSES', 2),
+                            help='Сколько выгрузок выполнять параллельно')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Пауза между проверками очереди, сек')
+        parser.add_argument('--lease', type=int, default=600,
+                            help='Через сколько секунд без отметок обработчика задание возвращается в очередь')
+        parser.add_argument('--keep-days', type=int, default=getattr(settings, 'EXPORT_KEEP_DAYS', 7),
+                            help='Сколько дней хранить готовые выгрузки')
+        parser.add_argument('--once', action='store_true', help='Выполнить очередь и завершиться')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        self.stdout.write(self.style.SUCCESS(f'📦 Export worker started ({processes} proc.). Press Ctrl+C to stop.'))
+
+        pool = self.make_pool(processes)
+        running = {}
+        last_purge = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    purged = export_jobs.purge_expired(options['keep_days'])
+                    if purged:
+                        self.stdout.write(f'🧹 Удалено устаревших выгрузок: {purged}')
+                    last_purge = time.monotonic()
+
+                free = processes - len(running)
+                for job_id in export_jobs.claim(free, options['lease']) if free else []:
+                    self.stdout.write(f'⏳ Выгрузка #{job_id} запущена')
+                    running[pool.submit(export_jobs.run, job_id)] = job_id
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        # Процесс пула упал (например, нехватка памяти) — задание помечаем ошибочным
+                        logger.error(f"Export job {job_id} crashed: {e}", exc_info=True)
+                        export_jobs.mark_failed(job_id, f'{type(e).__name__}: {e}')
+                        status = 'failed'
+                        if isinstance(e, BrokenProcessPool) and not running:
+                            pool.shutdown(wait=False)
+                            pool = self.make_pool(processes)
+                    if status == 'done':
+                        self.stdout.write(self.style.SUCCESS(f'✅ Выгрузка #{job_id} готова'))
+                    else:
+                        self.stdout.write(self.style.ERROR(f'❌ Выгрузка #{job_id}: ошибка'))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def make_pool(self, processes):
+        # Соединения с БД не должны переходить в дочерние процессы: spawn + django.setup() в каждом
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
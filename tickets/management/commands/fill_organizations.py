@@ -1,7 +1,11 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from tickets.models import Ticket
-from django.db.models import Count
+from django.utils import timezone
+from tickets import rollups
+from tickets.models import Client, Ticket
+from django.db.models import Count, OuterRef, Subquery
 
 
 class Command(BaseCommand):
@@ -18,6 +22,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Автоподтверждение без запроса',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Сколько обращений обновлять за одну транзакцию (по умолчанию 5000)',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
@@ -45,7 +55,7 @@ class Command(BaseCommand):
 
         if dry_run:
             self.stdout.write(self.style.WARNING('🔍 РЕЖИМ ПРОСМОТРА (--dry-run):'))
-            for ticket in tickets_without_org[:10]:  # Показываем первые 10
+            for ticket in tickets_without_org.select_related('client__organization')[:10]:  # Показываем первые 10
                 if ticket.client and ticket.client.organization:
                     self.stdout.write(
                         f'✅ #{ticket.id}: {ticket.client.name} → {ticket.client.organization.name}'
@@ -68,50 +78,77 @@ class Command(BaseCommand):
                 return
 
         # Выполняем заполнение
-        self.fill_organizations()
+        self.fill_organizations(chunk_size=options['chunk_size'])
 
         # Показываем итоговую статистику
         self.show_statistics()
 
-    def fill_organizations(self):
-        """Заполняет поле organization в обращениях из организации клиента"""
+    def fill_organizations(self, chunk_size=5000):
+        """Заполняет поле organization в обращениях из организации клиента.
+
+        Обновление выполняется пачками по id одним UPDATE с подзапросом к клиенту,
+        каждая пачка — в своей короткой транзакции, чтобы не блокировать БД на всё время работы.
+        """
         
         self.stdout.write('🔍 Начинаем заполнение организаций в обращениях...')
 
         tickets_without_org = Ticket.objects.filter(organization__isnull=True)
-        
+        fillable = tickets_without_org.filter(client__organization__isnull=False)
+        skipped = tickets_without_org.filter(client__organization__isnull=True).select_related('client')
+
+        # Показываем первые 20 обращений, которые будут обновлены
+        for ticket in fillable.select_related('client__organization').order_by('pk')[:20]:
+            self.stdout.write(
+                f'✅ #{ticket.id}: {ticket.client.name} → {ticket.client.organization.name}'
+            )
+
+        # Показываем первые 10 пропущенных
+        for ticket in skipped.order_by('pk')[:10]:
+            self.stdout.write(
+                f'⏭️  #{ticket.id}: {ticket.client.name if ticket.client else "Без клиента"} (нет организации у клиента)'
+            )
+        skipped_count = skipped.count()
+
+        client_organization = Subquery(
+            Client.objects.filter(pk=OuterRef('client_id')).values('organization_id')[:1]
+        )
+
         # Статистика
         updated_count = 0
-        skipped_count = 0
         errors = []
+        started = time.monotonic()
+        last_id = 0
+        # Дни обновлённых обращений — сводки аналитики за них пересчитываются в конце
+        touched_days = set()
+
+        while True:
+            ids = list(fillable.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            try:
+                with transaction.atomic():
+                    updated_count += Ticket.objects.filter(pk__in=ids, organization__isnull=True).update(
+                        organization=client_organization,
+                        updated_at=timezone.now(),
+                    )
+                    touched_days.update(rollups.ticket_days(Ticket.objects.filter(pk__in=ids)))
+            except Exception as e:
+                error_msg = f'❌ #{ids[0]}–#{last_id}: Ошибка - {str(e)}'
+                errors.append(error_msg)
+                self.stdout.write(self.style.ERROR(error_msg))
+                continue
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'⏳ Обновлено {updated_count} (до #{last_id}), '
+                f'{updated_count / elapsed if elapsed else 0:.0f} обращений/с'
+            )
 
-        with transaction.atomic():
-            for ticket in tickets_without_org:
-                try:
-                    # Проверяем, есть ли у клиента организация
-                    if ticket.client and ticket.client.organization:
-                        ticket.organization = ticket.client.organization
-                        ticket.save()
-                        updated_count += 1
-
-                        if updated_count <= 20:  # Показываем первые 20
-                            self.stdout.write(
-                                f'✅ #{ticket.id}: {ticket.client.name} → {ticket.client.organization.name}'
-                            )
-                        elif updated_count == 21:
-                            self.stdout.write('... (продолжаем без вывода)')
-                            
-                    else:
-                        skipped_count += 1
-                        if skipped_count <= 10:  # Показываем первые 10 пропущенных
-                            self.stdout.write(
-                                f'⏭️  #{ticket.id}: {ticket.client.name if ticket.client else "Без клиента"} (нет организации у клиента)'
-                            )
-
-                except Exception as e:
-                    error_msg = f'❌ #{ticket.id}: Ошибка - {str(e)}'
-                    errors.append(error_msg)
-                    self.stdout.write(self.style.ERROR(error_msg))
+        if touched_days:
+            rollups.refresh_days(touched_days)
+            self.stdout.write(f'📊 Сводки аналитики пересчитаны за {len(touched_days)} дн.')
 
         # Итоговая статистика
         self.stdout.write('\n' + '=' * 50)
@@ -119,6 +156,7 @@ class Command(BaseCommand):
         self.stdout.write(f'✅ Обновлено обращений: {updated_count}')
         self.stdout.write(f'⏭️  Пропущено обращений: {skipped_count}')
         self.stdout.write(f'❌ Ошибок: {len(errors)}')
+        self.stdout.write(f'⏱️  Время: {time.monotonic() - started:.1f} с')
 
         if errors:
             self.stdout.write('\n🚨 ОШИБКИ:')
@@ -1,6 +1,15 @@
-from django.core.management.base import BaseCommand
-from tickets.models import TelegramMessage, TicketComment
-from tickets.management.commands.bot import Command
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tickets import archive, search
+from tickets.authors import message_senders, resolve_authors
+from tickets.models import TelegramMessage, TelegramMessageLink, TicketComment
+from tickets.management.commands.bot import Command as BotCommand
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +34,22 @@ class Command(BaseCommand):
             action='store_true',
             help='Обработать все необработанные ответные сообщения'
         )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Обрабатывать только сообщения начиная с даты (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько сообщений обрабатывать за один проход (по умолчанию 2000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать, сколько ответов будет связано, без изменений'
+        )
 
     def handle(self, *args, **options):
         if options['message_id']:
@@ -32,34 +57,57 @@ class Command(BaseCommand):
             self.process_specific_message(options['message_id'], options['chat_id'])
         elif options['all']:
             # Обрабатываем все необработанные ответные сообщения
-            self.process_all_unprocessed_replies()
+            self.process_all_unprocessed_replies(
+                chat_id=options['chat_id'],
+                since=self.parse_since(options['since']),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
         else:
             self.stdout.write(
                 self.style.ERROR('Укажите --message-id или --all для обработки')
             )
 
+    def parse_since(self, value):
+        if not value:
+            return None
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Дата --since должна быть в формате YYYY-MM-DD')
+        return timezone.make_aware(datetime.combine(day, dt_time.min))
+
     def process_specific_message(self, message_id, chat_id):
         """Обрабатывает конкретное сообщение"""
         try:
-            message = TelegramMessage.objects.get(message_id=message_id, chat_id=chat_id)
-            
+            messages = TelegramMessage.objects.filter(message_id=message_id)
+            if chat_id:
+                messages = messages.filter(chat_id=chat_id)
+            message = messages.order_by('id').first()
+            if not message:
+                # Сообщение могло уйти в архив (archive_stream); при связывании оно вернётся в поток
+                archived = archive.find_messages([message_id], chat_id=chat_id)
+                message = archived[0] if archived else None
+            if not message:
+                raise TelegramMessage.DoesNotExist
+
             if not message.reply_to_message_id:
                 self.stdout.write(
                     self.style.WARNING(f'Сообщение {message_id} не является ответом')
                 )
                 return
-            
+
             self.stdout.write(f'Обрабатываем сообщение {message_id}...')
-            
+
             # Вызываем автосвязывание напрямую
-            self._check_and_link_reply_to_comment(
-                message, 
-                message.reply_to_message_id, 
+            BotCommand()._check_and_link_reply_to_comment(
+                message,
+                message.reply_to_message_id,
                 message.chat_id
             )
-            
+
             # Проверяем результат
-            comment = TicketComment.objects.filter(telegram_message_id=message_id).first()
+            comment = TelegramMessageLink.find_comment(message.chat_id, message.message_id)
             if comment:
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -70,7 +118,7 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.WARNING(f'❌ Сообщение {message_id} не было связано')
                 )
-                
+
         except TelegramMessage.DoesNotExist:
             self.stdout.write(
                 self.style.ERROR(f'Сообщение {message_id} не найдено')
@@ -80,53 +128,120 @@ class Command(BaseCommand):
                 self.style.ERROR(f'Ошибка при обработке сообщения {message_id}: {e}')
             )
 
-    def process_all_unprocessed_replies(self, bot_command):
-        """Обрабатывает все необработанные ответные сообщения"""
-        # Находим все ответные сообщения, которые еще не связаны с комментариями
-        reply_messages = TelegramMessage.objects.filter(
-            reply_to_message_id__isnull=False,
-            linked_ticket__isnull=True  # Не связаны с обращениями
-        ).order_by('created_at')
-        
-        self.stdout.write(f'Найдено {reply_messages.count()} необработанных ответных сообщений')
-        
-        processed = 0
+    def process_all_unprocessed_replies(self, chat_id=None, since=None, chunk_size=2000, dry_run=False):
+        """Обрабатывает все необработанные ответные сообщения пачками по id"""
+        # Ответные сообщения, которые еще не связаны с обращениями
+        reply_messages = TelegramMessage.objects.filter(linked_ticket__isnull=True).exclude(reply_to_message_id='')
+        if chat_id:
+            reply_messages = reply_messages.filter(chat_id=chat_id)
+        if since:
+            reply_messages = reply_messages.filter(message_date__gte=since)
+        reply_messages = reply_messages.only(
+            'id', 'message_id', 'reply_to_message_id', 'chat_id', 'from_user_id',
+            'from_username', 'from_fullname', 'text', 'message_date',
+        ).order_by('id')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('РЕЖИМ ПРОВЕРКИ: изменения не сохраняются'))
+
+        started = time.monotonic()
+        last_id = 0
+        scanned = 0
         linked = 0
-        
-        for message in reply_messages:
-            try:
-                self.stdout.write(f'Обрабатываем сообщение {message.message_id}...')
-                
-                # Вызываем автосвязывание
-                bot_command._check_and_link_reply_to_comment(
-                    message, 
-                    message.reply_to_message_id, 
-                    message.chat_id
-                )
-                
-                processed += 1
-                
-                # Проверяем результат
-                comment = TicketComment.objects.filter(telegram_message_id=message.message_id).first()
-                if comment:
-                    linked += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'✅ Связано с комментарием {comment.id} в обращении #{comment.ticket.id}'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING('❌ Не связано')
-                    )
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Ошибка при обработке сообщения {message.message_id}: {e}')
-                )
-        
+        while True:
+            chunk = list(reply_messages.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            scanned += len(chunk)
+
+            if dry_run:
+                linked += self.link_chunk(chunk, dry_run=True)
+            else:
+                with transaction.atomic():
+                    linked += self.link_chunk(chunk)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Просмотрено {scanned}, связано {linked}, '
+                f'{scanned / elapsed if elapsed else 0:.0f} сообщ./с (последний id {last_id})'
+            )
+
+        elapsed = time.monotonic() - started
         self.stdout.write(
             self.style.SUCCESS(
-                f'Обработка завершена: {processed} обработано, {linked} связано'
+                f'Обработка завершена за {elapsed:.1f} с: {scanned} обработано, {linked} '
+                f'{"будет связано" if dry_run else "связано"}'
             )
         )
+
+    def link_chunk(self, chunk, dry_run=False) -> int:
+        """Связывает пачку ответов: исходные сообщения и авторы определяются запросами IN"""
+        chat_ids = {msg.chat_id for msg in chunk}
+
+        # Комментарии, на сообщения которых отвечают (с учётом чата)
+        parents = {}
+        for link in TelegramMessageLink.objects.filter(
+            chat_id__in=chat_ids,
+            message_id__in={msg.reply_to_message_id for msg in chunk},
+            comment__isnull=False,
+        ).select_related('comment'):
+            parents[(link.chat_id, link.message_id)] = link.comment
+
+        # Уже связанные сообщения повторно не обрабатываем
+        already_linked = set(
+            TelegramMessageLink.objects.filter(
+                chat_id__in=chat_ids,
+                message_id__in={msg.message_id for msg in chunk},
+            ).values_list('chat_id', 'message_id')
+        )
+
+        candidates = [
+            msg for msg in chunk
+            if (msg.chat_id, msg.message_id) not in already_linked
+        ]
+        if not candidates:
+            return 0
+
+        authors = resolve_authors(message_senders(candidates), create_missing=not dry_run)
+
+        comments = []
+        links = []
+        linked_messages = defaultdict(list)
+        # По порядку id: ответ на ответ из этой же пачки тоже найдёт своё обращение
+        for msg in candidates:
+            parent = parents.get((msg.chat_id, msg.reply_to_message_id))
+            if parent is None:
+                continue
+            author_type, author_user, author_client = authors.get(msg.from_user_id, ('client', None, None))
+            comment = TicketComment(
+                ticket_id=parent.ticket_id,
+                author=author_user,
+                author_type=author_type,
+                author_client=author_client,
+                content=msg.text,
+                is_internal=False,
+                telegram_message_id=msg.message_id,
+                created_at=msg.message_date,
+            )
+            parents[(msg.chat_id, msg.message_id)] = comment
+            comments.append(comment)
+            links.append((msg, comment))
+            linked_messages[parent.ticket_id].append(msg.id)
+
+        if dry_run or not comments:
+            return len(comments)
+
+        TicketComment.objects.bulk_create(comments)
+        search.index_comments(comments)
+        TelegramMessageLink.objects.bulk_create(
+            [
+                TelegramMessageLink(chat_id=msg.chat_id, message_id=msg.message_id, ticket_id=comment.ticket_id, comment=comment)
+                for msg, comment in links
+            ],
+            ignore_conflicts=True,
+        )
+        # Ответы пачки обычно относятся к немногим обращениям — один UPDATE на обращение
+        for ticket_id, message_ids in linked_messages.items():
+            TelegramMessage.objects.filter(id__in=message_ids).update(linked_ticket_id=ticket_id, linked_action='add_comment')
+        return len(comments)
@@ -0,0 +1,36 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tickets import rollups
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает сводные таблицы аналитики (обращения и теги по дням)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк сводки записывать за один раз (по умолчанию 2000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('📊 ПЕРЕСТРОЙКА СВОДОК АНАЛИТИКИ'))
+        self.stdout.write('=' * 50)
+
+        started = time.monotonic()
+
+        def progress(total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'⏳ Записано {total} строк сводки, {total / elapsed if elapsed else 0:.0f} строк/с')
+
+        with transaction.atomic():
+            total = rollups.rebuild(apps.get_model, chunk_size=options['chunk_size'], progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Готово: {total} строк сводки за {time.monotonic() - started:.1f} с')
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tickets import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс автокомплита (клиенты, организации, категории, группы Telegram, пользователи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=sorted(autocomplete.SOURCES),
+            help='Перестроить только указанный вид объектов (можно несколько раз)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько слов записывать за один раз (по умолчанию 2000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🔤 ПЕРЕСТРОЙКА ИНДЕКСА АВТОКОМПЛИТА'))
+        self.stdout.write('=' * 50)
+
+        started = time.monotonic()
+
+        def progress(kind, total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'⏳ {kind}: записано {total} слов, {total / elapsed if elapsed else 0:.0f} слов/с')
+
+        with transaction.atomic():
+            total = autocomplete.rebuild(
+                apps.get_model, kinds=options['kind'], chunk_size=options['chunk_size'], progress=progress
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Готово: {total} слов за {time.monotonic() - started:.1f} с')
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from tickets import search
+from tickets.models import TelegramMessage, Ticket, TicketComment
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс обращений, комментариев и сообщений потока'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько документов записывать за один раз (по умолчанию 2000)',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            self.stdout.write(
+                self.style.WARNING(f'Полнотекстовый индекс поддерживается только для SQLite (СУБД: {connection.vendor}), поиск работает через icontains')
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS('🔎 ПЕРЕСТРОЙКА ПОИСКОВОГО ИНДЕКСА'))
+        self.stdout.write('=' * 50)
+
+        started = time.monotonic()
+
+        def progress(total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'⏳ Проиндексировано {total} документов, {total / elapsed if elapsed else 0:.0f} док./с')
+
+        with connection.cursor() as cursor:
+            cursor.execute(search.CREATE_TABLE_SQL)
+        with transaction.atomic():
+            total = search.rebuild(Ticket, TicketComment, TelegramMessage, chunk_size=options['chunk_size'], progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Готово: {total} документов за {time.monotonic() - started:.1f} с')
+        )
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from itertools import groupby
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter, TelegramError
+
+from tickets import outbox
+from tickets.telegram_client import make_sender
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Доставляет исходящие сообщения Telegram из очереди (outbox).'
+
+    # Первая пауза перед повторной записью доставки, сек (дальше удваивается до 30)
+    record_retry_delay = 0.5
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', type=str, help='Telegram bot token (overrides settings.TELEGRAM_BOT_TOKEN)')
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'TELEGRAM_OUTBOX_CONCURRENCY', 4),
+                            help='Сколько чатов обслуживать параллельно')
+        parser.add_argument('--batch-size', type=int, default=50, help='Сколько заданий забирать за один проход')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза между проверками пустой очереди, сек')
+        parser.add_argument('--max-attempts', type=int, default=getattr(settings, 'TELEGRAM_OUTBOX_MAX_ATTEMPTS', 8),
+                            help='После стольких неудачных попыток задание помечается ошибочным')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        token = options.get('token') or getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
+        if not token:
+            self.stderr.write(self.style.ERROR('TELEGRAM_BOT_TOKEN is not set. Provide via settings or --token.'))
+            return
+
+        self.max_attempts = options['max_attempts']
+        # Пул соединений не меньше числа параллельно обслуживаемых чатов
+        pool_size = max(int(getattr(settings, 'TELEGRAM_CONNECTION_POOL_SIZE', 8)), options['concurrency'])
+        sender = make_sender(token, pool_size=pool_size)
+
+        self.stdout.write(self.style.SUCCESS('Telegram outbox worker started. Press Ctrl+C to stop.'))
+        try:
+            asyncio.run(self.run(sender.build_bot(), options))
+        except KeyboardInterrupt:
+            pass
+
+    async def run(self, bot, options):
+        self.semaphore = asyncio.Semaphore(options['concurrency'])
+        await bot.initialize()
+        try:
+            while True:
+                items = await sync_to_async(outbox.claim_batch)(options['batch_size'])
+                if not items:
+                    if options['once']:
+                        break
+                    await asyncio.sleep(options['poll_interval'])
+                    continue
+                # Сообщения одного чата доставляем строго по порядку, разные чаты — параллельно
+                by_chat = [list(group) for _, group in groupby(sorted(items, key=lambda i: (i.chat_id, i.id)), key=lambda i: i.chat_id)]
+                await asyncio.gather(*(self.deliver_chat(bot, chat_items) for chat_items in by_chat))
+        finally:
+            await bot.shutdown()
+
+    async def deliver_chat(self, bot, items):
+        async with self.semaphore:
+            for index, item in enumerate(items):
+                try:
+                    outcome, message_id = await self.deliver(bot, item)
+                except RetryAfter as e:
+                    # 429: Telegram сам сообщает, сколько ждать; остальные сообщения чата ждут вместе с этим
+                    delay = float(e.retry_after)
+                    logger.warning(f"Telegram flood control for chat {item.chat_id}: retry after {delay}s")
+                    for pending in items[index:]:
+                        await sync_to_async(outbox.mark_retry)(pending, str(e), delay, count_attempt=pending is item)
+                    return
+                except (BadRequest, Forbidden, InvalidToken, ChatMigrated) as e:
+                    await sync_to_async(outbox.mark_failed)(item, f'{type(e).__name__}: {e}')
+                except (TelegramError, OSError) as e:
+                    await self.retry_or_fail(item, f'{type(e).__name__}: {e}')
+                except Exception as e:
+                    logger.error(f"Telegram outbox item {item.id} crashed: {e}", exc_info=True)
+                    await self.retry_or_fail(item, f'{type(e).__name__}: {e}')
+                else:
+                    # Вызов Bot API прошёл: дальше ни одна ошибка не должна вернуть задание в очередь
+                    await self.record(item, outcome, message_id)
+                    continue
+                # Правка или удаление не должны уйти раньше сообщения, от которого зависят:
+                # остаток пачки возвращаем в очередь, claim_batch выдаст его после этого задания
+                await sync_to_async(outbox.release)(items[index + 1:])
+                return
+
+    async def record(self, item, outcome: str, message_id=None):
+        """Записывает доставку. Сообщение уже в Telegram, поэтому запись статуса повторяется,
+        пока не пройдёт (например, при «database is locked»), а ошибка учёта в комментарии
+        и потоке только логируется"""
+        delay = self.record_retry_delay
+        while True:
+            try:
+                await sync_to_async(outbox.mark_sent)(item, outcome, message_id)
+                break
+            except Exception as e:
+                logger.error(f"Could not record delivery of outbox item {item.id}, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        try:
+            await sync_to_async(outbox.apply_result)(item, outcome)
+        except Exception as e:
+            logger.error(f"Telegram outbox item {item.id} delivered, but bookkeeping failed: {e}", exc_info=True)
+
+    async def retry_or_fail(self, item, error: str):
+        if item.attempts + 1 >= self.max_attempts:
+            await sync_to_async(outbox.mark_failed)(item, error)
+        else:
+            # Экспоненциальная задержка: 2, 4, 8, ... но не больше 5 минут
+            delay = min(2 ** (item.attempts + 1), 300)
+            await sync_to_async(outbox.mark_retry)(item, error, delay)
+
+    async def deliver(self, bot, item):
+        """Выполняет вызовы Bot API задания. Возвращает (outcome, message_id) для mark_sent"""
+        chat_id = item.chat_id
+        reply_to = int(item.reply_to_message_id) if item.reply_to_message_id else None
+
+        if item.action == 'delete':
+            await bot.delete_message(chat_id=chat_id, message_id=int(item.target_message_id))
+            return 'deleted', None
+
+        if item.action == 'edit':
+            target = await sync_to_async(outbox.resolve_target)(item)
+            try:
+                if not target:
+                    # Исходное сообщение так и не было доставлено
+                    raise BadRequest('Message to edit not found')
+                await bot.edit_message_text(chat_id=chat_id, message_id=int(target), text=item.text)
+                return 'edited', None
+            except BadRequest as edit_error:
+                if not item.fallback_to_send:
+                    raise
+                logger.warning(f"Could not edit message {target or '-'}, sending new one: {edit_error}")
+                if item.delete_on_fallback and target:
+                    try:
+                        await bot.delete_message(chat_id=chat_id, message_id=int(target))
+                    except TelegramError as delete_error:
+                        logger.warning(f"Could not delete old message: {delete_error}")
+
+        result = await bot.send_message(chat_id=chat_id, text=item.text, reply_to_message_id=reply_to)
+        return 'sent', result.message_id
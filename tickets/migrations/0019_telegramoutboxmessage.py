@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0018_ticketcomment_telegram_message_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramOutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('send', 'Отправить'), ('edit', 'Редактировать'), ('delete', 'Удалить')], default='send', max_length=10, verbose_name='Действие')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('chat_id', models.CharField(max_length=64, verbose_name='ID чата')),
+                ('chat_title', models.CharField(blank=True, max_length=255, verbose_name='Название чата')),
+                ('text', models.TextField(blank=True, verbose_name='Текст')),
+                ('reply_to_message_id', models.CharField(blank=True, max_length=64, verbose_name='Ответ на сообщение')),
+                ('target_message_id', models.CharField(blank=True, help_text='ID сообщения для редактирования/удаления', max_length=64, verbose_name='Изменяемое сообщение')),
+                ('fallback_to_send', models.BooleanField(default=False, verbose_name='Отправить новое, если не удалось отредактировать')),
+                ('delete_on_fallback', models.BooleanField(default=False, verbose_name='Удалить старое сообщение перед отправкой нового')),
+                ('linked_action', models.CharField(blank=True, max_length=16, verbose_name='Действие в потоке')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('locked_by', models.CharField(blank=True, max_length=36, verbose_name='Обработчик')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взято в обработку')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('result_message_id', models.CharField(blank=True, max_length=64, verbose_name='ID отправленного сообщения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Доставлено')),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tickets.ticketcomment', verbose_name='Комментарий')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tickets.ticket', verbose_name='Обращение')),
+            ],
+            options={
+                'verbose_name': 'Исходящее сообщение Telegram',
+                'verbose_name_plural': 'Исходящие сообщения Telegram',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='tickets_tel_status_febaa8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0019_telegramoutboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(unique=True, verbose_name='ID обновления')),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Получено')),
+            ],
+            options={
+                'verbose_name': 'Обновление Telegram',
+                'verbose_name_plural': 'Обновления Telegram',
+            },
+        ),
+    ]
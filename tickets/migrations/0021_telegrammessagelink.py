@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0020_telegramupdate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramMessageLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=64, verbose_name='ID чата')),
+                ('message_id', models.CharField(max_length=64, verbose_name='ID сообщения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='telegram_links', to='tickets.ticketcomment', verbose_name='Комментарий')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telegram_links', to='tickets.ticket', verbose_name='Обращение')),
+            ],
+            options={
+                'verbose_name': 'Связь сообщения Telegram',
+                'verbose_name_plural': 'Связи сообщений Telegram',
+                'constraints': [models.UniqueConstraint(fields=('chat_id', 'message_id'), name='unique_telegram_message_link')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:28
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_links(apps, schema_editor):
+    """Заполняет связи сообщений из комментариев, сообщений с решениями и исходных сообщений обращений"""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketComment = apps.get_model('tickets', 'TicketComment')
+    TelegramMessage = apps.get_model('tickets', 'TelegramMessage')
+    TelegramMessageLink = apps.get_model('tickets', 'TelegramMessageLink')
+
+    def flush(batch):
+        if batch:
+            TelegramMessageLink.objects.bulk_create(batch, ignore_conflicts=True)
+            batch.clear()
+
+    # Чат комментария — чат сообщения в потоке, связанного с тем же обращением, иначе чат обращения
+    stream_chats = {}
+    for message_id, ticket_id, chat_id in (
+        TelegramMessage.objects.filter(linked_ticket__isnull=False)
+        .values_list('message_id', 'linked_ticket_id', 'chat_id')
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        stream_chats.setdefault((message_id, ticket_id), chat_id)
+
+    batch = []
+    comments = (
+        TicketComment.objects.exclude(telegram_message_id__isnull=True).exclude(telegram_message_id='')
+        .values_list('id', 'telegram_message_id', 'ticket_id', 'ticket__telegram_chat_id')
+        .order_by('id')
+    )
+    for comment_id, message_id, ticket_id, ticket_chat_id in comments.iterator(chunk_size=BATCH_SIZE):
+        chat_id = stream_chats.get((message_id, ticket_id)) or ticket_chat_id
+        if chat_id:
+            batch.append(TelegramMessageLink(chat_id=chat_id, message_id=message_id, ticket_id=ticket_id, comment_id=comment_id))
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+    flush(batch)
+
+    resolutions = (
+        TelegramMessage.objects.filter(linked_action='resolve_ticket', linked_ticket__isnull=False)
+        .values_list('chat_id', 'message_id', 'linked_ticket_id')
+        .order_by('id')
+    )
+    for chat_id, message_id, ticket_id in resolutions.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TelegramMessageLink(chat_id=chat_id, message_id=message_id, ticket_id=ticket_id))
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+    flush(batch)
+
+    tickets = (
+        Ticket.objects.exclude(telegram_chat_id='').exclude(external_message_id='')
+        .values_list('telegram_chat_id', 'external_message_id', 'id')
+        .order_by('id')
+    )
+    for chat_id, message_id, ticket_id in tickets.iterator(chunk_size=BATCH_SIZE):
+        if chat_id and message_id:
+            batch.append(TelegramMessageLink(chat_id=chat_id, message_id=message_id, ticket_id=ticket_id))
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+    flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0021_telegrammessagelink'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0022_backfill_telegrammessagelink'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegrammessage',
+            index=models.Index(fields=['message_date', 'id'], name='tickets_tel_message_4cc136_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telegrammessage',
+            index=models.Index(fields=['chat_id', 'message_date', 'id'], name='tickets_tel_chat_id_5f9d02_idx'),
+        ),
+    ]
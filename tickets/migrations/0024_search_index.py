@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-17 05:40
+
+from django.db import migrations
+
+from tickets.stemmer import stem_words
+
+# Схема и заполнение индекса на момент этой миграции (tickets/search.py может меняться дальше)
+TABLE = 'tickets_search'
+KIND_TICKET = 1
+KIND_COMMENT = 2
+KIND_MESSAGE = 3
+CHUNK_SIZE = 2000
+
+
+def normalize(*parts):
+    return ' '.join(stem_words(' '.join(part for part in parts if part)))
+
+
+def create_search_index(apps, schema_editor):
+    """Создаёт таблицу FTS5 и индексирует существующие обращения, комментарии и сообщения (только SQLite)"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "title, body, ticket_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+    using = connection.alias
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketComment = apps.get_model('tickets', 'TicketComment')
+    TelegramMessage = apps.get_model('tickets', 'TelegramMessage')
+
+    sources = [
+        (
+            Ticket.objects.using(using).order_by('pk').values_list(
+                'pk', 'title', 'description', 'tags', 'resolution', 'client__name', 'category__name'
+            ),
+            lambda v: (v[0] * 4 + KIND_TICKET, normalize(v[1]), normalize(*v[2:]), v[0]),
+        ),
+        (
+            TicketComment.objects.using(using).order_by('pk').values_list('pk', 'content', 'ticket_id'),
+            lambda v: (v[0] * 4 + KIND_COMMENT, '', normalize(v[1]), v[2]),
+        ),
+        (
+            TelegramMessage.objects.using(using).order_by('pk').values_list('pk', 'from_fullname', 'from_username', 'text'),
+            lambda v: (v[0] * 4 + KIND_MESSAGE, normalize(v[1], v[2]), normalize(v[3]), None),
+        ),
+    ]
+    insert = f"INSERT INTO {TABLE} (rowid, title, body, ticket_id) VALUES (%s, %s, %s, %s)"
+    with connection.cursor() as cursor:
+        for values, make_row in sources:
+            rows = []
+            for value in values.iterator(chunk_size=CHUNK_SIZE):
+                rows.append(make_row(value))
+                if len(rows) >= CHUNK_SIZE:
+                    cursor.executemany(insert, rows)
+                    rows.clear()
+            if rows:
+                cursor.executemany(insert, rows)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0023_telegrammessage_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
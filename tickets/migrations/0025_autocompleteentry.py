@@ -0,0 +1,91 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:38
+
+import re
+
+from django.db import migrations, models
+
+# Правила индекса на момент этой миграции (tickets/autocomplete.py может меняться дальше)
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+TOKEN_LENGTH = 128
+EXTRA_FIELD_POSITION = 100
+RELATED_POSITION = 200
+MAX_POSITION = 32767
+CHUNK_SIZE = 2000
+
+
+def client_fields(client):
+    digits = ''.join(ch for ch in client.phone or '' if ch.isdigit())
+    return [
+        (client.name, 0),
+        (client.contact_person, EXTRA_FIELD_POSITION),
+        (client.phone, EXTRA_FIELD_POSITION),
+        (digits, EXTRA_FIELD_POSITION),
+        (client.email, EXTRA_FIELD_POSITION),
+        (client.organization.name if client.organization_id else '', RELATED_POSITION),
+    ]
+
+
+# kind → (модель, поля для индекса, select_related)
+SOURCES = {
+    'client': ('tickets.Client', client_fields, ('organization',)),
+    'organization': ('tickets.Organization', lambda obj: [(obj.name, 0), (obj.comment, EXTRA_FIELD_POSITION)], ()),
+    'category': ('tickets.Category', lambda obj: [(obj.name, 0), (obj.description, EXTRA_FIELD_POSITION)], ()),
+    'group': ('tickets.TelegramGroup', lambda obj: [(obj.title, 0), (obj.chat_id, EXTRA_FIELD_POSITION)], ()),
+    'user': ('auth.User', lambda obj: [
+        (obj.first_name, 0), (obj.last_name, 0), (obj.username, 0), (obj.email, EXTRA_FIELD_POSITION),
+    ], ()),
+}
+
+
+def tokens_for(fields) -> dict:
+    """{слово: позиция} (для повторяющегося слова — минимальная позиция)"""
+    result = {}
+    for text, base in fields:
+        for offset, word in enumerate(WORD_RE.findall((text or '').lower().replace('ё', 'е'))):
+            word = word[:TOKEN_LENGTH]
+            position = min(base + offset, MAX_POSITION)
+            if position < result.get(word, MAX_POSITION + 1):
+                result[word] = position
+    return result
+
+
+def fill_autocomplete(apps, schema_editor):
+    Entry = apps.get_model('tickets', 'AutocompleteEntry')
+    for kind, (label, fields, related) in SOURCES.items():
+        batch = []
+        objs = apps.get_model(label).objects.select_related(*related).order_by('pk')
+        for obj in objs.iterator(chunk_size=CHUNK_SIZE):
+            batch.extend(
+                Entry(kind=kind, object_id=obj.pk, token=token, position=position)
+                for token, position in tokens_for(fields(obj)).items()
+            )
+            if len(batch) >= CHUNK_SIZE:
+                Entry.objects.bulk_create(batch)
+                batch = []
+        Entry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0024_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutocompleteEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид объекта')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('token', models.CharField(max_length=128, verbose_name='Слово')),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Порядковый номер слова; слова доп. полей — с 100', verbose_name='Позиция')),
+            ],
+            options={
+                'verbose_name': 'Слово автокомплита',
+                'verbose_name_plural': 'Слова автокомплита',
+                'indexes': [models.Index(fields=['kind', 'token'], name='tickets_aut_kind_5cee80_idx'), models.Index(fields=['kind', 'object_id'], name='tickets_aut_kind_83087d_idx')],
+            },
+        ),
+        migrations.RunPython(fill_autocomplete, migrations.RunPython.noop),
+    ]
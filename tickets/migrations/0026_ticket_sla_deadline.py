@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:41
+
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_sla_fields(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Category = apps.get_model('tickets', 'Category')
+    TicketStatus = apps.get_model('tickets', 'TicketStatus')
+    for category_id, sla_hours in Category.objects.values_list('id', 'sla_hours'):
+        Ticket.objects.filter(category_id=category_id).update(
+            sla_deadline=models.ExpressionWrapper(
+                models.F('created_at') + timedelta(hours=sla_hours),
+                output_field=models.DateTimeField(),
+            )
+        )
+    Ticket.objects.filter(
+        status__in=TicketStatus.objects.filter(is_final=True)
+    ).update(status_is_final=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0025_autocompleteentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_deadline',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Создано + SLA категории в часах', null=True, verbose_name='Контрольный срок'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='status_is_final',
+            field=models.BooleanField(default=False, editable=False, help_text='Копия признака финального статуса для индекса просрочки', verbose_name='Завершено'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status_is_final', 'sla_deadline'], name='tickets_tic_status__2f8824_idx'),
+        ),
+        migrations.RunPython(fill_sla_fields, migrations.RunPython.noop),
+    ]
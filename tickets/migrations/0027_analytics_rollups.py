@@ -0,0 +1,144 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:49
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Заполнение сводок на момент этой миграции (tickets/rollups.py может меняться дальше)
+CHUNK_SIZE = 2000
+TAG_LENGTH = 100
+
+
+def split_tags(tags):
+    return list(dict.fromkeys(tag.strip()[:TAG_LENGTH] for tag in (tags or '').split(',') if tag.strip()))
+
+
+def fill_rollups(apps, schema_editor):
+    """Заполняет сводки по существующим обращениям"""
+    using = schema_editor.connection.alias
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Daily = apps.get_model('tickets', 'TicketDailyStat')
+    Tag = apps.get_model('tickets', 'TicketTagDailyStat')
+    tickets = Ticket.objects.using(using).all()
+
+    rows = []
+    for values in (
+        tickets.annotate(day=TruncDate('created_at'))
+        .values('day', 'category_id', 'organization_id', 'status_id', 'assigned_to_id')
+        .annotate(total=Count('id'))
+        .order_by()
+        .iterator(chunk_size=CHUNK_SIZE)
+    ):
+        values['count'] = values.pop('total')
+        rows.append(Daily(**values))
+        if len(rows) >= CHUNK_SIZE:
+            Daily.objects.using(using).bulk_create(rows)
+            rows = []
+    Daily.objects.using(using).bulk_create(rows)
+
+    tag_counter = Counter()
+    for created_at, category_id, organization_id, tags in (
+        tickets.exclude(tags='').values_list('created_at', 'category_id', 'organization_id', 'tags').iterator(chunk_size=CHUNK_SIZE)
+    ):
+        day = timezone.localdate(created_at)
+        for tag in split_tags(tags):
+            tag_counter[(day, category_id, organization_id, tag)] += 1
+    Tag.objects.using(using).bulk_create(
+        [
+            Tag(day=day, category_id=category_id, organization_id=organization_id, tag=tag, count=count)
+            for (day, category_id, organization_id, tag), count in tag_counter.items()
+        ],
+        batch_size=CHUNK_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0026_ticket_sla_deadline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('count', models.IntegerField(default=0, verbose_name='Обращений')),
+            ],
+            options={
+                'verbose_name': 'Сводка обращений за день',
+                'verbose_name_plural': 'Сводки обращений за день',
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketTagDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('tag', models.CharField(max_length=100, verbose_name='Тег')),
+                ('count', models.IntegerField(default=0, verbose_name='Обращений')),
+            ],
+            options={
+                'verbose_name': 'Сводка тегов за день',
+                'verbose_name_plural': 'Сводки тегов за день',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at'], name='tickets_tic_created_5dd600_idx'),
+        ),
+        migrations.AddField(
+            model_name='ticketdailystat',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Исполнитель'),
+        ),
+        migrations.AddField(
+            model_name='ticketdailystat',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='ticketdailystat',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.organization', verbose_name='Организация'),
+        ),
+        migrations.AddField(
+            model_name='ticketdailystat',
+            name='status',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.ticketstatus', verbose_name='Статус'),
+        ),
+        migrations.AddField(
+            model_name='tickettagdailystat',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='tickettagdailystat',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.organization', verbose_name='Организация'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketdailystat',
+            index=models.Index(fields=['day', 'category', 'organization', 'count'], name='tickets_tic_day_c9b372_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketdailystat',
+            index=models.Index(fields=['organization', 'day', 'count'], name='tickets_tic_organiz_b57d50_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tickettagdailystat',
+            index=models.Index(fields=['day', 'category', 'organization', 'tag', 'count'], name='tickets_tic_day_086087_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tickettagdailystat',
+            index=models.Index(fields=['organization', 'day'], name='tickets_tic_organiz_8b810b_idx'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Перенос тегов на момент этой миграции (tickets/tagging.py может меняться дальше)
+CHUNK_SIZE = 2000
+TAG_LENGTH = 100
+
+
+def split_tags(tags):
+    return list(dict.fromkeys(tag.strip()[:TAG_LENGTH] for tag in (tags or '').split(',') if tag.strip()))
+
+
+def fill_ticket_tags(apps, schema_editor):
+    """Заполняет связи обращений с тегами по полю tags"""
+    using = schema_editor.connection.alias
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Tag = apps.get_model('tickets', 'Tag')
+    TicketTag = apps.get_model('tickets', 'TicketTag')
+
+    def link(batch):
+        names = {name for tag_names in batch.values() for name in tag_names}
+        if not names:
+            return
+        Tag.objects.using(using).bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.using(using).filter(name__in=names).values_list('name', 'id'))
+        TicketTag.objects.using(using).bulk_create([
+            TicketTag(ticket_id=ticket_id, tag_id=tag_ids[name])
+            for ticket_id, tag_names in batch.items()
+            for name in tag_names
+        ])
+
+    batch = {}
+    tickets = Ticket.objects.using(using).exclude(tags='').order_by('pk').values_list('pk', 'tags')
+    for pk, tags in tickets.iterator(chunk_size=CHUNK_SIZE):
+        batch[pk] = split_tags(tags)
+        if len(batch) >= CHUNK_SIZE:
+            link(batch)
+            batch = {}
+    link(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0027_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+            ],
+            options={
+                'verbose_name': 'Тег',
+                'verbose_name_plural': 'Теги',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_links', to='tickets.tag', verbose_name='Тег')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='tickets.ticket', verbose_name='Обращение')),
+            ],
+            options={
+                'verbose_name': 'Тег обращения',
+                'verbose_name_plural': 'Теги обращений',
+                'indexes': [models.Index(fields=['tag', 'ticket'], name='tickets_tic_tag_id_f05d2d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'tag'), name='unique_ticket_tag')],
+            },
+        ),
+        migrations.RunPython(fill_ticket_tags, migrations.RunPython.noop),
+    ]
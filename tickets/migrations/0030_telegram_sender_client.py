@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+
+def link_existing_clients(apps, schema_editor):
+    """Закрепляет за отправителями клиентов с external_id (самый ранний на ID)"""
+    using = schema_editor.connection.alias
+    Client = apps.get_model('tickets', 'Client')
+    TelegramSenderClient = apps.get_model('tickets', 'TelegramSenderClient')
+    max_length = TelegramSenderClient._meta.get_field('from_user_id').max_length
+
+    seen = set()
+    batch = []
+    clients = Client.objects.using(using).exclude(external_id='').order_by('id').values_list('id', 'external_id')
+    for client_id, external_id in clients.iterator(chunk_size=CHUNK_SIZE):
+        if external_id in seen or len(external_id) > max_length:
+            continue
+        seen.add(external_id)
+        batch.append(TelegramSenderClient(from_user_id=external_id, client_id=client_id))
+        if len(batch) >= CHUNK_SIZE:
+            TelegramSenderClient.objects.using(using).bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TelegramSenderClient.objects.using(using).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0029_export_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramSenderClient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_user_id', models.CharField(max_length=64, unique=True, verbose_name='ID отправителя')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telegram_senders', to='tickets.client', verbose_name='Клиент')),
+            ],
+            options={
+                'verbose_name': 'Отправитель Telegram',
+                'verbose_name_plural': 'Отправители Telegram',
+            },
+        ),
+        migrations.RunPython(link_existing_clients, migrations.RunPython.noop),
+    ]
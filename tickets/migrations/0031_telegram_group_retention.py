@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0030_telegram_sender_client'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramgroup',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Сообщения потока старше этого срока удаляет команда cleanup_stream. Пусто — хранить всегда', null=True, verbose_name='Хранить сообщения, дней'),
+        ),
+        migrations.AddField(
+            model_name='telegramgroup',
+            name='retention_keep_linked',
+            field=models.BooleanField(default=True, help_text='Сообщения, по которым создано обращение или комментарий, хранятся бессрочно', verbose_name='Не удалять связанные с обращениями'),
+        ),
+    ]
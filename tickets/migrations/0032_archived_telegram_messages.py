@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0031_telegram_group_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTelegramMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=64, verbose_name='ID чата')),
+                ('message_id', models.CharField(max_length=64, verbose_name='ID сообщения')),
+                ('message_date', models.DateTimeField(verbose_name='Время сообщения')),
+                ('segment', models.CharField(max_length=255, verbose_name='Сегмент архива')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесено в архив')),
+            ],
+            options={
+                'verbose_name': 'Архивное сообщение Telegram',
+                'verbose_name_plural': 'Архивные сообщения Telegram',
+                'indexes': [models.Index(fields=['chat_id', 'message_id'], name='tickets_arc_chat_id_95ffdd_idx'), models.Index(fields=['message_id'], name='tickets_arc_message_60a6ae_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0032_archived_telegram_messages'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status', 'created_at'], name='tickets_tic_status__9c8244_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['organization', 'created_at'], name='tickets_tic_organiz_678400_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:33
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+KEYS = {
+    'TicketDailyStat': ('day', 'category_id', 'organization_id', 'status_id', 'assigned_to_id'),
+    'TicketTagDailyStat': ('day', 'category_id', 'organization_id', 'tag'),
+}
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает строки сводок с одинаковым ключом (появлялись при параллельных сохранениях)"""
+    using = schema_editor.connection.alias
+    for model_name, key_fields in KEYS.items():
+        model = apps.get_model('tickets', model_name)
+        duplicates = (
+            model.objects.using(using)
+            .values(*key_fields)
+            .annotate(rows=Count('id'), first_id=Min('id'), total=Sum('count'))
+            .filter(rows__gt=1)
+            .order_by()
+        )
+        for row in list(duplicates):
+            key = {field: row[field] for field in key_fields}
+            model.objects.using(using).filter(id=row['first_id']).update(count=row['total'])
+            model.objects.using(using).filter(**key).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0033_ticket_period_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ticketdailystat',
+            constraint=models.UniqueConstraint(models.F('day'), models.F('category'), django.db.models.functions.comparison.Coalesce('organization', 0, output_field=models.IntegerField()), models.F('status'), django.db.models.functions.comparison.Coalesce('assigned_to', 0, output_field=models.IntegerField()), name='tickets_daily_stat_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='tickettagdailystat',
+            constraint=models.UniqueConstraint(models.F('day'), models.F('category'), django.db.models.functions.comparison.Coalesce('organization', 0, output_field=models.IntegerField()), models.F('tag'), name='tickets_tag_daily_stat_key'),
+        ),
+    ]
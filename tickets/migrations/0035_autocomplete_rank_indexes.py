@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0034_rollup_unique_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='autocompleteentry',
+            name='tickets_aut_kind_5cee80_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='autocompleteentry',
+            name='tickets_aut_kind_83087d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteentry',
+            index=models.Index(fields=['kind', 'token', 'position', 'object_id'], name='tickets_aut_kind_bb77e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteentry',
+            index=models.Index(fields=['kind', 'position', 'token', 'object_id'], name='tickets_aut_kind_d233d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteentry',
+            index=models.Index(fields=['kind', 'object_id', 'token'], name='tickets_aut_kind_2542cf_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_missing_deadlines(apps, schema_editor):
+    # Обращения, созданные после 0026, сохранялись без контрольного срока:
+    # created_at (auto_now_add) ещё не был заполнен, когда считался срок
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Category = apps.get_model('tickets', 'Category')
+    for category_id, sla_hours in Category.objects.values_list('id', 'sla_hours'):
+        Ticket.objects.filter(category_id=category_id, sla_deadline__isnull=True).update(
+            sla_deadline=models.ExpressionWrapper(
+                models.F('created_at') + timedelta(hours=sla_hours),
+                output_field=models.DateTimeField(),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0035_autocomplete_rank_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:07
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicates(apps, schema_editor):
+    """Оставляет по одной записи на сообщение — последнюю перенесённую (её сегмент свежее)"""
+    using = schema_editor.connection.alias
+    ArchivedTelegramMessage = apps.get_model('tickets', 'ArchivedTelegramMessage')
+    duplicates = (
+        ArchivedTelegramMessage.objects.using(using)
+        .values('chat_id', 'message_id')
+        .annotate(rows=Count('id'), last_id=Max('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in list(duplicates):
+        ArchivedTelegramMessage.objects.using(using).filter(
+            chat_id=row['chat_id'], message_id=row['message_id'],
+        ).exclude(id=row['last_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0036_fill_missing_sla_deadlines'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='archivedtelegrammessage',
+            name='tickets_arc_chat_id_95ffdd_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='archivedtelegrammessage',
+            constraint=models.UniqueConstraint(fields=('chat_id', 'message_id'), name='unique_archived_telegram_message'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 
 
 class Category(models.Model):
@@ -133,21 +134,107 @@ class Ticket(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='created_tickets', verbose_name='Создано пользователем')
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
     
+    # SLA (вычисляются при сохранении, см. refresh_sla_fields и tickets/signals.py)
+    sla_deadline = models.DateTimeField('Контрольный срок', null=True, blank=True, editable=False,
+                                        help_text='Создано + SLA категории в часах')
+    status_is_final = models.BooleanField('Завершено', default=False, editable=False,
+                                          help_text='Копия признака финального статуса для индекса просрочки')
+    
     class Meta:
         verbose_name = 'Обращение'
         verbose_name_plural = 'Обращения'
         ordering = ['-created_at']
+        indexes = [
+            # Просроченные: status_is_final = False AND sla_deadline < now
+            models.Index(fields=['status_is_final', 'sla_deadline']),
+            # Списки «новые сверху» (аналитика, журнал) — без сортировки всей таблицы
+            models.Index(fields=['created_at']),
+            # Период (date_ranges) вместе с фильтром по статусу / организации
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['organization', 'created_at']),
+        ]
     
     def __str__(self):
         return f"#{self.id} - {self.title}"
     
+    # Поля, от которых зависят sla_deadline и status_is_final
+    SLA_SOURCE_FIELDS = ('created_at', 'category_id', 'status_id')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._sla_source = instance._sla_source_values()
+        return instance
+    
+    def _sla_source_values(self):
+        # Через __dict__, чтобы не загружать отложенные (defer/only) поля
+        return tuple(self.__dict__.get(name) for name in self.SLA_SOURCE_FIELDS)
+    
+    def _reference(self, name, lookup):
+        """Связанный справочник: уже загруженный, из кэша справочников, иначе из базы"""
+        field = self._meta.get_field(name)
+        if field.is_cached(self):
+            return getattr(self, name)
+        return lookup(getattr(self, field.attname)) or getattr(self, name)
+    
+    def refresh_sla_fields(self):
+        """Пересчитывает контрольный срок и признак завершённости (SLA и статус — из tickets/caches.py)"""
+        from .caches import get_category, get_status_by_id
+        if self.created_at and self.category_id:
+            category = self._reference('category', get_category)
+            self.sla_deadline = self.created_at + timezone.timedelta(hours=category.sla_hours)
+        else:
+            self.sla_deadline = None
+        self.status_is_final = bool(self.status_id and self._reference('status', get_status_by_id).is_final)
+    
+    def save(self, *args, **kwargs):
+        # SLA-поля пересчитываются только для нового обращения или при смене категории, статуса, даты создания;
+        # изменения самих справочников переносятся в обращения сигналами (tickets/signals.py)
+        # created_at (auto_now_add) нового обращения появляется только при вставке — срок дописывается после неё
+        deadline_after_insert = self._state.adding and not self.created_at
+        if self._state.adding or self._sla_source_values() != getattr(self, '_sla_source', None):
+            self.refresh_sla_fields()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'sla_deadline', 'status_is_final'}
+        super().save(*args, **kwargs)
+        if deadline_after_insert and self.category_id:
+            self.refresh_sla_fields()
+            type(self).objects.filter(pk=self.pk).update(sla_deadline=self.sla_deadline)
+        self._sla_source = self._sla_source_values()
+    
+    @staticmethod
+    def overdue_filter(now=None):
+        """Условие «просрочено»: не завершено и контрольный срок прошёл (по индексу)"""
+        # status_is_final=False Django превращает в «NOT status_is_final», и SQLite не ищет по индексу;
+        # IN (False) даёт равенство по первому полю индекса и диапазон по sla_deadline
+        return Q(status_is_final__in=[False], sla_deadline__lt=now or timezone.now())
+    
+    @classmethod
+    def recalculate_sla(cls, queryset=None):
+        """Пересчитывает SLA-поля набором UPDATE (по одному на категорию и статус). Возвращает число строк"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        updated = 0
+        for category_id, sla_hours in Category.objects.values_list('id', 'sla_hours'):
+            updated += queryset.filter(category_id=category_id).update(
+                sla_deadline=models.ExpressionWrapper(
+                    models.F('created_at') + timezone.timedelta(hours=sla_hours),
+                    output_field=models.DateTimeField(),
+                )
+            )
+        for status_id, is_final in TicketStatus.objects.values_list('id', 'is_final'):
+            queryset.filter(status_id=status_id).exclude(status_is_final=is_final).update(status_is_final=is_final)
+        return updated
+    
     @property
     def is_overdue(self):
         """Проверка просрочки по SLA"""
-        sla_deadline = self.created_at + timezone.timedelta(hours=self.category.sla_hours)
+        sla_deadline = self.sla_deadline
+        if sla_deadline is None:
+            return False
         
         # Для завершенных обращений сравниваем с фактическим временем завершения
-        if self.status.is_final and (self.resolved_at or self.closed_at):
+        if self.status_is_final and (self.resolved_at or self.closed_at):
             end_time = self.resolved_at or self.closed_at
             return end_time > sla_deadline
         
@@ -157,11 +244,10 @@ class Ticket(models.Model):
     @property
     def time_to_deadline(self):
         """Время до дедлайна"""
-        if self.status.is_final:
+        if self.status_is_final or self.sla_deadline is None:
             return None
         
-        sla_deadline = self.created_at + timezone.timedelta(hours=self.category.sla_hours)
-        return sla_deadline - timezone.now()
+        return self.sla_deadline - timezone.now()
     
     @property
     def reaction_time(self):
@@ -354,6 +440,9 @@ class TelegramMessage(models.Model):
             models.Index(fields=['from_user_id']),
             models.Index(fields=['message_date']),
             models.Index(fields=['reply_to_message_id']),
+            # Постраничный вывод потока по курсору (message_date, id), в т.ч. внутри группы
+            models.Index(fields=['message_date', 'id']),
+            models.Index(fields=['chat_id', 'message_date', 'id']),
         ]
 
     def __str__(self):
@@ -368,6 +457,14 @@ class TelegramGroup(models.Model):
     title = models.CharField('Название группы', max_length=255, blank=True)
     is_blocked = models.BooleanField('Заблокировано', default=False)
     write_to_stream = models.BooleanField('Записывать сообщения в поток', default=True)
+    retention_days = models.PositiveIntegerField(
+        'Хранить сообщения, дней', null=True, blank=True,
+        help_text='Сообщения потока старше этого срока удаляет команда cleanup_stream. Пусто — хранить всегда',
+    )
+    retention_keep_linked = models.BooleanField(
+        'Не удалять связанные с обращениями', default=True,
+        help_text='Сообщения, по которым создано обращение или комментарий, хранятся бессрочно',
+    )
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
     class Meta:
@@ -445,8 +542,16 @@ class TelegramRoute(models.Model):
     
     @classmethod
     def find_route(cls, telegram_group=None, client=None, organization=None):
-        """Находит подходящий маршрут по заданным условиям с приоритетами"""
-        routes = cls.objects.filter(is_active=True)
+        """Находит подходящий маршрут по заданным условиям с приоритетами (через индекс в памяти)"""
+        from .routing import route_index
+        return route_index.find(telegram_group=telegram_group, client=client, organization=organization)
+
+    @classmethod
+    def find_route_in_db(cls, telegram_group=None, client=None, organization=None):
+        """Каскадный поиск маршрута запросами к БД.
+        Эталон для индекса маршрутов, используется командой benchmark_routes.
+        """
+        routes = cls.objects.filter(is_active=True).order_by('name', 'pk')
         
         # Каскадный поиск с приоритетами
         # 1. Самый специфичный: группа + клиент + организация
@@ -544,4 +649,369 @@ class TelegramRoute(models.Model):
             message_date=formatted_date
         )
         
-        return title
\ No newline at end of file
+        return title
+
+class TelegramOutboxMessage(models.Model):
+    """Очередь исходящих сообщений Telegram (outbox)
+
+    Представления только записывают сюда задания, доставкой занимается
+    команда ``manage.py telegram_outbox``.
+    """
+
+    ACTION_CHOICES = [
+        ('send', 'Отправить'),
+        ('edit', 'Редактировать'),
+        ('delete', 'Удалить'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    action = models.CharField('Действие', max_length=10, choices=ACTION_CHOICES, default='send')
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    chat_id = models.CharField('ID чата', max_length=64)
+    chat_title = models.CharField('Название чата', max_length=255, blank=True)
+    text = models.TextField('Текст', blank=True)
+    reply_to_message_id = models.CharField('Ответ на сообщение', max_length=64, blank=True)
+    target_message_id = models.CharField('Изменяемое сообщение', max_length=64, blank=True,
+                                         help_text='ID сообщения для редактирования/удаления')
+    fallback_to_send = models.BooleanField('Отправить новое, если не удалось отредактировать', default=False)
+    delete_on_fallback = models.BooleanField('Удалить старое сообщение перед отправкой нового', default=False)
+
+    # Что обновить после доставки
+    ticket = models.ForeignKey('Ticket', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Обращение')
+    comment = models.ForeignKey('TicketComment', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Комментарий')
+    linked_action = models.CharField('Действие в потоке', max_length=16, blank=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Автор')
+
+    # Доставка
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    locked_by = models.CharField('Обработчик', max_length=36, blank=True)
+    locked_at = models.DateTimeField('Взято в обработку', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    result_message_id = models.CharField('ID отправленного сообщения', max_length=64, blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Доставлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее сообщение Telegram'
+        verbose_name_plural = 'Исходящие сообщения Telegram'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_action_display()} → {self.chat_title or self.chat_id} ({self.get_status_display()})"
+
+
+class TelegramUpdate(models.Model):
+    """Принятые через webhook обновления Telegram.
+    Уникальный update_id не даёт нескольким репликам обработать одно обновление дважды.
+    """
+    update_id = models.BigIntegerField('ID обновления', unique=True)
+    received_at = models.DateTimeField('Получено', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Обновление Telegram'
+        verbose_name_plural = 'Обновления Telegram'
+
+    def __str__(self) -> str:
+        return str(self.update_id)
+
+
+class TelegramMessageLink(models.Model):
+    """Связь сообщения Telegram (чат + ID сообщения) с обращением и комментарием.
+
+    Заполняется, когда система отправляет сообщение в чат или связывает сообщение
+    из чата с обращением. Ответ на сообщение находится одним запросом по
+    уникальному индексу (chat_id, message_id) — с учётом чата.
+    """
+    chat_id = models.CharField('ID чата', max_length=64)
+    message_id = models.CharField('ID сообщения', max_length=64)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='telegram_links', verbose_name='Обращение')
+    comment = models.ForeignKey(TicketComment, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='telegram_links', verbose_name='Комментарий')
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Связь сообщения Telegram'
+        verbose_name_plural = 'Связи сообщений Telegram'
+        constraints = [
+            models.UniqueConstraint(fields=['chat_id', 'message_id'], name='unique_telegram_message_link'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.chat_id}/{self.message_id} → #{self.ticket_id}"
+
+    @classmethod
+    def remember(cls, chat_id, message_id, ticket, comment=None):
+        """Создаёт или обновляет связь сообщения с обращением/комментарием"""
+        if not chat_id or not message_id:
+            return None
+        link, _ = cls.objects.update_or_create(
+            chat_id=str(chat_id),
+            message_id=str(message_id),
+            defaults={'ticket': ticket, 'comment': comment},
+        )
+        return link
+
+    @classmethod
+    def remember_many(cls, links):
+        """remember() для многих сообщений одним запросом. links: [(chat_id, message_id, ticket, comment)]"""
+        rows = [
+            cls(chat_id=str(chat_id), message_id=str(message_id), ticket=ticket, comment=comment)
+            for chat_id, message_id, ticket, comment in links
+            if chat_id and message_id
+        ]
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['chat_id', 'message_id'],
+            update_fields=['ticket', 'comment'],
+        )
+
+    @classmethod
+    def find_comment(cls, chat_id, message_id):
+        """Комментарий, связанный с сообщением в этом чате, или None"""
+        link = (
+            cls.objects.filter(chat_id=str(chat_id), message_id=str(message_id), comment__isnull=False)
+            .select_related('comment__ticket')
+            .first()
+        )
+        return link.comment if link else None
+
+    @classmethod
+    def forget(cls, chat_id, message_id):
+        cls.objects.filter(chat_id=str(chat_id), message_id=str(message_id)).delete()
+
+
+class ArchivedTelegramMessage(models.Model):
+    """Где лежит сообщение потока, перенесённое в архив (команда archive_stream).
+
+    Сами сообщения хранятся в сжатых файлах-сегментах по дням (tickets/archive.py),
+    здесь — только ключ (chat_id, message_id) и путь к сегменту: по нему цитаты
+    в обращениях и link_replies читают архивные сообщения.
+    """
+    chat_id = models.CharField('ID чата', max_length=64)
+    message_id = models.CharField('ID сообщения', max_length=64)
+    message_date = models.DateTimeField('Время сообщения')
+    segment = models.CharField('Сегмент архива', max_length=255)
+    archived_at = models.DateTimeField('Перенесено в архив', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Архивное сообщение Telegram'
+        verbose_name_plural = 'Архивные сообщения Telegram'
+        constraints = [
+            # Повторный перенос того же сообщения переписывает ссылку на сегмент, а не дублирует её
+            models.UniqueConstraint(fields=['chat_id', 'message_id'], name='unique_archived_telegram_message'),
+        ]
+        indexes = [
+            models.Index(fields=['message_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_id}/{self.message_id} → {self.segment}"
+
+
+class TelegramSenderClient(models.Model):
+    """Клиент, от имени которого пишет отправитель Telegram.
+
+    Уникальный from_user_id не даёт завести двух клиентов для одного отправителя,
+    даже если его сообщения обрабатываются одновременно (бот, поток, link_replies).
+    Заполняется tickets/authors.py.
+    """
+    from_user_id = models.CharField('ID отправителя', max_length=64, unique=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='telegram_senders', verbose_name='Клиент')
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Отправитель Telegram'
+        verbose_name_plural = 'Отправители Telegram'
+
+    def __str__(self):
+        return f"{self.from_user_id} → {self.client}"
+
+
+class AutocompleteEntry(models.Model):
+    """Слово из названия объекта для подсказок автокомплита.
+
+    Для каждого клиента, организации, категории, группы Telegram и пользователя
+    хранятся слова названия (и доп. полей) в нижнем регистре. Подсказки ищутся
+    диапазонным запросом по индексу (kind, token), без регулярных выражений.
+    Заполняется сигналами, см. tickets/autocomplete.py.
+    """
+    kind = models.CharField('Вид объекта', max_length=16)
+    object_id = models.PositiveBigIntegerField('ID объекта')
+    token = models.CharField('Слово', max_length=128)
+    position = models.PositiveSmallIntegerField('Позиция', default=0, help_text='Порядковый номер слова; слова доп. полей — с 100')
+
+    class Meta:
+        verbose_name = 'Слово автокомплита'
+        verbose_name_plural = 'Слова автокомплита'
+        indexes = [
+            # Префикс слова; для точного совпадения — сразу в порядке выдачи (позиция, id)
+            models.Index(fields=['kind', 'token', 'position', 'object_id']),
+            # Префикс слова внутри одной позиции, в порядке выдачи (слово, id)
+            models.Index(fields=['kind', 'position', 'token', 'object_id']),
+            # Слова одного объекта: переиндексация и проверка остальных слов запроса
+            models.Index(fields=['kind', 'object_id', 'token']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind}#{self.object_id}: {self.token}"
+
+
+class TicketDailyStat(models.Model):
+    """Число обращений за день в разрезе категории, организации, статуса и исполнителя.
+
+    Сводка для аналитики: поддерживается сигналами сохранения и удаления
+    обращений, перестраивается командой ``rebuild_analytics_rollups``.
+    День — локальная дата создания обращения. См. tickets/rollups.py.
+    """
+    day = models.DateField('День')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name='Категория')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='Организация')
+    status = models.ForeignKey(TicketStatus, on_delete=models.CASCADE, related_name='+', verbose_name='Статус')
+    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='Исполнитель')
+    count = models.IntegerField('Обращений', default=0)
+
+    class Meta:
+        verbose_name = 'Сводка обращений за день'
+        verbose_name_plural = 'Сводки обращений за день'
+        indexes = [
+            # Покрывающий индекс: графики аналитики читают только его, без обращения к таблице
+            models.Index(fields=['day', 'category', 'organization', 'count']),
+            # Топ организаций: группировка по организации идёт по порядку индекса
+            models.Index(fields=['organization', 'day', 'count']),
+        ]
+        constraints = [
+            # Одна строка на ключ сводки: параллельные сохранения обращений не создают
+            # дублей. NULL в уникальном индексе не равен NULL, поэтому необязательные
+            # поля входят в ключ через COALESCE
+            models.UniqueConstraint(
+                'day', 'category', Coalesce('organization', 0, output_field=models.IntegerField()),
+                'status', Coalesce('assigned_to', 0, output_field=models.IntegerField()),
+                name='tickets_daily_stat_key',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day}: {self.count}"
+
+
+class TicketTagDailyStat(models.Model):
+    """Число обращений с тегом за день в разрезе категории и организации (см. tickets/rollups.py)"""
+    day = models.DateField('День')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name='Категория')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='Организация')
+    tag = models.CharField('Тег', max_length=100)
+    count = models.IntegerField('Обращений', default=0)
+
+    class Meta:
+        verbose_name = 'Сводка тегов за день'
+        verbose_name_plural = 'Сводки тегов за день'
+        indexes = [
+            models.Index(fields=['day', 'category', 'organization', 'tag', 'count']),
+            models.Index(fields=['organization', 'day']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                'day', 'category', Coalesce('organization', 0, output_field=models.IntegerField()), 'tag',
+                name='tickets_tag_daily_stat_key',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.tag}: {self.count}"
+
+
+class Tag(models.Model):
+    """Тег обращения (справочник для подсчёта и фильтрации по тегам)"""
+    name = models.CharField('Название', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+        ordering = ['name']
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class TicketTag(models.Model):
+    """Связь обращения с тегом.
+
+    Источник — текстовое поле Ticket.tags (через запятую), которое редактируется
+    в формах; связи синхронизируются сигналом сохранения, см. tickets/tagging.py.
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='tag_links', verbose_name='Обращение')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='ticket_links', verbose_name='Тег')
+
+    class Meta:
+        verbose_name = 'Тег обращения'
+        verbose_name_plural = 'Теги обращений'
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'tag'], name='unique_ticket_tag'),
+        ]
+        indexes = [
+            # Подсчёт обращений по тегу — группировка по индексу
+            models.Index(fields=['tag', 'ticket']),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.ticket_id}: {self.tag_id}"
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка обращений.
+
+    Страница аналитики только создаёт задание; файл формирует команда
+    ``manage.py export_worker`` в пуле процессов и кладёт в MEDIA_ROOT/exports/.
+    Прогресс и ссылка на скачивание — на странице задания (см. tickets/export_jobs.py).
+    """
+
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel (XLSX)'),
+        ('csv', 'CSV'),
+        ('columnar', 'Колоночный (ZIP)'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    format = models.CharField('Формат', max_length=10, choices=FORMAT_CHOICES, default='xlsx')
+    filters = models.JSONField('Фильтры', default=dict, blank=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField('Прогресс, %', default=0)
+    row_count = models.PositiveIntegerField('Строк выгружено', default=0)
+    total_rows = models.PositiveIntegerField('Всего строк', default=0)
+    file = models.FileField('Файл', upload_to='exports/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs', verbose_name='Создано пользователем')
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    started_at = models.DateTimeField('Начато', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершено', null=True, blank=True)
+    locked_by = models.CharField('Обработчик', max_length=36, blank=True)
+    locked_at = models.DateTimeField('Последняя отметка обработчика', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка'
+        verbose_name_plural = 'Выгрузки'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"Выгрузка #{self.id} ({self.get_format_display()}, {self.get_status_display()})"
@@ -0,0 +1,262 @@
+"""Очередь исходящих сообщений Telegram.
+
+Представления ставят задания через ``enqueue_*`` и сразу отвечают пользователю.
+Команда ``telegram_outbox`` забирает задания (``claim_batch``), выполняет вызовы
+Bot API и записывает результат (``mark_sent`` / ``mark_retry`` / ``mark_failed``).
+
+После успешного вызова Bot API сообщение уже у клиента, поэтому ``mark_sent``
+записывает только статус и ID сообщения — одним коротким UPDATE. Комментарий,
+связи ответов и поток обновляются отдельно (``apply_result``): ошибка в них
+не возвращает задание в очередь и не приводит к повторной отправке.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import search
+from .models import TelegramMessage, TelegramMessageLink, TelegramOutboxMessage, TicketComment
+
+logger = logging.getLogger(__name__)
+
+
+def is_configured() -> bool:
+    """Можно ли ставить сообщения в очередь (задан токен бота)"""
+    return bool(getattr(settings, 'TELEGRAM_BOT_TOKEN', None))
+
+
+def enqueue_send(ticket, text: str, reply_to_message_id, linked_action: str, author=None, comment=None):
+    """Отправить новое сообщение в чат обращения ответом на reply_to_message_id"""
+    return TelegramOutboxMessage.objects.create(
+        action='send',
+        chat_id=str(ticket.telegram_chat_id),
+        chat_title=ticket.telegram_chat_title or '',
+        text=text,
+        reply_to_message_id=str(reply_to_message_id or ''),
+        ticket=ticket,
+        comment=comment,
+        linked_action=linked_action,
+        author=author,
+    )
+
+
+def enqueue_edit(ticket, message_id, text: str, linked_action: str, author=None, comment=None,
+                 fallback_reply_to_message_id=None, delete_on_fallback: bool = False):
+    """Отредактировать сообщение; если Telegram отказал — отправить новое ответом на fallback_reply_to_message_id"""
+    return TelegramOutboxMessage.objects.create(
+        action='edit',
+        chat_id=str(ticket.telegram_chat_id),
+        chat_title=ticket.telegram_chat_title or '',
+        text=text,
+        target_message_id=str(message_id),
+        reply_to_message_id=str(fallback_reply_to_message_id or ''),
+        fallback_to_send=bool(fallback_reply_to_message_id),
+        delete_on_fallback=delete_on_fallback,
+        ticket=ticket,
+        comment=comment,
+        linked_action=linked_action,
+        author=author,
+    )
+
+
+def has_undelivered_send(comment) -> bool:
+    """Комментарий ещё ждёт отправки в Telegram (задание в очереди или отправляется)"""
+    return TelegramOutboxMessage.objects.filter(
+        comment=comment, action='send', status__in=['pending', 'sending'],
+    ).exists()
+
+
+def enqueue_comment_edit(ticket, comment, text: str, author=None):
+    """Обновить комментарий в Telegram.
+
+    Пока отправка комментария ждёт в очереди, меняется текст этого задания —
+    второго сообщения не будет. Иначе ставится редактирование: если сообщение
+    ещё отправляется, ID для редактирования берётся из комментария при доставке
+    (задания чата выполняются по порядку, отправка будет первой).
+    """
+    with transaction.atomic():
+        pending = TelegramOutboxMessage.objects.filter(comment=comment, action='send', status='pending')
+        if pending.update(text=text):
+            return pending.order_by('id').first()
+        return enqueue_edit(
+            ticket,
+            message_id=comment.telegram_message_id or '',
+            text=text,
+            linked_action='add_comment',
+            author=author,
+            comment=comment,
+            fallback_reply_to_message_id=ticket.external_message_id,
+        )
+
+
+def resolve_target(item) -> str:
+    """ID изменяемого сообщения; для правки комментария, поставленной до его доставки, — из комментария"""
+    if not item.target_message_id and item.comment_id:
+        message_id = TicketComment.objects.filter(id=item.comment_id).values_list('telegram_message_id', flat=True).first()
+        if not message_id:
+            # Учёт после отправки мог не записаться — ID остаётся в самом задании отправки
+            message_id = (
+                TelegramOutboxMessage.objects
+                .filter(comment_id=item.comment_id, action='send', status='sent')
+                .exclude(result_message_id='')
+                .order_by('-id')
+                .values_list('result_message_id', flat=True)
+                .first()
+            )
+        if message_id:
+            item.target_message_id = str(message_id)
+            item.save(update_fields=['target_message_id'])
+    return item.target_message_id
+
+
+def enqueue_delete(ticket, message_id, author=None):
+    """Удалить сообщение из чата обращения"""
+    return TelegramOutboxMessage.objects.create(
+        action='delete',
+        chat_id=str(ticket.telegram_chat_id),
+        chat_title=ticket.telegram_chat_title or '',
+        target_message_id=str(message_id),
+        ticket=ticket,
+        author=author,
+    )
+
+
+def claim_batch(limit: int, lease_seconds: int = 300):
+    """Забирает готовые к отправке задания, помечая их текущим обработчиком.
+
+    Задания, зависшие в статусе "Отправляется" дольше lease_seconds (например,
+    после падения обработчика), возвращаются в очередь. Задания чата, у которого
+    есть недоставленное более раннее задание, не забираются — порядок в чате
+    сохраняется и при повторных попытках.
+
+    Выбор и захват — один UPDATE: между проверкой «чат свободен» и захватом
+    другой обработчик не может забрать часть заданий того же чата.
+    """
+    now = timezone.now()
+    TelegramOutboxMessage.objects.filter(
+        status='sending',
+        locked_at__lt=now - timezone.timedelta(seconds=lease_seconds),
+    ).update(status='pending', locked_by='', locked_at=None)
+
+    # Чат ждёт, пока не доставлено его более раннее задание: оно отправляется
+    # другим обработчиком или отложено до повторной попытки
+    blocked = TelegramOutboxMessage.objects.filter(
+        Q(status='sending') | Q(status='pending', next_attempt_at__gt=now),
+        chat_id=OuterRef('chat_id'),
+        id__lt=OuterRef('id'),
+    )
+    ready = (
+        TelegramOutboxMessage.objects
+        .filter(status='pending', next_attempt_at__lte=now)
+        .exclude(Exists(blocked))
+        .order_by('id')
+        .values('id')[:limit]
+    )
+    token = uuid.uuid4().hex
+    if not TelegramOutboxMessage.objects.filter(id__in=ready, status='pending').update(
+        status='sending', locked_by=token, locked_at=now,
+    ):
+        return []
+    return list(
+        TelegramOutboxMessage.objects
+        .filter(locked_by=token, status='sending')
+        .select_related('ticket', 'comment', 'author')
+        .order_by('id')
+    )
+
+
+def mark_retry(item, error: str, delay_seconds: float, count_attempt: bool = True):
+    """Возвращает задание в очередь с отложенной попыткой"""
+    if count_attempt:
+        item.attempts += 1
+    item.status = 'pending'
+    item.locked_by = ''
+    item.locked_at = None
+    item.last_error = error
+    item.next_attempt_at = timezone.now() + timezone.timedelta(seconds=delay_seconds)
+    item.save(update_fields=['attempts', 'status', 'locked_by', 'locked_at', 'last_error', 'next_attempt_at'])
+
+
+def release(items):
+    """Возвращает забранные, но не выполненные задания в очередь без учёта попытки"""
+    TelegramOutboxMessage.objects.filter(id__in=[item.id for item in items], status='sending').update(
+        status='pending', locked_by='', locked_at=None,
+    )
+
+
+def mark_failed(item, error: str):
+    item.attempts += 1
+    item.status = 'failed'
+    item.locked_by = ''
+    item.last_error = error
+    item.save(update_fields=['attempts', 'status', 'locked_by', 'last_error'])
+    logger.error(f"Telegram outbox item {item.id} failed: {error}")
+
+
+def _add_to_stream(item, message_id: str):
+    author = item.author
+    TelegramMessage.objects.create(
+        message_id=message_id,
+        chat_id=item.chat_id,
+        chat_title=item.chat_title,
+        from_user_id=str(author.id) if author else '',
+        from_username=author.username if author else '',
+        from_fullname=(author.get_full_name() or author.username) if author else '',
+        text=item.text,
+        message_date=timezone.now(),
+        linked_ticket=item.ticket,
+        linked_action=item.linked_action,
+        reply_to_message_id=item.reply_to_message_id,
+    )
+
+
+def mark_sent(item, outcome: str, message_id=None):
+    """Фиксирует доставку задания: статус и ID сообщения, без учёта в комментарии и потоке.
+
+    outcome: 'sent' — отправлено новое сообщение, 'edited' — отредактировано,
+    'deleted' — удалено. Повторный вызов после ошибки записи безопасен.
+    """
+    if outcome == 'sent':
+        message_id = str(message_id)
+    elif outcome == 'edited':
+        message_id = item.target_message_id
+    values = {
+        'status': 'sent',
+        'locked_by': '',
+        'last_error': '',
+        'result_message_id': str(message_id or ''),
+        'sent_at': timezone.now(),
+    }
+    TelegramOutboxMessage.objects.filter(id=item.id).update(attempts=F('attempts') + 1, **values)
+    for field, value in values.items():
+        setattr(item, field, value)
+    item.attempts += 1
+    logger.info(f"Telegram outbox item {item.id} {outcome}: chat_id={item.chat_id}, message_id={message_id}")
+
+
+def apply_result(item, outcome: str):
+    """Переносит результат доставки (mark_sent) в комментарий, связи ответов и поток"""
+    message_id = item.result_message_id
+    with transaction.atomic():
+        if outcome == 'sent':
+            if item.comment_id:
+                TicketComment.objects.filter(id=item.comment_id).update(telegram_message_id=message_id)
+            if item.action == 'edit' and item.delete_on_fallback:
+                # Старое сообщение заменено новым — убираем его из потока
+                TelegramMessage.objects.filter(chat_id=item.chat_id, message_id=item.target_message_id).delete()
+                TelegramMessageLink.forget(item.chat_id, item.target_message_id)
+            if item.ticket_id:
+                # Ответы клиентов на это сообщение будут привязаны к обращению/комментарию
+                TelegramMessageLink.remember(item.chat_id, message_id, item.ticket, item.comment)
+            _add_to_stream(item, message_id)
+        elif outcome == 'edited':
+            stream_messages = TelegramMessage.objects.filter(chat_id=item.chat_id, message_id=message_id)
+            if item.ticket_id:
+                stream_messages = stream_messages.filter(linked_ticket_id=item.ticket_id)
+            stream_messages.update(text=item.text)
+            search.index_messages(stream_messages)
+        elif outcome == 'deleted':
+            TelegramMessageLink.forget(item.chat_id, item.target_message_id)
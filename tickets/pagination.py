@@ -0,0 +1,141 @@
+"""Постраничный вывод по курсору (keyset) для потока Telegram.
+
+Поток упорядочен по (-message_date, -id). Вместо номера страницы в URL
+передаётся курсор — ключ (message_date, id) крайнего сообщения:
+- ``after`` — следующая (более старая) страница после сообщения с этим ключом;
+- ``before`` — предыдущая (более новая) страница перед ним;
+- ``anchor`` — страница вокруг сообщения с указанным id (после действий в потоке).
+
+Каждая страница — диапазонный запрос по индексу с LIMIT, без COUNT(*) и OFFSET,
+поэтому время загрузки не зависит от размера потока и номера страницы.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(message) -> str:
+    """Курсор сообщения: микросекунды с начала эпохи и id"""
+    delta = message.message_date - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f'{microseconds}_{message.id}'
+
+
+def decode_cursor(cursor: str):
+    """Возвращает (message_date, id) или None для некорректного курсора"""
+    try:
+        microseconds, pk = cursor.split('_')
+        return EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def older_than(qs, key, inclusive=False):
+    """Сообщения старше ключа в порядке потока.
+
+    Условие message_date <= date избыточно, но без него SQLite не видит границы
+    диапазона в OR и просматривает индекс с начала (страницы тем медленнее, чем глубже).
+    """
+    date, pk = key
+    id_filter = Q(id__lte=pk) if inclusive else Q(id__lt=pk)
+    return qs.filter(Q(message_date__lte=date), Q(message_date__lt=date) | id_filter).order_by('-message_date', '-id')
+
+
+def newer_than(qs, key):
+    """Сообщения новее ключа, начиная с ближайшего к нему (с той же избыточной границей диапазона)"""
+    date, pk = key
+    return qs.filter(Q(message_date__gte=date), Q(message_date__gt=date) | Q(id__gt=pk)).order_by('message_date', 'id')
+
+
+class KeysetPage:
+    """Страница потока. Повторяет нужную шаблону часть интерфейса django.core.paginator.Page"""
+
+    def __init__(self, object_list, has_previous, has_next, per_page, after='', before='', anchor=''):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.per_page = per_page
+        # Параметры, которыми открыта страница (для возврата на неё после действий)
+        self.after = after
+        self.before = before
+        self.anchor = anchor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.object_list else ''
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.object_list else ''
+
+
+def first_page(qs, per_page):
+    rows = list(qs.order_by('-message_date', '-id')[:per_page + 1])
+    return KeysetPage(rows[:per_page], False, len(rows) > per_page, per_page)
+
+
+def page_after(qs, cursor, per_page):
+    key = decode_cursor(cursor)
+    if key is None:
+        return first_page(qs, per_page)
+    rows = list(older_than(qs, key)[:per_page + 1])
+    return KeysetPage(rows[:per_page], True, len(rows) > per_page, per_page, after=cursor)
+
+
+def page_before(qs, cursor, per_page):
+    key = decode_cursor(cursor)
+    if key is None:
+        return first_page(qs, per_page)
+    rows = list(newer_than(qs, key)[:per_page + 1])
+    has_previous = len(rows) > per_page
+    rows = rows[:per_page]
+    rows.reverse()
+    if not rows:
+        return first_page(qs, per_page)
+    return KeysetPage(rows, has_previous, True, per_page, before=cursor)
+
+
+def page_around(qs, message_pk, per_page):
+    """Страница, на которой сообщение находится примерно посередине"""
+    anchor = qs.model.objects.filter(pk=message_pk).values_list('message_date', 'id').first()
+    if anchor is None:
+        return first_page(qs, per_page)
+
+    newer_count = per_page // 2
+    newer = list(newer_than(qs, anchor)[:newer_count + 1])
+    has_previous = len(newer) > newer_count
+    newer = newer[:newer_count]
+    newer.reverse()
+
+    older_count = per_page - len(newer)
+    older = list(older_than(qs, anchor, inclusive=True)[:older_count + 1])
+    has_next = len(older) > older_count
+    return KeysetPage(newer + older[:older_count], has_previous, has_next, per_page, anchor=str(message_pk))
+
+
+def get_keyset_page(qs, per_page, after=None, before=None, anchor=None):
+    """Выбирает страницу по параметрам запроса (anchor важнее курсоров)"""
+    if anchor and str(anchor).isdigit():
+        return page_around(qs, int(anchor), per_page)
+    if after:
+        return page_after(qs, after, per_page)
+    if before:
+        return page_before(qs, before, per_page)
+    return first_page(qs, per_page)
@@ -0,0 +1,159 @@
+"""Срок хранения сообщений потока Telegram.
+
+Удаление идёт пачками: id очередной пачки выбираются по индексу message_date
+(границы периода — datetime из date_ranges, а не ``message_date__date``), строки удаляются
+одним DELETE по id в короткой транзакции, между пачками — пауза. Так очистка
+большого периода не держит блокировку SQLite и не мешает боту писать поток.
+
+Перед удалением пачку можно дописать в архив — gzip с одной JSON-строкой на
+сообщение (ArchiveWriter).
+
+Сроки хранения задаются в группах (TelegramGroup.retention_days); их
+применяет команда ``cleanup_stream``, её же удобно запускать по расписанию.
+Очистка периода со страницы потока удаляет не больше нескольких пачек
+(``purge_some``) и подсказывает команду для остального.
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import date_ranges, search
+from .models import TelegramGroup, TelegramMessage
+
+CHUNK_SIZE = 1000
+# Пауза между пачками, сек
+CHUNK_PAUSE = 0.2
+# Очистка из интерфейса (purge_some): не больше стольких пачек за один запрос
+REQUEST_MAX_CHUNKS = 5
+
+ARCHIVE_FIELDS = [field.attname for field in TelegramMessage._meta.concrete_fields]
+
+
+def messages_in_period(start=None, end=None, chat_id=None):
+    """Сообщения потока с message_date в [start, end); локальные даты — date_ranges.day_range()"""
+    qs = TelegramMessage.objects.all()
+    if chat_id:
+        qs = qs.filter(chat_id=chat_id)
+    return qs.filter(date_ranges.range_q('message_date', start, end))
+
+
+def expired_messages(group, now=None):
+    """Сообщения группы старше её срока хранения (None, если срок не задан)"""
+    if not group.retention_days:
+        return None
+    now = now or timezone.now()
+    return messages_in_period(end=now - timedelta(days=group.retention_days), chat_id=group.chat_id)
+
+
+def count(queryset, keep_linked=True) -> int:
+    """Сколько сообщений удалит purge()"""
+    return queryset.filter(linked_ticket__isnull=True).count() if keep_linked else queryset.count()
+
+
+def groups_with_retention():
+    return TelegramGroup.objects.filter(retention_days__isnull=False).order_by('chat_id')
+
+
+class ArchiveWriter:
+    """Дописывает сообщения в gzip-файл JSONL (один объект на строку)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+
+    def __enter__(self):
+        self.file = gzip.open(self.path, 'at', encoding='utf-8')
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            self.file.write('\n')
+            self.rows += 1
+
+
+def delete_messages(ids):
+    """Удаляет сообщения по id одним запросом и убирает их из поискового индекса.
+
+    На TelegramMessage не ссылаются внешние ключи, а единственный обработчик
+    удаления — поисковый индекс, поэтому пачка удаляется без загрузки объектов.
+    """
+    if not ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TelegramMessage._meta.db_table} WHERE id IN ({placeholders})", list(ids))
+        deleted = cursor.rowcount
+    search.remove_many(search.KIND_MESSAGE, ids)
+    return deleted
+
+
+def _purge_pages(queryset, keep_linked, chunk_size, archive=None):
+    """Удаляет queryset пачками; после каждой пачки отдаёт (удалено в ней, пачка полная).
+
+    Пачки читаются по (message_date, id): следующая начинается после последней
+    строки предыдущей, поэтому оставленные (связанные) сообщения не перечитываются.
+    """
+    fields = ARCHIVE_FIELDS if archive is not None else ['id', 'message_date', 'linked_ticket_id']
+    last = None
+    while True:
+        page = queryset
+        if last:
+            # Пропускаем оставленные (связанные) сообщения уже просмотренной части периода
+            page = page.filter(message_date__gte=last[0]).exclude(message_date=last[0], id__lte=last[1])
+        rows = list(page.order_by('message_date', 'id').values(*fields)[:chunk_size])
+        if not rows:
+            return
+        last = (rows[-1]['message_date'], rows[-1]['id'])
+        doomed = [row for row in rows if row['linked_ticket_id'] is None] if keep_linked else rows
+        deleted = 0
+        if doomed:
+            with transaction.atomic():
+                if archive is not None:
+                    archive.write(doomed)
+                deleted = delete_messages([row['id'] for row in doomed])
+        yield deleted, len(rows) == chunk_size
+        if len(rows) < chunk_size:
+            return
+
+
+def purge(queryset, keep_linked=True, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE, archive=None, progress=None):
+    """Удаляет сообщения queryset пачками по chunk_size. Возвращает число удалённых.
+
+    keep_linked — не трогать сообщения, связанные с обращениями. Они отсеиваются
+    после выборки пачки: с условием на linked_ticket SQLite выбирает индекс по нему
+    и сортирует всю таблицу, а так пачка читается по индексу message_date.
+    archive — ArchiveWriter или None; progress(удалено) вызывается после каждой пачки.
+    """
+    total = 0
+    for deleted, full in _purge_pages(queryset, keep_linked, chunk_size, archive):
+        total += deleted
+        if deleted and progress:
+            progress(total)
+        if full and pause:
+            time.sleep(pause)
+    return total
+
+
+def purge_some(queryset, keep_linked=True, max_chunks=REQUEST_MAX_CHUNKS, chunk_size=CHUNK_SIZE):
+    """Не больше max_chunks пачек purge() — для очистки из интерфейса, без пауз.
+
+    Возвращает (удалено, остались ли ещё сообщения для просмотра); остальное
+    удаляет команда ``cleanup_stream``.
+    """
+    total = 0
+    more = False
+    for number, (deleted, full) in enumerate(_purge_pages(queryset, keep_linked, chunk_size), 1):
+        total += deleted
+        more = full
+        if number >= max_chunks:
+            break
+    return total, more
@@ -0,0 +1,219 @@
+"""Сводные таблицы (rollup) для страницы аналитики.
+
+- TicketDailyStat — число обращений за день × категорию × организацию ×
+  статус × исполнителя;
+- TicketTagDailyStat — число обращений с тегом за день × категорию × организацию.
+
+День — локальная дата создания обращения (как TruncDate в текущем часовом поясе).
+Аналитика за год читает несколько тысяч строк сводки вместо всех обращений.
+
+Сводки обновляются инкрементально сигналами сохранения и удаления обращения
+(tickets/signals.py): вклад старой версии обращения вычитается, новой —
+прибавляется. После массовых UPDATE в обход save() нужно вызвать
+refresh_days() для затронутых дней. Полная перестройка —
+``rebuild_analytics_rollups``.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import date_ranges
+from .models import Category, Ticket, TicketDailyStat, TicketTagDailyStat
+from .tagging import split_tags
+
+# Поля обращения, от которых зависит его вклад в сводки
+SNAPSHOT_FIELDS = ('created_at', 'category_id', 'organization_id', 'status_id', 'assigned_to_id', 'tags')
+
+
+# --- Инкрементальное обновление ----------------------------------------------
+
+def snapshot(ticket, base=None, update_fields=None) -> dict:
+    """Значения SNAPSHOT_FIELDS обращения.
+
+    При save(update_fields=...) в базу попадают только перечисленные поля,
+    остальные берутся из base (сохранённой версии).
+    """
+    result = {field: getattr(ticket, field) for field in SNAPSHOT_FIELDS}
+    if base and update_fields is not None:
+        saved = {Ticket._meta.get_field(name).attname for name in update_fields}
+        result = {field: result[field] if field in saved else base[field] for field in SNAPSHOT_FIELDS}
+    return result
+
+
+def stored_snapshot(pk):
+    """Сохранённая версия обращения (до изменения) или None"""
+    if not pk:
+        return None
+    return Ticket.objects.filter(pk=pk).values(*SNAPSHOT_FIELDS).first()
+
+
+def _keys(snap):
+    day = timezone.localdate(snap['created_at'])
+    dims = {'day': day, 'category_id': snap['category_id'], 'organization_id': snap['organization_id']}
+    daily = dict(dims, status_id=snap['status_id'], assigned_to_id=snap['assigned_to_id'])
+    return daily, [dict(dims, tag=tag) for tag in split_tags(snap['tags'])]
+
+
+def _bump(model, key, delta):
+    """Прибавляет delta к счётчику строки key (строка создаётся при первом +1).
+
+    Ключ сводки уникален: если строку одновременно создала другая транзакция,
+    get_or_create перечитывает её, и delta прибавляется к ней же.
+    """
+    updated = model.objects.filter(**key).update(count=F('count') + delta)
+    if delta > 0 and not updated:
+        _, created = model.objects.get_or_create(defaults={'count': delta}, **key)
+        if not created:
+            model.objects.filter(**key).update(count=F('count') + delta)
+    elif delta < 0:
+        model.objects.filter(count__lte=0, **key).delete()
+
+
+def apply(old, new):
+    """Переносит вклад обращения из сводок старой версии в сводки новой (old/new — снимки или None)"""
+    if old == new:
+        return
+    with transaction.atomic():
+        for snap, delta in ((old, -1), (new, 1)):
+            if not snap or not snap['created_at'] or not snap['category_id']:
+                continue
+            daily, tags = _keys(snap)
+            _bump(TicketDailyStat, daily, delta)
+            for key in tags:
+                _bump(TicketTagDailyStat, key, delta)
+
+
+# --- Перестройка -------------------------------------------------------------
+
+def _fill(tickets, Daily, Tag, chunk_size, progress=None):
+    """Записывает сводки по обращениям tickets (строки этих дней должны быть удалены заранее)"""
+    total = 0
+    rows = []
+    for values in (
+        tickets.annotate(day=TruncDate('created_at'))
+        .values('day', 'category_id', 'organization_id', 'status_id', 'assigned_to_id')
+        .annotate(total=Count('id'))
+        .order_by()
+        .iterator(chunk_size=chunk_size)
+    ):
+        values['count'] = values.pop('total')
+        rows.append(Daily(**values))
+        if len(rows) >= chunk_size:
+            Daily.objects.bulk_create(rows)
+            total += len(rows)
+            rows = []
+            if progress:
+                progress(total)
+    Daily.objects.bulk_create(rows)
+    total += len(rows)
+
+    tag_counter = Counter()
+    for created_at, category_id, organization_id, tags in (
+        tickets.exclude(tags='').values_list('created_at', 'category_id', 'organization_id', 'tags').iterator(chunk_size=chunk_size)
+    ):
+        day = timezone.localdate(created_at)
+        for tag in split_tags(tags):
+            tag_counter[(day, category_id, organization_id, tag)] += 1
+    rows = [
+        Tag(day=day, category_id=category_id, organization_id=organization_id, tag=tag, count=count)
+        for (day, category_id, organization_id, tag), count in tag_counter.items()
+    ]
+    Tag.objects.bulk_create(rows, batch_size=chunk_size)
+    total += len(rows)
+    if progress:
+        progress(total)
+    return total
+
+
+def refresh_days(days, chunk_size=2000):
+    """Пересчитывает сводки за указанные дни по текущим данным обращений"""
+    days = sorted(set(day for day in days if day))
+    if not days:
+        return 0
+    with transaction.atomic():
+        TicketDailyStat.objects.filter(day__in=days).delete()
+        TicketTagDailyStat.objects.filter(day__in=days).delete()
+        return _fill(Ticket.objects.filter(date_ranges.days_q('created_at', days)), TicketDailyStat, TicketTagDailyStat, chunk_size)
+
+
+def ticket_days(tickets) -> list:
+    """Локальные даты создания обращений из queryset"""
+    return list(tickets.annotate(day=TruncDate('created_at')).values_list('day', flat=True).order_by().distinct())
+
+
+def rebuild(get_model, chunk_size=2000, progress=None):
+    """Заполняет сводки заново. get_model(label) — apps.get_model (подходит и для миграций)"""
+    Daily = get_model('tickets.TicketDailyStat')
+    Tag = get_model('tickets.TicketTagDailyStat')
+    Daily.objects.all().delete()
+    Tag.objects.all().delete()
+    return _fill(get_model('tickets.Ticket').objects.all(), Daily, Tag, chunk_size, progress)
+
+
+# --- Чтение ------------------------------------------------------------------
+
+def _filtered(model, date_from=None, date_to=None, category_ids=None, organization_id=None):
+    qs = model.objects.all()
+    if date_from:
+        qs = qs.filter(day__gte=date_from)
+    if date_to:
+        qs = qs.filter(day__lte=date_to)
+    if category_ids is not None:
+        qs = qs.filter(category_id__in=category_ids)
+    if organization_id:
+        qs = qs.filter(organization_id=organization_id)
+    return qs
+
+
+def analytics_filters(category_id, category_text, organization_id, date_from, date_to):
+    """Фильтры страницы аналитики в терминах сводок (daily_stats / tag_stats)"""
+    category_ids = None
+    if category_id and str(category_id).isdigit():
+        cid = int(category_id)
+        category_ids = Category.objects.filter(Q(id=cid) | Q(parent_id=cid)).values('id')
+    elif category_text:
+        category_ids = Category.objects.filter(
+            Q(name__icontains=category_text) | Q(parent__name__icontains=category_text)
+        ).values('id')
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'category_ids': category_ids,
+        'organization_id': int(organization_id) if organization_id and str(organization_id).isdigit() else None,
+    }
+
+
+def daily_stats(**filters):
+    return _filtered(TicketDailyStat, **filters)
+
+
+def tag_stats(**filters):
+    return _filtered(TicketTagDailyStat, **filters)
+
+
+def counts_by_day(stats) -> list:
+    """[{'day': date, 'cnt': n}] по возрастанию дня"""
+    return list(stats.values('day').annotate(cnt=Sum('count')).filter(cnt__gt=0).order_by('day'))
+
+
+def total(stats) -> int:
+    return stats.aggregate(total=Sum('count'))['total'] or 0
+
+
+def top_organizations(stats, limit=20) -> list:
+    rows = (
+        stats.filter(organization__isnull=False)
+        .values('organization__name')
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by('-total', 'organization__name')[:limit]
+    )
+    return [{'name': row['organization__name'], 'count': row['total']} for row in rows]
+
+
+def top_tags(stats, limit=20) -> list:
+    rows = stats.values('tag').annotate(total=Sum('count')).filter(total__gt=0).order_by('-total', 'tag')[:limit]
+    return [{'name': row['tag'], 'count': row['total']} for row in rows]
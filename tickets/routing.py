@@ -0,0 +1,88 @@
+"""Индекс маршрутов Telegram.
+
+Все активные маршруты загружаются одним запросом в словарь с ключом
+(группа, клиент, организация) — id или None для незаданного условия. Поиск
+проверяет те же восемь комбинаций, что и каскад в ``TelegramRoute.find_route_in_db``,
+но без обращений к БД. Индекс перестраивается при изменении маршрутов
+(сигналы в tickets/signals.py) и не реже чем раз в TELEGRAM_ROUTE_INDEX_TTL секунд,
+чтобы подхватить изменения из других процессов.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Порядок проверки: от самого специфичного маршрута к общему.
+# Для каждого условия: учитывать ли группу, клиента, организацию.
+SPECIFICITY_ORDER = [
+    (True, True, True),     # 1. группа + клиент + организация
+    (True, True, False),    # 2. группа + клиент
+    (True, False, True),    # 3. группа + организация
+    (False, True, True),    # 4. клиент + организация
+    (True, False, False),   # 5. только группа
+    (False, True, False),   # 6. только клиент
+    (False, False, True),   # 7. только организация
+    (False, False, False),  # 8. общий маршрут
+]
+
+
+def _pk(obj):
+    if obj is None:
+        return None
+    return getattr(obj, 'pk', obj)
+
+
+class RouteIndex:
+    """Процессный индекс активных маршрутов"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._routes = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._routes = None
+
+    def _build(self) -> dict:
+        from .models import TelegramRoute
+
+        routes = {}
+        # Как и .first() в каскаде: при нескольких маршрутах с одинаковыми условиями берём первый по названию
+        for route in TelegramRoute.objects.filter(is_active=True).select_related('category').order_by('name', 'pk'):
+            key = (route.telegram_group_id, route.client_id, route.organization_id)
+            routes.setdefault(key, route)
+        logger.info(f"Route index built: {len(routes)} keys")
+        return routes
+
+    def routes(self) -> dict:
+        routes = self._routes
+        if routes is None or time.monotonic() - self._built_at > self.ttl:
+            with self._lock:
+                routes = self._routes
+                if routes is None or time.monotonic() - self._built_at > self.ttl:
+                    routes = self._build()
+                    self._routes, self._built_at = routes, time.monotonic()
+        return routes
+
+    def find(self, telegram_group=None, client=None, organization=None):
+        """Находит подходящий маршрут; принимает объекты моделей или их id"""
+        group_id, client_id, organization_id = _pk(telegram_group), _pk(client), _pk(organization)
+        routes = self.routes()
+        for use_group, use_client, use_organization in SPECIFICITY_ORDER:
+            if (use_group and group_id is None) or (use_client and client_id is None) or (use_organization and organization_id is None):
+                continue
+            route = routes.get((
+                group_id if use_group else None,
+                client_id if use_client else None,
+                organization_id if use_organization else None,
+            ))
+            if route:
+                return route
+        return None
+
+
+route_index = RouteIndex(float(getattr(settings, 'TELEGRAM_ROUTE_INDEX_TTL', 300)))
@@ -0,0 +1,286 @@
+"""Полнотекстовый поиск по обращениям, комментариям и сообщениям потока.
+
+Индекс — виртуальная таблица SQLite FTS5 ``tickets_search`` (миграция 0024).
+В ней хранятся основы слов (см. tickets/stemmer.py), поэтому запрос
+«проблемы с доставкой» находит и «проблема доставки». Документы:
+- обращение: заголовок | описание, теги, решение, клиент, категория;
+- комментарий: текст (с ID обращения — находит обращение по комментарию);
+- сообщение потока: имя отправителя | текст.
+
+rowid документа = id объекта * 4 + вид (1 — обращение, 2 — комментарий,
+3 — сообщение), поэтому обновление и удаление — по первичному ключу.
+Индекс поддерживается сигналами (tickets/signals.py) и явными вызовами
+index_* после bulk_create/update. Полная перестройка — ``rebuild_search_index``.
+
+На других СУБД (и если таблицы нет) фильтры откатываются к icontains.
+"""
+import logging
+
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+from .stemmer import query_words, stem_words
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'tickets_search'
+KIND_TICKET = 1
+KIND_COMMENT = 2
+KIND_MESSAGE = 3
+# Ранжированный поиск (пикеры обращений) возвращает не больше стольких результатов
+RANKED_LIMIT = 200
+
+TICKET_FALLBACK_FIELDS = ('title', 'description', 'tags', 'resolution', 'client__name', 'category__name')
+COMMENT_FALLBACK_FIELDS = ('content',)
+MESSAGE_FALLBACK_FIELDS = ('text', 'from_username', 'from_fullname')
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "title, body, ticket_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_TABLE_SQL = f"DROP TABLE IF EXISTS {TABLE}"
+
+
+def is_enabled(using=None) -> bool:
+    """Индекс есть только в SQLite"""
+    return (using or connection).vendor == 'sqlite'
+
+
+def normalize(*parts) -> str:
+    return ' '.join(stem_words(' '.join(part for part in parts if part)))
+
+
+def match_expression(query: str) -> str:
+    """Запрос FTS5: основы значимых слов запроса (с префиксным поиском)"""
+    return ' '.join(f'"{word}"*' for word in query_words(query))
+
+
+def _rowid(kind: int, pk: int) -> int:
+    return pk * 4 + kind
+
+
+# --- Документы ---------------------------------------------------------------
+
+def ticket_document(title, description, tags, resolution, client_name, category_name):
+    return normalize(title), normalize(description, tags, resolution, client_name, category_name)
+
+
+def _write(rows, cursor=None):
+    """rows: [(rowid, title, body, ticket_id)]"""
+    if not rows:
+        return
+    own_cursor = cursor is None
+    cursor = cursor or connection.cursor()
+    try:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, body, ticket_id) VALUES (%s, %s, %s, %s)", rows
+        )
+    finally:
+        if own_cursor:
+            cursor.close()
+
+
+def _safely(func):
+    """Ошибка индекса не должна ломать сохранение обращения или сообщения"""
+    def wrapper(*args, **kwargs):
+        if not is_enabled():
+            return None
+        try:
+            return func(*args, **kwargs)
+        except DatabaseError as e:
+            logger.error(f"Search index update failed in {func.__name__}: {e}")
+            return None
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@_safely
+def index_tickets(ticket_ids):
+    """Переиндексирует обращения по id"""
+    from .models import Ticket
+
+    rows = []
+    for pk, title, description, tags, resolution, client_name, category_name in (
+        Ticket.objects.filter(pk__in=list(ticket_ids))
+        .values_list('pk', 'title', 'description', 'tags', 'resolution', 'client__name', 'category__name')
+    ):
+        rows.append((_rowid(KIND_TICKET, pk), *ticket_document(title, description, tags, resolution, client_name, category_name), pk))
+    _write(rows)
+
+
+def index_ticket_queryset(qs, chunk_size=1000):
+    """Переиндексирует обращения из qs пачками (после переименования клиента или категории)"""
+    ids = []
+    for pk in qs.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+        ids.append(pk)
+        if len(ids) >= chunk_size:
+            index_tickets(ids)
+            ids = []
+    if ids:
+        index_tickets(ids)
+
+
+@_safely
+def index_comments(comments):
+    _write([
+        (_rowid(KIND_COMMENT, comment.pk), '', normalize(comment.content), comment.ticket_id)
+        for comment in comments if comment.pk
+    ])
+
+
+@_safely
+def index_messages(messages):
+    _write([
+        (_rowid(KIND_MESSAGE, msg.pk), normalize(msg.from_fullname, msg.from_username), normalize(msg.text), None)
+        for msg in messages if msg.pk
+    ])
+
+
+@_safely
+def remove(kind: int, pk: int):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [_rowid(kind, pk)])
+
+
+@_safely
+def remove_many(kind: int, pks):
+    """remove() для многих объектов (удалённых без сигналов)"""
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(_rowid(kind, pk),) for pk in pks])
+
+
+# --- Поиск -------------------------------------------------------------------
+
+def _fallback(qs, query, fields, condition=None):
+    condition = condition or Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return qs.filter(condition)
+
+
+def _ticket_id_match(query):
+    """Поиск по номеру: «123» или «#123»"""
+    number = query.strip().lstrip('#')
+    return Q(pk=int(number)) if number.isdigit() else Q(pk__in=[])
+
+
+def ranked_ticket_ids(query: str, limit: int = RANKED_LIMIT) -> list:
+    """ID обращений по релевантности (совпадение в заголовке весит больше, учитываются комментарии)"""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT ticket_id FROM {TABLE} WHERE {TABLE} MATCH %s AND (rowid & 3) IN (1, 2) "
+            f"ORDER BY bm25({TABLE}, 10.0, 1.0) LIMIT %s",
+            [expression, limit * 4],
+        )
+        ids = list(dict.fromkeys(ticket_id for (ticket_id,) in cursor.fetchall()))
+    return ids[:limit]
+
+
+def filter_tickets(qs, query: str, ranked: bool = False):
+    """Обращения, найденные по тексту (в т.ч. по комментариям) или по номеру.
+
+    ranked=True — сортировка по релевантности (не больше RANKED_LIMIT результатов),
+    иначе сохраняется сортировка qs.
+    """
+    query = (query or '').strip()
+    if not query:
+        return qs
+    if not is_enabled() or not match_expression(query):
+        return _fallback(qs, query, TICKET_FALLBACK_FIELDS, _ticket_id_match(query))
+
+    try:
+        if ranked:
+            ids = ranked_ticket_ids(query)
+            by_number = _ticket_id_match(query)
+            qs = qs.filter(Q(pk__in=ids) | by_number)
+            if not ids:
+                return qs
+            return qs.order_by(
+                Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+                     default=-1, output_field=IntegerField()),
+                *qs.query.order_by,
+            )
+        matched = RawSQL(
+            f"SELECT ticket_id FROM {TABLE} WHERE {TABLE} MATCH %s AND (rowid & 3) IN (1, 2)",
+            [match_expression(query)],
+        )
+        return qs.filter(Q(pk__in=matched) | _ticket_id_match(query))
+    except DatabaseError as e:
+        logger.error(f"Full-text ticket search failed, falling back to icontains: {e}")
+        return _fallback(qs, query, TICKET_FALLBACK_FIELDS, _ticket_id_match(query))
+
+
+def _filter_kind(qs, query, kind, fallback_fields):
+    query = (query or '').strip()
+    if not query:
+        return qs
+    expression = match_expression(query)
+    if not is_enabled() or not expression:
+        return _fallback(qs, query, fallback_fields)
+    matched = RawSQL(
+        f"SELECT rowid >> 2 FROM {TABLE} WHERE {TABLE} MATCH %s AND (rowid & 3) = {kind}",
+        [expression],
+    )
+    return qs.filter(pk__in=matched)
+
+
+def filter_comments(qs, query: str):
+    return _filter_kind(qs, query, KIND_COMMENT, COMMENT_FALLBACK_FIELDS)
+
+
+def filter_messages(qs, query: str):
+    return _filter_kind(qs, query, KIND_MESSAGE, MESSAGE_FALLBACK_FIELDS)
+
+
+# --- Перестройка -------------------------------------------------------------
+
+def rebuild(Ticket, TicketComment, TelegramMessage, using='default', chunk_size=2000, progress=None):
+    """Заполняет индекс заново. Принимает классы моделей (подходит и для миграций)"""
+    from django.db import connections
+
+    conn = connections[using]
+    if not is_enabled(conn):
+        return 0
+
+    total = 0
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+        def write_chunks(values, make_row):
+            nonlocal total
+            rows = []
+            for value in values.iterator(chunk_size=chunk_size):
+                rows.append(make_row(value))
+                if len(rows) >= chunk_size:
+                    _write(rows, cursor)
+                    total += len(rows)
+                    rows.clear()
+                    if progress:
+                        progress(total)
+            _write(rows, cursor)
+            total += len(rows)
+
+        write_chunks(
+            Ticket.objects.using(using).order_by('pk').values_list(
+                'pk', 'title', 'description', 'tags', 'resolution', 'client__name', 'category__name'
+            ),
+            lambda v: (_rowid(KIND_TICKET, v[0]), *ticket_document(*v[1:]), v[0]),
+        )
+        write_chunks(
+            TicketComment.objects.using(using).order_by('pk').values_list('pk', 'content', 'ticket_id'),
+            lambda v: (_rowid(KIND_COMMENT, v[0]), '', normalize(v[1]), v[2]),
+        )
+        write_chunks(
+            TelegramMessage.objects.using(using).order_by('pk').values_list('pk', 'from_fullname', 'from_username', 'text'),
+            lambda v: (_rowid(KIND_MESSAGE, v[0]), normalize(v[1], v[2]), normalize(v[3]), None),
+        )
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    if progress:
+        progress(total)
+    return total
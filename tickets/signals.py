@@ -0,0 +1,195 @@
+"""Сброс внутрипроцессных кэшей при изменении справочников и авторов сообщений, обновление поискового индекса, индекса автокомплита,
+SLA-полей обращений, сводок аналитики и тегов обращений"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, caches, rollups, search, tagging
+from .models import (
+    Category, Client, Organization, TelegramGroup, TelegramMessage, TelegramRoute, Ticket, TicketComment,
+    TelegramSenderClient, TicketStatus, UserTelegramAccess,
+)
+from .routing import route_index
+
+
+@receiver([post_save, post_delete], sender=TelegramGroup)
+def invalidate_group_cache(sender, instance, **kwargs):
+    caches.group_cache.invalidate(instance.chat_id)
+
+
+@receiver([post_save, post_delete], sender=UserTelegramAccess)
+def invalidate_access_cache(sender, instance, **kwargs):
+    # telegram_user_id мог измениться — сбрасываем кэш допусков целиком
+    caches.access_cache.invalidate()
+    caches.author_cache.invalidate()
+
+
+@receiver(post_save, sender=Client)
+def invalidate_author_cache_on_client_change(sender, instance, created, **kwargs):
+    # Новый клиент ни у кого в кэше не записан; изменённый мог быть закреплён за любым отправителем
+    if not created:
+        caches.author_cache.invalidate()
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=TelegramSenderClient)
+def invalidate_author_cache(sender, instance, **kwargs):
+    caches.author_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=TicketStatus)
+def invalidate_status_cache(sender, instance, **kwargs):
+    caches.invalidate_references('statuses')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    caches.invalidate_references('categories')
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_unknown_client(sender, instance, **kwargs):
+    # Клиентов сохраняют часто — сбрасываем только если затронут «Неизвестный клиент»
+    cached = caches.reference_cache.get('unknown_client')
+    if instance.name == caches.UNKNOWN_CLIENT_NAME or (cached is not caches.MISSING and cached.pk == instance.pk):
+        caches.invalidate_references('unknown_client')
+
+
+@receiver([post_save, post_delete], sender=TelegramRoute)
+def invalidate_route_index(sender, instance, **kwargs):
+    route_index.invalidate()
+
+
+@receiver(post_save, sender=Ticket)
+def index_ticket(sender, instance, **kwargs):
+    search.index_tickets([instance.pk])
+
+
+@receiver(post_save, sender=TicketComment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comments([instance])
+
+
+@receiver(post_save, sender=TelegramMessage)
+def index_message(sender, instance, **kwargs):
+    search.index_messages([instance])
+
+
+@receiver(post_delete, sender=Ticket)
+def unindex_ticket(sender, instance, **kwargs):
+    search.remove(search.KIND_TICKET, instance.pk)
+
+
+@receiver(post_delete, sender=TicketComment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove(search.KIND_COMMENT, instance.pk)
+
+
+@receiver(post_delete, sender=TelegramMessage)
+def unindex_message(sender, instance, **kwargs):
+    search.remove(search.KIND_MESSAGE, instance.pk)
+
+
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Organization)
+def remember_indexed_name(sender, instance, **kwargs):
+    # Название клиента и категории входит в документ обращения, название организации — в слова клиента
+    instance._indexed_name = sender.objects.filter(pk=instance.pk).values_list('name', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Client)
+def reindex_client_tickets(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_indexed_name', instance.name) != instance.name:
+        search.index_ticket_queryset(Ticket.objects.filter(client=instance))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_tickets(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_indexed_name', instance.name) != instance.name:
+        search.index_ticket_queryset(Ticket.objects.filter(category=instance))
+
+
+AUTOCOMPLETE_KINDS = {Client: 'client', Organization: 'organization', Category: 'category', TelegramGroup: 'group', User: 'user'}
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=TelegramGroup)
+@receiver(post_save, sender=User)
+def index_autocomplete(sender, instance, **kwargs):
+    autocomplete.index(AUTOCOMPLETE_KINDS[sender], [instance])
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=TelegramGroup)
+@receiver(post_delete, sender=User)
+def unindex_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove(AUTOCOMPLETE_KINDS[sender], instance.pk)
+
+
+@receiver(post_save, sender=Organization)
+def reindex_organization_clients(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_indexed_name', instance.name) != instance.name:
+        autocomplete.index_queryset('client', Client.objects.filter(organization=instance))
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=TicketStatus)
+def remember_sla_settings(sender, instance, **kwargs):
+    # SLA категории и признак финального статуса хранятся в обращениях (Ticket.sla_deadline, Ticket.status_is_final)
+    instance._stored_sla = sender.objects.filter(pk=instance.pk).values_list(
+        'sla_hours' if sender is Category else 'is_final', flat=True
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Category)
+def recalculate_category_deadlines(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_stored_sla', instance.sla_hours) != instance.sla_hours:
+        Ticket.recalculate_sla(Ticket.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=TicketStatus)
+def update_status_final_flag(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_stored_sla', instance.is_final) != instance.is_final:
+        Ticket.objects.filter(status=instance).update(status_is_final=instance.is_final)
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_stored_snapshot(sender, instance, **kwargs):
+    # Сохранённая версия обращения: её вклад в сводки аналитики (tickets/rollups.py) и теги
+    instance._stored_snapshot = rollups.stored_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Ticket)
+def update_rollups(sender, instance, update_fields=None, **kwargs):
+    old = getattr(instance, '_stored_snapshot', None)
+    rollups.apply(old, rollups.snapshot(instance, old, update_fields))
+
+
+@receiver(post_save, sender=Ticket)
+def sync_ticket_tags(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    old = getattr(instance, '_stored_snapshot', None)
+    if created or old is None or old['tags'] != instance.tags:
+        tagging.sync({instance.pk: instance.tags})
+
+
+@receiver(post_delete, sender=Ticket)
+def remove_from_rollups(sender, instance, **kwargs):
+    rollups.apply(rollups.snapshot(instance), None)
+
+
+@receiver(pre_delete, sender=User)
+def remember_assigned_days(sender, instance, **kwargs):
+    # Исполнитель обнуляется у обращений через SET_NULL без сигналов — сводки этих дней пересчитываются
+    instance._rollup_days = rollups.ticket_days(Ticket.objects.filter(assigned_to=instance))
+
+
+@receiver(post_delete, sender=User)
+def refresh_assigned_days(sender, instance, **kwargs):
+    rollups.refresh_days(getattr(instance, '_rollup_days', []))
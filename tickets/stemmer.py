@@ -0,0 +1,144 @@
+"""Стеммер русского языка (алгоритм Snowball) для полнотекстового поиска.
+
+Приводит слово к основе: «обращения», «обращений», «обращению» → «обращен».
+Одна и та же функция применяется при индексации и к поисковому запросу,
+поэтому находятся все словоформы. Слова без кириллицы возвращаются как есть.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому',
+    'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+REFLEXIVE = ('ся', 'сь')
+VERB_1 = ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н')
+VERB_2 = (
+    'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют', 'ены', 'ить',
+    'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях',
+    'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья',
+    'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+# Служебные слова: в поисковом запросе не учитываются (иначе «проблемы с доставкой»
+# требовало бы слова «с» в документе)
+STOPWORDS = frozenset("""
+    без близ в во вне для до за из изо к ко между на над надо о об обо около от ото перед передо по под подо
+    при про ради с со среди у через
+    а и или но да же ли либо то ни не нет бы как так что чтобы чем если когда где куда там тут это этот эта
+    эти того тот та те то ещё еще уже только вот вон даже лишь
+    я мы ты вы он она оно они мой моя мое мои наш наша наше наши ваш ваша ваше ваши свой своя свое свои
+    его ее её их ему ей им нам вам мне тебе себе меня тебя нас вас него нее неё них
+""".split())
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _longest_suffix(word, suffixes):
+    for suffix in sorted(suffixes, key=len, reverse=True):
+        if word.endswith(suffix):
+            return suffix
+    return None
+
+
+def _remove_grouped(rv, group_1, group_2):
+    """Удаляет окончание; окончания первой группы — только после «а» или «я»"""
+    suffix = _longest_suffix(rv, group_1 + group_2)
+    if suffix is None:
+        return rv, False
+    if suffix in group_1 and suffix not in group_2:
+        if not rv[:-len(suffix)].endswith(('а', 'я')):
+            return rv, False
+    return rv[:-len(suffix)], True
+
+
+def _remove(rv, suffixes):
+    suffix = _longest_suffix(rv, suffixes)
+    if suffix is None:
+        return rv, False
+    return rv[:-len(suffix)], True
+
+
+def _regions(word):
+    """Начала областей RV и R2 (см. описание алгоритма Snowball)"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def stem(word: str) -> str:
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    rv, removed = _remove_grouped(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if not removed:
+        rv, _ = _remove(rv, REFLEXIVE)
+        rv, removed = _remove(rv, ADJECTIVE)
+        if removed:
+            rv, _ = _remove_grouped(rv, PARTICIPLE_1, PARTICIPLE_2)
+        else:
+            rv, removed = _remove_grouped(rv, VERB_1, VERB_2)
+            if not removed:
+                rv, _ = _remove(rv, NOUN)
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание, если оно целиком в R2
+    suffix = _longest_suffix(rv, DERIVATIONAL)
+    if suffix and len(prefix) + len(rv) - len(suffix) >= r2_start:
+        rv = rv[:-len(suffix)]
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, removed = _remove(rv, SUPERLATIVE)
+        if removed:
+            if rv.endswith('нн'):
+                rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def stem_words(text: str) -> list:
+    """Разбивает текст на слова и приводит каждое к основе"""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
+
+
+def query_words(text: str) -> list:
+    """Основы значимых слов поискового запроса: без служебных слов и слов короче двух букв"""
+    words = (word.lower().replace('ё', 'е') for word in WORD_RE.findall(text or ''))
+    return [stem(word) for word in words if len(word) >= 2 and word not in STOPWORDS]
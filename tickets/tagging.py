@@ -0,0 +1,49 @@
+"""Нормализованные теги обращений.
+
+Теги редактируются текстом через запятую (Ticket.tags), а для подсчёта
+хранятся в таблицах Tag и TicketTag: «сколько обращений с каждым тегом» —
+группировка по индексу (tag, ticket) вместо разбора строк в Python.
+
+Связи синхронизируются сигналом сохранения обращения (tickets/signals.py);
+существующие данные перенесены миграцией 0028.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Tag, TicketTag
+
+TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def split_tags(tags: str) -> list:
+    """Теги из строки через запятую, без повторов"""
+    return list(dict.fromkeys(tag.strip()[:TAG_LENGTH] for tag in (tags or '').split(',') if tag.strip()))
+
+
+def sync(tags_by_ticket: dict):
+    """Заменяет теги обращений. tags_by_ticket: {id обращения: строка тегов}"""
+    if not tags_by_ticket:
+        return
+    parsed = {ticket_id: split_tags(tags) for ticket_id, tags in tags_by_ticket.items()}
+    names = {name for tag_names in parsed.values() for name in tag_names}
+    with transaction.atomic():
+        if names:
+            Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id')) if names else {}
+        TicketTag.objects.filter(ticket_id__in=list(parsed)).delete()
+        TicketTag.objects.bulk_create([
+            TicketTag(ticket_id=ticket_id, tag_id=tag_ids[name])
+            for ticket_id, tag_names in parsed.items()
+            for name in tag_names
+        ])
+
+
+def top_tags(tickets, limit=20) -> list:
+    """[{'name', 'count'}] — самые частые теги среди обращений queryset'а tickets"""
+    rows = (
+        TicketTag.objects.filter(ticket__in=tickets.order_by().values('pk'))
+        .values('tag__name')
+        .annotate(total=Count('ticket_id'))
+        .order_by('-total', 'tag__name')[:limit]
+    )
+    return [{'name': row['tag__name'], 'count': row['total']} for row in rows]
@@ -0,0 +1,56 @@
+"""Исходящий клиент Telegram.
+
+Представления ничего не отправляют сами — они ставят задания в очередь
+(tickets/outbox.py). Команда ``telegram_outbox`` создаёт один долгоживущий
+``telegram.Bot`` с пулом keep-alive HTTP-соединений и таймаутами из настроек
+(``make_sender(...).build_bot()``) и доставляет через него всю очередь.
+"""
+from django.conf import settings
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+
+def get_setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class TelegramSender:
+    """Параметры подключения к Bot API"""
+
+    def __init__(self, token: str, pool_size: int = 8, connect_timeout: float = 5.0,
+                 read_timeout: float = 10.0, write_timeout: float = 10.0, pool_timeout: float = 5.0,
+                 base_url: str = 'https://api.telegram.org/bot'):
+        self.token = token
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+
+    def build_bot(self) -> Bot:
+        """Создаёт Bot с пулом соединений и таймаутами из настроек"""
+        request = HTTPXRequest(
+            connection_pool_size=self.pool_size,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            write_timeout=self.write_timeout,
+            pool_timeout=self.pool_timeout,
+        )
+        return Bot(token=self.token, base_url=self.base_url, request=request)
+
+
+def make_sender(token: str, **overrides) -> TelegramSender:
+    """Создаёт отправителя с параметрами из настроек (их можно переопределить)"""
+    options = {
+        'pool_size': int(get_setting('TELEGRAM_CONNECTION_POOL_SIZE', 8)),
+        'connect_timeout': float(get_setting('TELEGRAM_CONNECT_TIMEOUT', 5.0)),
+        'read_timeout': float(get_setting('TELEGRAM_READ_TIMEOUT', 10.0)),
+        'write_timeout': float(get_setting('TELEGRAM_WRITE_TIMEOUT', 10.0)),
+        'pool_timeout': float(get_setting('TELEGRAM_POOL_TIMEOUT', 5.0)),
+        'base_url': get_setting('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot'),
+    }
+    options.update(overrides)
+    return TelegramSender(token=token, **options)
+
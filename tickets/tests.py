@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qsl
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from telegram import Update
+from telegram.error import NetworkError
+
+from . import archive, autocomplete, caches, date_ranges, export_jobs, exports, outbox, pagination, retention, rollups, search, tagging, webhook
+from .authors import resolve_authors
+from .concurrency import PerChatUpdateProcessor
+from .views import enrich_comments
+from .ingest import StreamBuffer
+from .management.commands.bot import Command as BotCommand
+from .management.commands.telegram_outbox import Command as OutboxCommand
+from .models import (
+    ArchivedTelegramMessage, AutocompleteEntry, Category, Client, ExportJob, Organization, Tag, Ticket, TicketComment, TicketDailyStat, TicketStatus, TicketTag,
+    TicketTagDailyStat, TelegramMessage, TelegramMessageLink, TelegramOutboxMessage, TelegramSenderClient, TelegramUpdate, UserTelegramAccess,
+)
+
+
+def make_ticket(**kwargs):
+    """Обращение со справочниками по умолчанию"""
+    values = {
+        'title': 'Проблема доставки',
+        'description': 'Товар не доставлен',
+        'category': Category.objects.get_or_create(name='Логистика')[0],
+        'client': Client.objects.get_or_create(name='Клиент')[0],
+        'status': TicketStatus.objects.get_or_create(name='Новое')[0],
+        'created_by': User.objects.get_or_create(username='creator')[0],
+        'telegram_chat_id': '-100',
+        'external_message_id': '10',
+    }
+    values.update(kwargs)
+    return Ticket.objects.create(**values)
+
+
+def query_plan(queryset) -> str:
+    """EXPLAIN QUERY PLAN запроса queryset одной строкой"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+class FakeBot:
+    """Bot API для обработчика очереди: записывает вызовы, падает на тексте из fail_on"""
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+        self.next_message_id = 100
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None):
+        self.calls.append(('send', chat_id, text))
+        if text in self.fail_on:
+            raise NetworkError('connection reset')
+        self.next_message_id += 1
+        return SimpleNamespace(message_id=self.next_message_id)
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        self.calls.append(('edit', chat_id, message_id, text))
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls.append(('delete', chat_id, message_id))
+
+
+class OutboxOrderingTests(TestCase):
+    def setUp(self):
+        self.ticket = make_ticket()
+        self.command = OutboxCommand()
+        self.command.max_attempts = 8
+
+    def deliver(self, bot, items):
+        async def run():
+            self.command.semaphore = asyncio.Semaphore(1)
+            await self.command.deliver_chat(bot, items)
+        async_to_sync(run)()
+
+    def test_failure_stops_chat_and_blocks_later_items(self):
+        first = outbox.enqueue_send(self.ticket, 'первое', '10', 'add_comment')
+        second = outbox.enqueue_edit(self.ticket, '55', 'правка', 'add_comment')
+        other_chat = make_ticket(telegram_chat_id='-200')
+        other = outbox.enqueue_send(other_chat, 'другой чат', '10', 'add_comment')
+
+        items = outbox.claim_batch(10)
+        self.assertEqual([item.id for item in items], [first.id, second.id, other.id])
+        bot = FakeBot(fail_on={'первое'})
+        self.deliver(bot, [item for item in items if item.chat_id == '-100'])
+
+        # Правка не ушла раньше отправки, от которой зависит
+        self.assertEqual(bot.calls, [('send', '-100', 'первое')])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+        self.assertEqual((second.status, second.attempts), ('pending', 0))
+
+        # Пока первое задание ждёт повтора, чат не забирается; другие чаты — забираются
+        other.status = 'pending'
+        other.save()
+        self.assertEqual([item.id for item in outbox.claim_batch(10)], [other.id])
+
+        TelegramOutboxMessage.objects.filter(id=first.id).update(next_attempt_at=timezone.now())
+        self.assertEqual([item.id for item in outbox.claim_batch(10)], [first.id, second.id])
+
+    def test_comment_edit_replaces_pending_send(self):
+        author = User.objects.create(username='operator')
+        comment = TicketComment.objects.create(ticket=self.ticket, author=author, content='черновик')
+        send = outbox.enqueue_send(self.ticket, 'черновик', '10', 'add_comment', author=author, comment=comment)
+
+        item = outbox.enqueue_comment_edit(self.ticket, comment, 'исправлено', author=author)
+
+        self.assertEqual(item.id, send.id)
+        self.assertEqual(TelegramOutboxMessage.objects.count(), 1)
+        send.refresh_from_db()
+        self.assertEqual(send.text, 'исправлено')
+
+    def test_comment_edit_waits_for_send_in_flight(self):
+        author = User.objects.create(username='operator')
+        comment = TicketComment.objects.create(ticket=self.ticket, author=author, content='черновик')
+        outbox.enqueue_send(self.ticket, 'черновик', '10', 'add_comment', author=author, comment=comment)
+        [send] = outbox.claim_batch(10)
+
+        edit = outbox.enqueue_comment_edit(self.ticket, comment, 'исправлено', author=author)
+        self.assertEqual((edit.action, edit.target_message_id), ('edit', ''))
+        # Отправка ещё идёт — правка этого чата не забирается
+        self.assertEqual(outbox.claim_batch(10), [])
+
+        bot = FakeBot()
+        self.deliver(bot, [send])
+        self.deliver(bot, outbox.claim_batch(10))
+
+        self.assertEqual(bot.calls, [('send', '-100', 'черновик'), ('edit', '-100', 101, 'исправлено')])
+        edit.refresh_from_db()
+        self.assertEqual((edit.status, edit.target_message_id), ('sent', '101'))
+
+
+    def test_database_error_after_send_does_not_resend(self):
+        comment = TicketComment.objects.create(ticket=self.ticket, content='ответ')
+        outbox.enqueue_send(self.ticket, 'ответ', '10', 'add_comment', comment=comment)
+        bot = FakeBot()
+        self.command.record_retry_delay = 0
+        mark_sent = outbox.mark_sent
+        failures = [OperationalError('database is locked')]
+
+        def locked_once(*args):
+            if failures:
+                raise failures.pop()
+            return mark_sent(*args)
+
+        with mock.patch.object(outbox, 'mark_sent', side_effect=locked_once), \
+                mock.patch.object(outbox, 'apply_result', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('tickets.management.commands.telegram_outbox', 'ERROR'):
+            self.deliver(bot, outbox.claim_batch(10))
+
+        self.assertEqual(bot.calls, [('send', '-100', 'ответ')])
+        send = TelegramOutboxMessage.objects.get()
+        self.assertEqual((send.status, send.attempts, send.result_message_id), ('sent', 1, '101'))
+        self.assertEqual(outbox.claim_batch(10), [])
+
+        # Учёт в комментарии не записался, но правка находит сообщение по заданию отправки
+        comment.refresh_from_db()
+        self.assertFalse(comment.telegram_message_id)
+        outbox.enqueue_comment_edit(self.ticket, comment, 'исправлено')
+        self.deliver(bot, outbox.claim_batch(10))
+        self.assertEqual(bot.calls[-1], ('edit', '-100', 101, 'исправлено'))
+
+    def test_claim_checks_chat_order_in_the_claiming_update(self):
+        first = outbox.enqueue_send(self.ticket, 'первое', '10', 'add_comment')
+        second = outbox.enqueue_send(self.ticket, 'второе', '10', 'add_comment')
+        # Первое задание уже забрал другой обработчик
+        TelegramOutboxMessage.objects.filter(id=first.id).update(status='sending', locked_by='other', locked_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(outbox.claim_batch(10), [])
+        [claim] = [query['sql'] for query in queries.captured_queries if "SET \"status\" = 'sending'" in query['sql']]
+        self.assertIn('EXISTS', claim)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+
+
+def direct_call(func):
+    """to_async для буфера без пула потоков"""
+    async def call(*args):
+        return func(*args)
+    return call
+
+
+class StreamBufferTests(SimpleTestCase):
+    def make_buffer(self, flush_func, **kwargs):
+        return StreamBuffer(flush_func, max_size=2, max_delay_ms=0, to_async=direct_call,
+                            retry_delay=0.01, **kwargs)
+
+    def entry(self, message_id):
+        return {'message_id': str(message_id), 'message_date': datetime(2026, 10, 1, 12, tzinfo=dt_timezone.utc)}
+
+    def test_failed_flush_is_requeued_in_order(self):
+        written = []
+        failures = iter([True, True])
+
+        def flush(batch):
+            if next(failures, False):
+                raise RuntimeError('database is locked')
+            written.extend(entry['message_id'] for entry in batch)
+
+        async def run():
+            buffer = self.make_buffer(flush)
+            for message_id in range(1, 4):
+                await buffer.add(self.entry(message_id))
+            await asyncio.sleep(0.2)
+            return buffer
+
+        with self.assertLogs('tickets.ingest', 'WARNING'):
+            buffer = asyncio.run(run())
+        self.assertEqual(written, ['1', '2', '3'])
+        self.assertEqual((len(buffer), buffer.failures), (0, 0))
+
+    def test_waiting_add_returns_after_batch_is_written(self):
+        written = []
+        failures = iter([True])
+
+        def flush(batch):
+            if next(failures, False):
+                raise RuntimeError('database is locked')
+            written.extend(entry['message_id'] for entry in batch)
+
+        async def run():
+            buffer = StreamBuffer(flush, max_size=100, max_delay_ms=10, to_async=direct_call, retry_delay=0.01)
+            await buffer.add(self.entry(1))
+            # Первая запись падает: ожидание длится до успешного повтора
+            await buffer.add(self.entry(2), wait=True)
+            return list(written)
+
+        with self.assertLogs('tickets.ingest', 'WARNING'):
+            written_on_return = asyncio.run(run())
+        self.assertEqual(written_on_return, ['1', '2'])
+
+    def test_waiting_add_fails_when_batch_is_lost(self):
+        def flush(batch):
+            raise RuntimeError('database is locked')
+
+        async def run():
+            buffer = StreamBuffer(flush, max_size=100, max_delay_ms=1000, to_async=direct_call)
+            waiting = asyncio.create_task(buffer.add(self.entry(1), wait=True))
+            await asyncio.sleep(0)
+            await buffer.flush(final=True)
+            await waiting
+
+        with self.assertLogs('tickets.ingest', 'ERROR'), self.assertRaisesMessage(RuntimeError, 'database is locked'):
+            asyncio.run(run())
+
+    def test_batch_is_spilled_and_replayed(self):
+        written = []
+        broken = True
+
+        def flush(batch):
+            if broken:
+                raise RuntimeError('disk I/O error')
+            written.extend(batch)
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            async def fail():
+                buffer = self.make_buffer(flush, max_retries=1, spill_dir=spill_dir)
+                await buffer.add(self.entry(1))
+                await buffer.add(self.entry(2))
+                await asyncio.sleep(0.1)
+                await buffer.flush(final=True)
+                return buffer
+
+            with self.assertLogs('tickets.ingest', 'WARNING') as logs:
+                buffer = asyncio.run(fail())
+            self.assertIn('spilled', logs.output[-1])
+            self.assertEqual(buffer.spilled_messages, 2)
+            self.assertEqual(len(list(Path(spill_dir).glob('stream-*.jsonl'))), 1)
+
+            broken = False
+            replayed = asyncio.run(self.make_buffer(flush, spill_dir=spill_dir).replay_spilled())
+            self.assertEqual(replayed, 2)
+            self.assertEqual(written, [self.entry(1), self.entry(2)])
+            self.assertEqual(list(Path(spill_dir).iterdir()), [])
+
+
+class ReplyLinkingTests(TestCase):
+    def test_failed_reply_is_rolled_back_without_losing_the_batch(self):
+        ticket = make_ticket()
+        original = TicketComment.objects.create(ticket=ticket, content='ответ оператора', telegram_message_id='20')
+        TelegramMessageLink.remember('-100', '20', ticket, original)
+        replies = [
+            TelegramMessage.objects.create(
+                chat_id='-100', message_id=str(message_id), reply_to_message_id='20', text=f'ответ {message_id}',
+                message_date=timezone.now(),
+            )
+            for message_id in (21, 22)
+        ]
+        remember = TelegramMessageLink.remember
+
+        def flaky_remember(chat_id, message_id, *args, **kwargs):
+            if message_id == '21':
+                raise RuntimeError('link write failed')
+            return remember(chat_id, message_id, *args, **kwargs)
+
+        with mock.patch.object(TelegramMessageLink, 'remember', side_effect=flaky_remember), self.assertLogs(level='ERROR'):
+            BotCommand()._link_replies_to_comments(replies)
+
+        # Комментарий первого ответа откатился вместе со связью, второй ответ привязан
+        self.assertEqual(
+            list(TicketComment.objects.exclude(pk=original.pk).values_list('telegram_message_id', flat=True)), ['22'],
+        )
+        self.assertFalse(TelegramMessage.objects.filter(message_id='21', linked_ticket__isnull=False).exists())
+
+
+class TelegramMessageLinkTests(TestCase):
+    def setUp(self):
+        self.first = make_ticket(telegram_chat_id='-100')
+        self.second = make_ticket(telegram_chat_id='-200', title='Другой чат')
+        self.first_comment = TicketComment.objects.create(ticket=self.first, content='ответ в первом чате')
+        self.second_comment = TicketComment.objects.create(ticket=self.second, content='ответ во втором чате')
+        # Одинаковый message_id в разных чатах
+        TelegramMessageLink.remember('-100', '20', self.first, self.first_comment)
+        TelegramMessageLink.remember('-200', '20', self.second, self.second_comment)
+
+    def reply(self, chat_id, message_id):
+        return TelegramMessage.objects.create(
+            chat_id=chat_id, message_id=message_id, reply_to_message_id='20', text=f'ответ {message_id}',
+            message_date=timezone.now(),
+        )
+
+    def test_replies_link_to_ticket_of_their_own_chat(self):
+        self.assertEqual(TelegramMessageLink.find_comment('-100', '20'), self.first_comment)
+        self.assertEqual(TelegramMessageLink.find_comment('-200', '20'), self.second_comment)
+
+        replies = [self.reply('-100', '21'), self.reply('-200', '21')]
+        BotCommand()._link_replies_to_comments(replies)
+
+        self.assertEqual(
+            sorted(TelegramMessage.objects.filter(message_id='21').values_list('chat_id', 'linked_ticket_id')),
+            [('-100', self.first.id), ('-200', self.second.id)],
+        )
+        self.assertEqual(TicketComment.objects.filter(ticket=self.first, telegram_message_id='21').count(), 1)
+        self.assertEqual(TicketComment.objects.filter(ticket=self.second, telegram_message_id='21').count(), 1)
+
+    def test_single_reply_uses_its_chat(self):
+        reply = self.reply('-200', '30')
+        BotCommand()._check_and_link_reply_to_comment(reply, '20', '-200')
+
+        reply.refresh_from_db()
+        self.assertEqual(reply.linked_ticket, self.second)
+        self.assertFalse(TicketComment.objects.filter(ticket=self.first, telegram_message_id='30').exists())
+
+    def test_remember_and_forget_under_unique_key(self):
+        # Повторная связь того же сообщения обновляет строку, а не падает на уникальном ключе
+        TelegramMessageLink.remember('-100', '20', self.second, self.second_comment)
+        TelegramMessageLink.remember_many([('-100', '20', self.first, None), ('-100', '40', self.first, None)])
+
+        links = dict(
+            ((chat_id, message_id), (ticket_id, comment_id))
+            for chat_id, message_id, ticket_id, comment_id in
+            TelegramMessageLink.objects.values_list('chat_id', 'message_id', 'ticket_id', 'comment_id')
+        )
+        self.assertEqual(links, {
+            ('-100', '20'): (self.first.id, None),
+            ('-100', '40'): (self.first.id, None),
+            ('-200', '20'): (self.second.id, self.second_comment.id),
+        })
+
+        TelegramMessageLink.forget('-100', '20')
+        self.assertEqual(
+            sorted(TelegramMessageLink.objects.values_list('chat_id', 'message_id')), [('-100', '40'), ('-200', '20')],
+        )
+        self.assertIsNone(TelegramMessageLink.remember('', '50', self.first))
+
+
+class AuthorResolutionTests(TestCase):
+    def setUp(self):
+        caches.author_cache.invalidate()
+        self.addCleanup(caches.author_cache.invalidate)
+
+    def test_unknown_senders_get_one_client_each(self):
+        senders = {'501': ('ivan', 'Иван Петров'), '502': ('', 'Пётр')}
+        authors = resolve_authors(senders)
+        first, second = authors['501'][2], authors['502'][2]
+        self.assertEqual((first.name, first.external_id), ('Неизвестный клиент (ivan)', '501'))
+        self.assertEqual(second.name, 'Неизвестный клиент (502)')
+        self.assertEqual(
+            dict(TelegramSenderClient.objects.values_list('from_user_id', 'client_id')), {'501': first.pk, '502': second.pk},
+        )
+        self.assertTrue(AutocompleteEntry.objects.filter(kind='client', object_id=first.pk, token='ivan').exists())
+
+        # Повтор: из кэша без запросов, без кэша — по закреплению, новых клиентов нет
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_authors(senders)['501'][2], first)
+        caches.author_cache.invalidate()
+        with self.assertNumQueries(2):
+            authors = resolve_authors(senders)
+        self.assertEqual((authors['501'][2].pk, authors['502'][2].pk), (first.pk, second.pk))
+        self.assertEqual(Client.objects.filter(name__startswith='Неизвестный клиент').count(), 2)
+
+    def test_allowed_user_and_manual_client(self):
+        user = User.objects.create(username='operator')
+        UserTelegramAccess.objects.create(user=user, telegram_user_id='601', is_allowed=True)
+        manual = Client.objects.create(name='Поставщик', external_id='602')
+        authors = resolve_authors({'601': ('op', ''), '602': ('sup', ''), '': ('', '')})
+        self.assertEqual(authors['601'], ('user', user, None))
+        self.assertEqual(authors['602'], ('client', None, manual))
+        self.assertEqual(authors[''], ('client', None, None))
+        self.assertEqual(TelegramSenderClient.objects.get(from_user_id='602').client, manual)
+        self.assertEqual(Client.objects.count(), 1)
+
+    def test_concurrent_link_wins_and_our_duplicate_is_removed(self):
+        existing = Client.objects.create(name='Старая карточка', external_id='702')
+        bulk_create = Client.objects.bulk_create
+
+        def create_then_race(objs, *args, **kwargs):
+            created = bulk_create(objs, *args, **kwargs)
+            # Другой процесс успел закрепить своих клиентов за обоими отправителями
+            for user_id in ('701', '702'):
+                rival = Client.objects.create(name=f'Неизвестный клиент (чужой {user_id})', external_id=user_id)
+                TelegramSenderClient.objects.create(from_user_id=user_id, client=rival)
+            return created
+
+        with mock.patch.object(Client.objects, 'bulk_create', side_effect=create_then_race):
+            authors = resolve_authors({'701': ('new', ''), '702': ('old', '')})
+
+        self.assertEqual(authors['701'][2].name, 'Неизвестный клиент (чужой 701)')
+        self.assertEqual(authors['702'][2].name, 'Неизвестный клиент (чужой 702)')
+        # Наш созданный клиент удалён, существовавший до нас — нет
+        self.assertFalse(Client.objects.filter(name='Неизвестный клиент (new)').exists())
+        self.assertTrue(Client.objects.filter(pk=existing.pk).exists())
+        self.assertEqual(Client.objects.filter(external_id='701').count(), 1)
+        self.assertFalse(AutocompleteEntry.objects.filter(kind='client', token='new').exists())
+
+    def test_stream_status_actions_comment_as_each_sender(self):
+        ticket = make_ticket()
+        TicketStatus.objects.create(name='Ожидает ответа', is_working=True)
+        TicketStatus.objects.create(name='В работе', is_working=True)
+        operator = User.objects.create(username='operator', is_staff=True)
+        self.client.force_login(operator)
+        first = TelegramMessage.objects.create(
+            chat_id='-100', message_id='801', text='ждём', from_user_id='901', from_username='anna', message_date=timezone.now(),
+        )
+        second = TelegramMessage.objects.create(
+            chat_id='-100', message_id='802', text='берите', from_user_id='902', from_username='boris', message_date=timezone.now(),
+        )
+
+        for action, msg in (('set_waiting', first), ('set_working', second)):
+            response = self.client.post(
+                reverse('tickets:stream'), {'action': action, 'ticket_id': str(ticket.id), 'message_id': str(msg.id)},
+            )
+            self.assertEqual(response.status_code, 302)
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status.name, 'В работе')
+        authors = dict(ticket.comments.filter(author_type='client').values_list('telegram_message_id', 'author_client__name'))
+        self.assertEqual(authors, {'801': 'Неизвестный клиент (anna)', '802': 'Неизвестный клиент (boris)'})
+        self.assertEqual(TelegramMessageLink.objects.filter(ticket=ticket).count(), 2)
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    """Локальный Bot API: отвечает на getMe и sendMessage, запоминает вызовы"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        self.calls = []
+        super().__init__(('127.0.0.1', 0), FakeTelegramHandler)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}/bot'
+
+    def sent(self, method: str) -> list:
+        return [params for name, params in self.calls if name == method]
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        params = json.loads(body) if body.startswith('{') else dict(parse_qsl(body))
+        self.server.calls.append((method, params))
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Help desk', 'username': 'help_desk_bot'}
+        elif method == 'sendMessage':
+            result = {
+                'message_id': 500 + len(self.server.calls), 'date': 0, 'text': params.get('text', ''),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            }
+        else:
+            result = True
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+WEBHOOK_SECRET = 'webhook-secret'
+
+
+class WebhookTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeTelegramServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.overrides = override_settings(
+            TELEGRAM_BOT_TOKEN='123:TEST', TELEGRAM_WEBHOOK_SECRET=WEBHOOK_SECRET,
+            TELEGRAM_API_BASE_URL=cls.server.base_url,
+        )
+        cls.overrides.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.overrides.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.calls.clear()
+        user = User.objects.create(username='operator')
+        UserTelegramAccess.objects.create(user=user, telegram_user_id='42', is_allowed=True)
+
+    def start_update(self, update_id):
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': 7, 'date': 1760000000, 'text': '/start',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+                'chat': {'id': 42, 'type': 'private'},
+                'from': {'id': 42, 'is_bot': False, 'first_name': 'Оператор'},
+            },
+        }
+
+    async def post(self, update, secret=WEBHOOK_SECRET):
+        return await self.async_client.post(
+            reverse('tickets:telegram_webhook'), json.dumps(update), content_type='application/json',
+            headers={'X-Telegram-Bot-Api-Secret-Token': secret},
+        )
+
+    async def test_update_is_processed_once(self):
+        try:
+            first = await self.post(self.start_update(1001))
+            duplicate = await self.post(self.start_update(1001))
+        finally:
+            await webhook.shutdown_application()
+
+        self.assertEqual((first.status_code, duplicate.status_code), (200, 200))
+        replies = self.server.sent('sendMessage')
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(str(replies[0]['chat_id']), '42')
+
+    async def test_invalid_secret_is_rejected(self):
+        response = await self.post(self.start_update(1002), secret='wrong')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await TelegramUpdate.objects.filter(update_id=1002).aexists())
+        self.assertEqual(self.server.calls, [])
+
+    async def test_failed_update_is_processed_on_redelivery(self):
+        start = BotCommand.start
+        calls = []
+
+        async def flaky_start(command, update, context):
+            calls.append(update.update_id)
+            if len(calls) == 1:
+                raise RuntimeError('database is locked')
+            await start(command, update, context)
+
+        try:
+            with mock.patch.object(BotCommand, 'start', flaky_start), self.assertLogs('tickets.webhook', 'ERROR'), \
+                    self.assertLogs('django.request', 'ERROR'):
+                failed = await self.post(self.start_update(1003))
+                self.assertEqual(failed.status_code, 500)
+                self.assertFalse(await TelegramUpdate.objects.filter(update_id=1003).aexists())
+                redelivered = await self.post(self.start_update(1003))
+        finally:
+            await webhook.shutdown_application()
+
+        self.assertEqual(redelivered.status_code, 200)
+        self.assertEqual(calls, [1003, 1003])
+        self.assertEqual(len(self.server.sent('sendMessage')), 1)
+
+    async def test_group_message_is_written_before_acknowledgement(self):
+        update = {
+            'update_id': 1004,
+            'message': {
+                'message_id': 70, 'date': 1760000000, 'text': 'Где заказ?',
+                'chat': {'id': -300, 'type': 'supergroup', 'title': 'Поставщики'},
+                'from': {'id': 77, 'is_bot': False, 'first_name': 'Клиент'},
+            },
+        }
+        try:
+            with override_settings(TELEGRAM_WEBHOOK_STREAM_FLUSH_MS=1000):
+                response = await self.post(update)
+            # Ответ отдан — сообщение уже в базе, а не только в буфере процесса
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(await TelegramMessage.objects.filter(chat_id='-300', message_id='70').aexists())
+        finally:
+            await webhook.shutdown_application()
+
+    def test_old_marks_are_pruned_by_age(self):
+        TelegramUpdate.objects.create(update_id=1)
+        TelegramUpdate.objects.filter(update_id=1).update(received_at=timezone.now() - timedelta(days=2))
+        TelegramUpdate.objects.create(update_id=2)
+
+        with mock.patch.object(webhook, '_last_prune', 0.0):
+            self.assertTrue(webhook._remember_update(3))
+
+        self.assertEqual(sorted(TelegramUpdate.objects.values_list('update_id', flat=True)), [2, 3])
+
+
+def chat_update(update_id, chat_id):
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 0, 'text': 'текст', 'chat': {'id': chat_id, 'type': 'group'}},
+    }, None)
+
+
+class PerChatUpdateProcessorTests(SimpleTestCase):
+    def run_updates(self, processor, updates, delay=0.01):
+        log = []
+        running = set()
+        peak = 0
+
+        async def handle(update):
+            nonlocal peak
+            running.add(update.update_id)
+            peak = max(peak, len(running))
+            log.append(('start', update.effective_chat.id, update.update_id))
+            await asyncio.sleep(delay)
+            running.discard(update.update_id)
+            log.append(('end', update.effective_chat.id, update.update_id))
+
+        async def run():
+            await processor.initialize()
+            await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+            await processor.shutdown()
+
+        asyncio.run(run())
+        return log, peak
+
+    def test_chat_updates_run_in_order_and_chats_in_parallel(self):
+        processor = PerChatUpdateProcessor(max_concurrent_updates=2)
+        updates = [chat_update(index, chat_id) for index, chat_id in enumerate([1, 2, 1, 3, 1, 2], start=1)]
+
+        log, peak = self.run_updates(processor, updates)
+
+        for chat_id in (1, 2, 3):
+            started = [update_id for event, chat, update_id in log if event == 'start' and chat == chat_id]
+            self.assertEqual(started, sorted(started))
+        self.assertEqual(peak, 2)
+        # Обновление чата начинается только после завершения предыдущего обновления того же чата
+        for chat_id in (1, 2):
+            events = [event for event, chat, _ in log if chat == chat_id]
+            self.assertEqual(events, ['start', 'end'] * (len(events) // 2))
+
+    def test_busy_chat_does_not_take_all_slots(self):
+        processor = PerChatUpdateProcessor(max_concurrent_updates=2)
+        updates = [chat_update(index, 1) for index in range(1, 6)] + [chat_update(6, 2)]
+
+        log, _ = self.run_updates(processor, updates)
+
+        # Второй чат обработан, пока первый разбирает свою очередь
+        self.assertLess(log.index(('end', 2, 6)), log.index(('end', 1, 5)))
+        self.assertEqual(processor.max_concurrent_updates, 64)
+
+    def test_db_calls_close_old_connections_in_pool_thread(self):
+        processor = PerChatUpdateProcessor(max_concurrent_updates=2)
+        events = []
+
+        def query():
+            events.append(('query', threading.current_thread().name))
+            return 42
+
+        async def run():
+            await processor.initialize()
+            try:
+                return await processor.sync_to_async(query)()
+            finally:
+                await processor.shutdown()
+
+        with mock.patch('tickets.concurrency.close_old_connections',
+                        side_effect=lambda: events.append(('close', threading.current_thread().name))):
+            self.assertEqual(asyncio.run(run()), 42)
+
+        self.assertEqual([event for event, _ in events], ['close', 'query', 'close'])
+        self.assertTrue(all(thread.startswith('bot-db') for _, thread in events))
+
+
+class TicketDetailCommentsTests(TestCase):
+    def setUp(self):
+        self.operator = User.objects.create(username='operator', is_staff=True)
+        self.ticket = make_ticket()
+
+    def add_replies(self, count, start=0):
+        """count ответов клиента на сообщения оператора: комментарий + его сообщение + исходное сообщение"""
+        for index in range(start, start + count):
+            question_id, answer_id = str(1000 + index * 2), str(1001 + index * 2)
+            TelegramMessage.objects.create(
+                chat_id='-100', message_id=question_id, text=f'вопрос {index}', from_user_id=str(self.operator.id),
+                message_date=timezone.now(),
+            )
+            TelegramMessage.objects.create(
+                chat_id='-100', message_id=answer_id, reply_to_message_id=question_id, text=f'ответ {index}',
+                from_fullname='Клиент', message_date=timezone.now(),
+            )
+            TicketComment.objects.create(
+                ticket=self.ticket, author_type='client', content=f'ответ {index}', telegram_message_id=answer_id,
+            )
+
+    def comments(self):
+        return self.ticket.comments.select_related('author', 'author_client').order_by('created_at')
+
+    def test_enrich_comments_query_count_is_constant(self):
+        self.add_replies(3)
+        with self.assertNumQueries(3):
+            enriched = enrich_comments(self.comments(), '-100', self.operator)
+        self.assertEqual(len(enriched), 3)
+        self.assertTrue(all(item['is_reply'] for item in enriched))
+        self.assertEqual(enriched[0]['reply_info']['original_text'], 'вопрос 0')
+
+        self.add_replies(30, start=3)
+        with self.assertNumQueries(3):
+            enriched = enrich_comments(self.comments(), '-100', self.operator)
+        self.assertEqual(len(enriched), 33)
+
+    def test_ticket_detail_query_count_does_not_grow_with_comments(self):
+        self.client.force_login(self.operator)
+        url = reverse('tickets:ticket_detail', args=[self.ticket.id])
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.add_replies(2)
+        few = count_queries()
+        self.add_replies(20, start=2)
+        self.assertEqual(count_queries(), few)
+
+
+class StreamBulkCommentTests(TestCase):
+    def setUp(self):
+        self.operator = User.objects.create(username='operator', is_staff=True)
+        self.client.force_login(self.operator)
+        self.ticket = make_ticket()
+        # Django дробит bulk_create/bulk_update на SQLite по 999 параметров (старый лимит SQLite);
+        # с лимитом SQLite >= 3.32 дробления нет, и число запросов не должно зависеть от выбора
+        patcher = mock.patch.object(connection.features, 'max_query_params', 32766)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_bulk_comment(self, count, senders, prefix):
+        """Массовый комментарий по count новым сообщениям от senders новых отправителей; число запросов"""
+        msgs = TelegramMessage.objects.bulk_create(
+            TelegramMessage(
+                chat_id='-100', message_id=f'{prefix}{index}', text=f'сообщение {index}',
+                from_user_id=f'{prefix}{index % senders}', from_username=f'user{index % senders}', message_date=timezone.now(),
+            )
+            for index in range(count)
+        )
+        data = {'action': 'bulk_comment', 'ticket_id': str(self.ticket.id), 'selected': [str(msg.id) for msg in msgs]}
+        data.update({f'is_internal_{msg.id}': 'on' for msg in msgs[::2]})
+        caches.author_cache.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('tickets:stream'), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_selection(self):
+        few = self.post_bulk_comment(2, senders=2, prefix='1')
+        self.assertEqual(self.post_bulk_comment(500, senders=500, prefix='2'), few)
+
+        comments = self.ticket.comments.filter(telegram_message_id__startswith='2')
+        self.assertEqual(comments.count(), 500)
+        self.assertEqual(comments.filter(is_internal=True).count(), 250)
+        self.assertEqual(comments.filter(author_client__name='Неизвестный клиент (user7)').count(), 1)
+        self.assertEqual(
+            TelegramMessage.objects.filter(linked_ticket=self.ticket, linked_action='add_comment').count(), 502,
+        )
+        self.assertEqual(TelegramMessageLink.objects.filter(ticket=self.ticket).count(), 502)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.ticket = make_ticket()
+        self.moment = timezone.now() - timedelta(days=30)
+
+    def add_messages(self, count, linked=(), same_date=False):
+        """count сообщений подряд по времени; номера из linked связаны с обращением"""
+        msgs = []
+        for number in range(count):
+            msgs.append(TelegramMessage.objects.create(
+                chat_id='-100', message_id=str(number), text=f'сообщение номер {number}',
+                message_date=self.moment if same_date else self.moment + timedelta(minutes=number),
+                linked_ticket=self.ticket if number in linked else None,
+            ))
+        return msgs
+
+    def indexed(self, msgs):
+        """id сообщений, которые есть в поисковом индексе"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM tickets_search WHERE rowid IN (%s)' % ', '.join(['%s'] * len(msgs)),
+                [search._rowid(search.KIND_MESSAGE, msg.pk) for msg in msgs],
+            )
+            rowids = {row[0] for row in cursor.fetchall()}
+        return {msg.pk for msg in msgs if search._rowid(search.KIND_MESSAGE, msg.pk) in rowids}
+
+    def test_keyset_walk_passes_kept_linked_messages(self):
+        # Первые пачки целиком из связанных сообщений; одинаковое время — порядок по id
+        for same_date in (False, True):
+            with self.subTest(same_date=same_date):
+                TelegramMessage.objects.all().delete()
+                msgs = self.add_messages(9, linked={0, 1, 2, 3, 6}, same_date=same_date)
+                progress = []
+                deleted = retention.purge(
+                    retention.messages_in_period(), chunk_size=2, pause=0, progress=progress.append,
+                )
+                self.assertEqual(deleted, 4)
+                self.assertEqual(progress, [2, 3, 4])
+                self.assertEqual(
+                    set(TelegramMessage.objects.values_list('pk', flat=True)), {msgs[n].pk for n in (0, 1, 2, 3, 6)},
+                )
+
+    def test_keep_linked_false_deletes_everything_in_period(self):
+        msgs = self.add_messages(5, linked={1, 3})
+        outside = TelegramMessage.objects.create(chat_id='-100', message_id='99', text='позже', message_date=timezone.now())
+        period = retention.messages_in_period(self.moment, self.moment + timedelta(days=1))
+        self.assertEqual(retention.count(period), 3)
+        self.assertEqual(retention.count(period, keep_linked=False), 5)
+        self.assertEqual(retention.purge(period, keep_linked=False, chunk_size=2, pause=0), 5)
+        self.assertEqual(list(TelegramMessage.objects.values_list('pk', flat=True)), [outside.pk])
+        self.assertEqual(self.indexed(msgs), set())
+
+    def test_archive_and_search_index(self):
+        msgs = self.add_messages(4, linked={2})
+        self.assertEqual(self.indexed(msgs), {msg.pk for msg in msgs})
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'stream.jsonl.gz'
+            with retention.ArchiveWriter(path) as archive:
+                self.assertEqual(retention.purge(retention.messages_in_period(), chunk_size=3, pause=0, archive=archive), 3)
+            with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+                rows = [json.loads(line) for line in fileobj]
+        self.assertEqual(archive.rows, 3)
+        self.assertEqual([row['id'] for row in rows], [msgs[n].pk for n in (0, 1, 3)])
+        self.assertEqual(set(rows[0]), set(retention.ARCHIVE_FIELDS))
+        self.assertEqual(rows[0]['text'], 'сообщение номер 0')
+        self.assertEqual(self.indexed(msgs), {msgs[2].pk})
+
+    def test_purge_some_is_bounded(self):
+        self.add_messages(7)
+        self.assertEqual(retention.purge_some(retention.messages_in_period(), max_chunks=2, chunk_size=2), (4, True))
+        self.assertEqual(retention.purge_some(retention.messages_in_period(), max_chunks=2, chunk_size=2), (3, False))
+        self.assertFalse(TelegramMessage.objects.exists())
+
+    def test_cleanup_period_view_points_to_command(self):
+        bound = retention.REQUEST_MAX_CHUNKS * retention.CHUNK_SIZE
+        TelegramMessage.objects.bulk_create(
+            TelegramMessage(chat_id='-100', message_id=str(number), text='старое', message_date=self.moment)
+            for number in range(bound + 3)
+        )
+        self.client.force_login(User.objects.create(username='operator', is_staff=True))
+        day = timezone.localdate(self.moment).isoformat()
+        data = {'action': 'cleanup_period', 'date_from': day, 'date_to': day, 'include_processed': 'on'}
+        response = self.client.post(reverse('tickets:stream'), data, follow=True)
+        texts = [str(message) for message in response.context['messages']]
+        self.assertIn(f'Удалено записей из потока: {bound}', texts)
+        self.assertTrue(any(f'cleanup_stream --date-from {day} --date-to {day} --include-linked' in text for text in texts))
+        self.assertEqual(TelegramMessage.objects.count(), 3)
+
+        response = self.client.post(reverse('tickets:stream'), data, follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']], ['Удалено записей из потока: 3'])
+        self.assertFalse(TelegramMessage.objects.exists())
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TELEGRAM_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = Path(directory.name)
+        archive.segment_cache.invalidate()
+        self.addCleanup(archive.segment_cache.invalidate)
+        self.moment = timezone.now() - timedelta(days=200)
+
+    def add_message(self, message_id, text, chat_id='-100', days=0):
+        return TelegramMessage.objects.create(
+            chat_id=chat_id, message_id=message_id, text=text, from_username='anna',
+            message_date=self.moment + timedelta(days=days),
+        )
+
+    def move(self, writer):
+        return retention.purge(retention.messages_in_period(), keep_linked=False, pause=0, archive=writer)
+
+    def test_round_trip(self):
+        first = self.add_message('1', 'первое')
+        self.add_message('2', 'второе', days=1)
+        self.add_message('1', 'в другом чате', chat_id='-200')
+        with archive.SegmentWriter() as writer:
+            self.assertEqual(self.move(writer), 3)
+        self.assertEqual(len(writer.segments), 2)
+        self.assertFalse(TelegramMessage.objects.exists())
+        self.assertEqual(ArchivedTelegramMessage.objects.count(), 3)
+
+        found = archive.find_messages(['1', '2', '3'], chat_id='-100')
+        self.assertEqual([(msg.message_id, msg.text) for msg in found], [('1', 'первое'), ('2', 'второе')])
+        self.assertEqual(found[0].id, first.id)
+        self.assertEqual(found[0].message_date, first.message_date)
+        self.assertEqual(len(archive.find_messages(['1'])), 2)
+
+    def test_rearchived_message_points_to_new_segment(self):
+        self.add_message('1', 'старая версия')
+        with archive.SegmentWriter() as writer:
+            self.move(writer)
+        self.add_message('1', 'новая версия')
+        with archive.SegmentWriter() as writer:
+            writer.stamp = 'next'
+            self.move(writer)
+
+        entry = ArchivedTelegramMessage.objects.get()
+        self.assertEqual(entry.segment, writer.segments[0])
+        archive.segment_cache.invalidate()
+        self.assertEqual([msg.text for msg in archive.find_messages(['1'])], ['новая версия'])
+
+    def test_partially_written_segment(self):
+        self.add_message('1', 'уже на диске')
+        self.add_message('2', 'следом', days=0)
+        with archive.SegmentWriter() as writer:
+            self.move(writer)
+            # Сегмент ещё открыт на запись: gzip без конца потока читается до сброшенных строк
+            self.assertEqual([msg.text for msg in archive.find_messages(['1', '2'])], ['уже на диске', 'следом'])
+
+    def test_missing_segment(self):
+        self.add_message('1', 'потерянное')
+        with archive.SegmentWriter() as writer:
+            self.move(writer)
+        (self.root / writer.segments[0]).unlink()
+        with self.assertLogs('tickets.archive', 'ERROR'):
+            self.assertEqual(archive.find_messages(['1']), [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        moment = timezone.now()
+        # По три сообщения на одну и ту же секунду — курсор должен различать их по id
+        for index in range(12):
+            TelegramMessage.objects.create(
+                chat_id='-100', message_id=str(index), text=f'сообщение {index}',
+                message_date=moment - timedelta(seconds=index // 3),
+            )
+
+    def test_cursor_queries_seek_the_message_date_index(self):
+        key = (timezone.now(), 10**6)
+        older = query_plan(pagination.older_than(TelegramMessage.objects.all(), key))
+        newer = query_plan(pagination.newer_than(TelegramMessage.objects.all(), key))
+
+        self.assertIn('SEARCH', older)
+        self.assertIn('(message_date<?)', older)
+        self.assertIn('SEARCH', newer)
+        self.assertIn('(message_date>?)', newer)
+        self.assertNotIn('SCAN', older + newer)
+
+    def test_pages_walk_the_whole_stream(self):
+        qs = TelegramMessage.objects.all()
+        expected = list(qs.order_by('-message_date', '-id').values_list('id', flat=True))
+
+        seen = []
+        page = pagination.first_page(qs, 5)
+        while True:
+            seen.extend(msg.id for msg in page)
+            if not page.has_next():
+                break
+            page = pagination.page_after(qs, page.next_cursor, 5)
+        self.assertEqual(seen, expected)
+
+        back = pagination.page_before(qs, page.previous_cursor, 5)
+        self.assertEqual([msg.id for msg in back], expected[5:10])
+        around = pagination.page_around(qs, expected[6], 4)
+        self.assertEqual([msg.id for msg in around], expected[4:8])
+
+
+class SearchTests(TestCase):
+    def test_query_finds_other_word_forms_ignoring_stopwords(self):
+        ticket = make_ticket(title='Проблема доставки')
+        make_ticket(title='Счёт на оплату')
+
+        self.assertEqual(search.match_expression('проблемы с доставкой'), '"проблем"* "доставк"*')
+        found = search.filter_tickets(Ticket.objects.all(), 'проблемы с доставкой')
+        self.assertEqual(list(found), [ticket])
+
+    def test_comment_text_finds_ticket(self):
+        ticket = make_ticket(title='Заказ 15')
+        TicketComment.objects.create(ticket=ticket, content='Курьер опоздал на два дня')
+
+        self.assertEqual(list(search.filter_tickets(Ticket.objects.all(), 'опоздал у курьера')), [ticket])
+
+
+class RollupTests(TestCase):
+    def daily(self):
+        return sorted(TicketDailyStat.objects.values_list('status__name', 'organization__name', 'count'))
+
+    def tags(self):
+        return sorted(TicketTagDailyStat.objects.values_list('tag', 'count'))
+
+    def test_counters_follow_ticket_changes(self):
+        first = make_ticket(tags='срочно, доставка')
+        make_ticket(tags='доставка')
+        self.assertEqual(self.daily(), [('Новое', None, 2)])
+        self.assertEqual(self.tags(), [('доставка', 2), ('срочно', 1)])
+
+        first.status = TicketStatus.objects.create(name='Закрыто')
+        first.organization = Organization.objects.create(name='ООО Ромашка')
+        first.tags = 'доставка'
+        first.save()
+        self.assertEqual(self.daily(), [('Закрыто', 'ООО Ромашка', 1), ('Новое', None, 1)])
+        self.assertEqual(self.tags(), [('доставка', 1), ('доставка', 1)])
+
+        first.delete()
+        self.assertEqual(self.daily(), [('Новое', None, 1)])
+        self.assertEqual(self.tags(), [('доставка', 1)])
+
+    def test_row_created_concurrently_is_incremented(self):
+        ticket = make_ticket()
+        TicketDailyStat.objects.all().delete()
+        key = {'day': timezone.localdate(ticket.created_at), 'category_id': ticket.category_id,
+               'organization_id': None, 'status_id': ticket.status_id, 'assigned_to_id': None}
+        get_or_create = TicketDailyStat.objects.get_or_create
+
+        def racing_get_or_create(**kwargs):
+            # Другая транзакция успела создать строку между UPDATE (0 строк) и INSERT
+            TicketDailyStat.objects.create(count=1, **key)
+            return get_or_create(**kwargs)
+
+        with mock.patch.object(TicketDailyStat.objects, 'get_or_create', side_effect=racing_get_or_create):
+            rollups._bump(TicketDailyStat, key, 1)
+        self.assertEqual(list(TicketDailyStat.objects.values_list('count', flat=True)), [2])
+
+    def test_key_is_unique_with_empty_organization(self):
+        ticket = make_ticket()
+        row = TicketDailyStat.objects.get()
+        self.assertIsNone(row.organization_id)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TicketDailyStat.objects.create(
+                day=row.day, category=ticket.category, status=ticket.status, organization=None, count=1,
+            )
+
+    def test_refresh_days_matches_incremental_counters(self):
+        make_ticket(tags='доставка')
+        make_ticket(tags='доставка, возврат')
+        expected = (self.daily(), self.tags())
+        TicketDailyStat.objects.update(count=100)
+        TicketTagDailyStat.objects.all().delete()
+
+        rollups.refresh_days([timezone.localdate()])
+        self.assertEqual((self.daily(), self.tags()), expected)
+
+
+class TaggingTests(TestCase):
+    def tag_names(self, ticket):
+        return sorted(TicketTag.objects.filter(ticket=ticket).values_list('tag__name', flat=True))
+
+    def test_links_follow_tags_field(self):
+        ticket = make_ticket(tags=' доставка, срочно,,доставка ')
+        self.assertEqual(self.tag_names(ticket), ['доставка', 'срочно'])
+
+        ticket.tags = 'возврат, срочно'
+        ticket.save()
+        self.assertEqual(self.tag_names(ticket), ['возврат', 'срочно'])
+        # Справочник тегов не чистится: тег «доставка» остаётся без связей
+        self.assertTrue(Tag.objects.filter(name='доставка').exists())
+
+        ticket.tags = ''
+        ticket.save()
+        self.assertEqual(self.tag_names(ticket), [])
+
+    def test_save_without_tags_field_keeps_links(self):
+        ticket = make_ticket(tags='доставка')
+        Ticket.objects.filter(pk=ticket.pk).update(tags='возврат')
+        ticket.title = 'Новый заголовок'
+        ticket.save(update_fields=['title'])
+        self.assertEqual(self.tag_names(ticket), ['доставка'])
+
+    def test_long_tag_is_truncated_to_field_length(self):
+        ticket = make_ticket(tags='я' * 150)
+        self.assertEqual(self.tag_names(ticket), ['я' * tagging.TAG_LENGTH])
+
+    def test_top_tags_counts_tickets(self):
+        make_ticket(tags='доставка, срочно')
+        make_ticket(tags='доставка')
+        other = make_ticket(tags='возврат', title='Другое')
+
+        self.assertEqual(
+            tagging.top_tags(Ticket.objects.all()),
+            [{'name': 'доставка', 'count': 2}, {'name': 'возврат', 'count': 1}, {'name': 'срочно', 'count': 1}],
+        )
+        self.assertEqual(tagging.top_tags(Ticket.objects.exclude(pk=other.pk), limit=1), [{'name': 'доставка', 'count': 2}])
+
+
+class RecordingStream(io.BytesIO):
+    """Поток, запоминающий размер каждой записи и сколько строк было прочитано к этому моменту"""
+
+    def __init__(self, consumed):
+        super().__init__()
+        self.consumed = consumed
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append((len(data), len(self.consumed)))
+        return super().write(data)
+
+
+class XlsxExportTests(TestCase):
+    def test_export_opens_in_openpyxl(self):
+        organization = Organization.objects.create(name='ООО Ромашка')
+        ticket = make_ticket(title='Сбой\x0bоплаты', tags='оплата', organization=organization)
+        make_ticket(title='Вопрос')
+
+        fileobj = io.BytesIO()
+        count = exports.write_export(fileobj, 'xlsx', {'date_from': timezone.localdate().isoformat()})
+        self.assertEqual(count, 2)
+
+        workbook = load_workbook(fileobj, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Обращения', 'По дням'])
+        rows = list(workbook['Обращения'].iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), exports.ticket_headers())
+        self.assertEqual(len(rows), 3)
+        first = dict(zip(exports.ticket_column_names(), rows[2]))
+        self.assertEqual(first['id'], ticket.id)
+        self.assertEqual(first['title'], 'Сбойоплаты')
+        self.assertEqual(first['organization'], 'ООО Ромашка')
+        self.assertEqual(first['created_at'], exports.format_datetime(ticket.created_at))
+        self.assertIsNone(first['resolved_at'])
+        self.assertEqual(
+            list(workbook['По дням'].iter_rows(values_only=True)),
+            [('День', 'Обращений'), (timezone.localdate().strftime('%d.%m.%Y'), 2)],
+        )
+
+    def test_sheet_is_written_in_batches_from_a_generator(self):
+        total = exports.WRITE_BATCH_ROWS * 3
+        consumed = []
+
+        def rows():
+            for number in range(total):
+                consumed.append(number)
+                yield [number, f'строка {number}']
+
+        stream = RecordingStream(consumed)
+        self.assertEqual(exports.write_sheet(stream, ['N', 'Текст'], rows()), total)
+        # Строки пишутся кусками по мере чтения, а не после чтения всех строк
+        rows_read_at_write = [read for _, read in stream.writes]
+        self.assertGreaterEqual(len(stream.writes), 4)
+        self.assertLess(rows_read_at_write[1], total)
+        self.assertLessEqual(max(size for size, _ in stream.writes), len(stream.getvalue()) / 2)
+
+        fileobj = io.BytesIO()
+        exports.write_xlsx(fileobj, [('Лист', ['N', 'Текст'], ([number, f'строка {number}'] for number in range(total)))])
+        sheet = load_workbook(fileobj, read_only=True)['Лист']
+        rows_read = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows_read), total + 1)
+        self.assertEqual(rows_read[-1], (total - 1, f'строка {total - 1}'))
+
+    def test_column_letters(self):
+        self.assertEqual([exports.column_letter(n) for n in (1, 26, 27, 52, 703)], ['A', 'Z', 'AA', 'AZ', 'AAA'])
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = Path(media.name)
+
+    def test_claim_takes_pending_jobs_once(self):
+        first = export_jobs.enqueue(self.user, 'csv', {})
+        second = export_jobs.enqueue(self.user, 'неизвестный', {})
+        self.assertEqual(second.format, 'xlsx')
+
+        self.assertEqual(export_jobs.claim(1), [first.id])
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'running')
+        self.assertTrue(first.locked_by)
+        self.assertEqual(export_jobs.claim(10), [second.id])
+        self.assertEqual(export_jobs.claim(10), [])
+
+    def test_claim_requeues_stale_running_jobs(self):
+        stale = export_jobs.enqueue(self.user, 'csv', {})
+        alive = export_jobs.enqueue(self.user, 'csv', {})
+        export_jobs.claim(10)
+        ExportJob.objects.filter(pk=stale.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=601), progress=40, row_count=400,
+        )
+        old_token = ExportJob.objects.get(pk=stale.pk).locked_by
+
+        self.assertEqual(export_jobs.claim(10, lease_seconds=600), [stale.id])
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.progress, stale.row_count), ('running', 0, 0))
+        self.assertNotEqual(stale.locked_by, old_token)
+        self.assertEqual(ExportJob.objects.get(pk=alive.pk).status, 'running')
+
+    def test_run_writes_artifact(self):
+        make_ticket()
+        job = export_jobs.enqueue(self.user, 'csv', {})
+        export_jobs.claim(1)
+
+        self.assertEqual(export_jobs.run(job.id), 'done')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.row_count, job.locked_by), ('done', 100, 1, ''))
+        self.assertTrue((self.media / job.file.name).exists())
+        self.assertEqual(list(self.media.glob('exports/*.part')), [])
+
+    def test_run_marks_failure_and_removes_partial_file(self):
+        job = export_jobs.enqueue(self.user, 'csv', {})
+        export_jobs.claim(1)
+        with mock.patch.object(exports, 'write_export', side_effect=OSError('диск заполнен')), self.assertLogs('tickets.export_jobs', 'ERROR'):
+            self.assertEqual(export_jobs.run(job.id), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.locked_by), ('failed', 'OSError: диск заполнен', ''))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(list(self.media.glob('exports/*')), [])
+
+        # Пул export_worker отмечает сбой только у выполняющегося задания
+        export_jobs.mark_failed(job.id, 'BrokenProcessPool')
+        self.assertEqual(ExportJob.objects.get(pk=job.pk).error, 'OSError: диск заполнен')
+        running = export_jobs.enqueue(self.user, 'csv', {})
+        export_jobs.claim(1)
+        export_jobs.mark_failed(running.id, 'BrokenProcessPool')
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.error), ('failed', 'BrokenProcessPool'))
+
+    def test_status_and_download_are_visible_to_author_and_staff_only(self):
+        job = export_jobs.enqueue(self.user, 'csv', {})
+        export_jobs.claim(1)
+        export_jobs.run(job.id)
+        status_url = reverse('tickets:export_job_status', args=[job.id])
+        download_url = reverse('tickets:export_job_download', args=[job.id])
+
+        self.client.force_login(User.objects.create_user('other'))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(status_url).status_code, 404)
+            self.assertEqual(self.client.get(download_url).status_code, 404)
+
+        self.client.force_login(self.user)
+        state = self.client.get(status_url).json()
+        self.assertEqual((state['status'], state['download_url']), ('done', download_url))
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'analytics_export_{job.id}_', response['Content-Disposition'])
+        response.close()
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class DateRangePlanTests(TestCase):
+    def test_filter_dates_searches_created_at_index(self):
+        plan = query_plan(date_ranges.filter_dates(Ticket.objects.all(), 'created_at', '2026-01-01', '2026-01-31'))
+        self.assertIn('SEARCH tickets_ticket USING INDEX tickets_tic_created_5dd600_idx (created_at>? AND created_at<?)', plan)
+        self.assertNotIn('SCAN', plan)
+
+        # Для сравнения: __date оборачивает колонку в функцию, и индекс не используется
+        legacy = query_plan(Ticket.objects.filter(created_at__date__gte='2026-01-01', created_at__date__lte='2026-01-31'))
+        self.assertIn('SCAN', legacy)
+
+    def test_filter_dates_searches_message_date_index(self):
+        plan = query_plan(date_ranges.filter_dates(TelegramMessage.objects.all(), 'message_date', '2026-01-01', None))
+        self.assertIn('SEARCH tickets_telegrammessage USING INDEX', plan)
+        self.assertIn('(message_date>?)', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_days_q_searches_created_at_index_per_span(self):
+        days = ['2026-01-01', '2026-01-02', '2026-01-03', '2026-02-10']
+        condition = date_ranges.days_q('created_at', days)
+        # Подряд идущие дни — один интервал
+        self.assertEqual(len(condition.children), 2)
+
+        plan = query_plan(Ticket.objects.filter(condition))
+        self.assertIn('MULTI-INDEX OR', plan)
+        self.assertEqual(plan.count('USING INDEX tickets_tic_created_5dd600_idx (created_at>? AND created_at<?)'), 2)
+        self.assertNotIn('SCAN', plan)
+
+    def test_days_q_bounds_are_local_day_starts(self):
+        condition = date_ranges.days_q('created_at', ['2026-03-05'])
+        start, end = date_ranges.day_range('2026-03-05', '2026-03-05')
+        self.assertEqual(condition, Q(created_at__gte=start, created_at__lt=end))
+        self.assertEqual(timezone.localtime(start).hour, 0)
+        self.assertEqual(end - start, timedelta(days=1))
+
+
+class SlaTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Возвраты', sla_hours=8)
+        self.final = TicketStatus.objects.create(name='Закрыто', is_final=True)
+
+    def test_deadline_on_create(self):
+        ticket = make_ticket(category=self.category)
+        self.assertEqual(ticket.sla_deadline, ticket.created_at + timedelta(hours=8))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.sla_deadline, ticket.created_at + timedelta(hours=8))
+        self.assertFalse(ticket.status_is_final)
+
+    def test_deadline_follows_category_and_status_change(self):
+        ticket = Ticket.objects.get(pk=make_ticket().pk)
+        ticket.category = self.category
+        ticket.status = self.final
+        ticket.save(update_fields=['category', 'status'])
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.sla_deadline, ticket.created_at + timedelta(hours=8))
+        self.assertTrue(ticket.status_is_final)
+
+    def test_save_without_sla_changes_does_not_read_references(self):
+        ticket = Ticket.objects.get(pk=make_ticket(category=self.category).pk)
+        ticket.title = 'Новый заголовок'
+        with CaptureQueriesContext(connection) as queries:
+            ticket.save()
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        # SLA категории и признак статуса не перечитываются (поисковый индекс джойнит категорию — это не SLA)
+        self.assertNotIn('FROM "tickets_category"', sql)
+        self.assertNotIn('FROM "tickets_ticketstatus"', sql)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.sla_deadline, ticket.created_at + timedelta(hours=8))
+
+    def test_category_sla_change_moves_deadlines(self):
+        ticket = make_ticket(category=self.category)
+        self.category.sla_hours = 48
+        self.category.save()
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.sla_deadline, ticket.created_at + timedelta(hours=48))
+
+        # Обращение с загруженной до изменения категорией сохраняется с новым SLA из кэша справочников
+        other = make_ticket()
+        other.category_id = self.category.pk
+        other.save()
+        other.refresh_from_db()
+        self.assertEqual(other.sla_deadline, other.created_at + timedelta(hours=48))
+
+    def test_status_final_flag_cascades(self):
+        status = TicketStatus.objects.create(name='Проверка')
+        ticket = make_ticket(status=status)
+        status.is_final = True
+        status.save()
+        ticket.refresh_from_db()
+        self.assertTrue(ticket.status_is_final)
+        status.is_final = False
+        status.save()
+        ticket.refresh_from_db()
+        self.assertFalse(ticket.status_is_final)
+
+    def test_overdue_filter(self):
+        overdue = make_ticket(category=self.category)
+        closed = make_ticket(category=self.category, status=self.final)
+        fresh = make_ticket(category=self.category)
+        Ticket.objects.filter(pk__in=[overdue.pk, closed.pk]).update(created_at=timezone.now() - timedelta(hours=9))
+        Ticket.recalculate_sla()
+
+        self.assertEqual(list(Ticket.objects.filter(Ticket.overdue_filter()).values_list('pk', flat=True)), [overdue.pk])
+        later = timezone.now() + timedelta(hours=9)
+        self.assertEqual(
+            set(Ticket.objects.filter(Ticket.overdue_filter(later)).values_list('pk', flat=True)), {overdue.pk, fresh.pk}
+        )
+        plan = query_plan(Ticket.objects.filter(Ticket.overdue_filter()))
+        self.assertIn('USING INDEX tickets_tic_status__2f8824_idx (status_is_final=? AND sla_deadline<?)', plan)
+
+
+class AutocompleteTests(TestCase):
+    def names(self, query, qs=None, limit=10):
+        qs = Client.objects.all() if qs is None else qs
+        return [client.name for client in autocomplete.search('client', qs, query, limit=limit)]
+
+    def test_tokens_are_normalized_with_positions(self):
+        organization = Organization.objects.create(name='ООО Ёлка')
+        client = Client(name='Пётр Иванов', phone='+7 (916) 123', organization=organization)
+
+        self.assertEqual(autocomplete.tokens_for('client', client), {
+            'петр': 0, 'иванов': 1,
+            '7': autocomplete.EXTRA_FIELD_POSITION, '916': autocomplete.EXTRA_FIELD_POSITION + 1,
+            '123': autocomplete.EXTRA_FIELD_POSITION + 2, '7916123': autocomplete.EXTRA_FIELD_POSITION,
+            'ооо': autocomplete.RELATED_POSITION, 'елка': autocomplete.RELATED_POSITION + 1,
+        })
+
+    def test_ranking_exact_word_then_position(self):
+        Client.objects.create(name='Петровский Иван')
+        Client.objects.create(name='Иван Петров')
+        Client.objects.create(name='Петров Иван')
+        Client.objects.create(name='Сидоров', contact_person='Петров')
+
+        self.assertEqual(self.names('петров'), ['Петров Иван', 'Иван Петров', 'Сидоров', 'Петровский Иван'])
+        self.assertEqual(self.names('ив петров'), ['Петров Иван', 'Иван Петров', 'Петровский Иван'])
+        self.assertEqual(self.names('петров', limit=2), ['Петров Иван', 'Иван Петров'])
+        self.assertEqual(self.names('!!!'), [])
+
+    def test_all_words_are_matched_beyond_common_prefix(self):
+        # Больше 500 слов с тем же началом, что и самое длинное слово запроса; часть клиентов отсеивает qs
+        clients = Client.objects.bulk_create(
+            [Client(name=f'Петров{number} Сергей', is_active=number % 2 == 0) for number in range(600)]
+            + [Client(name=f'Петров{number} Иван', is_active=False) for number in range(50)]
+        )
+        autocomplete.index('client', clients)
+        Client.objects.create(name='Петровых Иван')
+
+        self.assertEqual(self.names('иван петров', Client.objects.filter(is_active=True)), ['Петровых Иван'])
+        self.assertEqual(len(self.names('петров сергей', Client.objects.filter(is_active=True), limit=400)), 300)
+
+    def test_index_follows_signals(self):
+        organization = Organization.objects.create(name='Ромашка')
+        client = Client.objects.create(name='Иванов', organization=organization)
+        self.assertEqual(self.names('ром'), ['Иванов'])
+
+        client.name = 'Смирнов'
+        client.save()
+        self.assertEqual(self.names('иван'), [])
+        self.assertEqual(self.names('смир'), ['Смирнов'])
+
+        # Переименование организации переиндексирует её клиентов
+        organization.name = 'Василёк'
+        organization.save()
+        self.assertEqual(self.names('ром'), [])
+        self.assertEqual(self.names('василек'), ['Смирнов'])
+
+        client.delete()
+        self.assertFalse(AutocompleteEntry.objects.filter(kind='client', object_id=client.pk).exists())
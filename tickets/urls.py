@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, webhook
 
 app_name = 'tickets'
 
@@ -40,6 +40,9 @@ urlpatterns = [
     # Аналитика
     path('analytics/', views.analytics, name='analytics'),
     path('analytics/export/', views.analytics_export_xlsx, name='analytics_export_xlsx'),
+    path('exports/<int:job_id>/', views.export_job_detail, name='export_job_detail'),
+    path('exports/<int:job_id>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
     # Поток Telegram
     path('stream/', views.stream, name='stream'),
     
@@ -61,4 +64,7 @@ urlpatterns = [
     path('api/tickets/unresolved/', views.get_unresolved_tickets, name='get_unresolved_tickets'),
     path('api/tickets/working/', views.get_working_tickets, name='get_working_tickets'),
     path('api/tickets/waiting/', views.get_waiting_tickets, name='get_waiting_tickets'),
+
+    # Webhook Telegram
+    path('telegram/webhook/', webhook.telegram_webhook, name='telegram_webhook'),
 ]
@@ -3,19 +3,24 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Q, Count
 from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.http import urlencode
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-from .models import Ticket, Category, Client, Organization, TicketStatus, TicketComment, TicketTemplate, TicketAudit, TicketAttachment, TelegramMessage, TelegramRoute, TelegramGroup
+import os
+from .models import ExportJob, Ticket, Category, Client, Organization, TicketStatus, TicketComment, TicketTemplate, TicketAudit, TicketAttachment, TelegramMessage, TelegramRoute, TelegramGroup, TelegramMessageLink
 from .forms import TicketForm, TicketCommentForm, ClientForm, TicketAttachmentForm, OrganizationForm
+from . import archive, autocomplete, caches, date_ranges, export_jobs, exports, outbox, retention, rollups, search, tagging
+from .authors import message_senders, resolve_authors, resolve_message_author
+from .pagination import get_keyset_page
 
 
 def build_stream_url_with_params(request, message_id=None, **extra_params):
@@ -60,7 +65,9 @@ def build_stream_url_with_params(request, message_id=None, **extra_params):
             'date_from': request.POST.get('preserve_date_from'),
             'date_to': request.POST.get('preserve_date_to'),
             'per_page': request.POST.get('preserve_per_page'),
-            'page': request.POST.get('preserve_page'),
+            'after': request.POST.get('preserve_after'),
+            'before': request.POST.get('preserve_before'),
+            'anchor': request.POST.get('preserve_anchor'),
         }
         
         # Добавляем только непустые параметры
@@ -78,68 +85,19 @@ def build_stream_url_with_params(request, message_id=None, **extra_params):
     # Добавляем дополнительные параметры
     params.update(extra_params)
     
-    # Если указан message_id, пытаемся найти страницу с этим сообщением
-    if message_id and 'page' not in extra_params:
-        print(f"Looking for page with message_id={message_id}")
-        logger.info(f"Looking for page with message_id={message_id} (type: {type(message_id)})")
-        per_page = int(params.get('per_page', 25))
-        print(f"Per page: {per_page}")
-        logger.info(f"Per page: {per_page}")
-        
-        # Получаем текущий queryset с теми же фильтрами
-        qs = TelegramMessage.objects.select_related('linked_ticket').order_by('-message_date', '-id')
-        
-        # Применяем те же фильтры
-        group_id = request.GET.get('group_id') or request.GET.get('group')
-        q = request.GET.get('q')
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        
-        print(f"Applying filters: group_id={group_id}, q={q}, date_from={date_from}, date_to={date_to}")
-        logger.info(f"Applying filters: group_id={group_id}, q={q}, date_from={date_from}, date_to={date_to}")
-        
-        if group_id and group_id not in (None, '', 'None', 'null', 'NULL'):
-            qs = qs.filter(chat_id=group_id)
-        if q:
-            qs = qs.filter(Q(text__icontains=q) | Q(from_username__icontains=q) | Q(from_fullname__icontains=q))
-        
-        if date_from:
-            try:
-                from datetime import datetime
-                date_from_dt = datetime.strptime(date_from, '%Y-%m-%d')
-                qs = qs.filter(message_date__date__gte=date_from_dt.date())
-                print(f"Applied date_from filter: {date_from_dt.date()}")
-                logger.info(f"Applied date_from filter: {date_from_dt.date()}")
-            except ValueError as e:
-                print(f"Error parsing date_from {date_from}: {e}")
-                logger.error(f"Error parsing date_from {date_from}: {e}")
-        
-        if date_to:
-            try:
-                from datetime import datetime
-                date_to_dt = datetime.strptime(date_to, '%Y-%m-%d')
-                qs = qs.filter(message_date__date__lte=date_to_dt.date())
-                print(f"Applied date_to filter: {date_to_dt.date()}")
-                logger.info(f"Applied date_to filter: {date_to_dt.date()}")
-            except ValueError as e:
-                print(f"Error parsing date_to {date_to}: {e}")
-                logger.error(f"Error parsing date_to {date_to}: {e}")
-        
-        print(f"Filtered queryset count: {qs.count()}")
-        logger.info(f"Filtered queryset count: {qs.count()}")
-        
-        # Находим страницу с сообщением
-        target_page = find_message_page_in_stream(message_id, qs, per_page)
-        print(f"Target page found: {target_page}")
-        logger.info(f"Target page found: {target_page}")
-        params['page'] = target_page
-    elif 'page' not in extra_params:
-        # Если не указана страница в extra_params, сохраняем текущую
-        current_page = request.GET.get('page')
-        if current_page:
-            params['page'] = current_page
-            print(f"Preserving current page: {current_page}")
-            logger.info(f"Preserving current page: {current_page}")
+    # Если указан message_id, открываем страницу вокруг этого сообщения
+    if message_id:
+        for cursor_param in ('after', 'before'):
+            params.pop(cursor_param, None)
+        params['anchor'] = message_id
+        logger.info(f"Anchoring stream page on message_id={message_id}")
+    elif not {'after', 'before', 'anchor'} & set(params):
+        # Сохраняем текущую страницу
+        for cursor_param in ('after', 'before', 'anchor'):
+            value = request.GET.get(cursor_param)
+            if value:
+                params[cursor_param] = value
+                logger.info(f"Preserving current page: {cursor_param}={value}")
     
     print(f"Final params: {params}")
     logger.info(f"Final params: {params}")
@@ -174,48 +132,14 @@ def build_stream_url_with_params(request, message_id=None, **extra_params):
 
 
 def get_stream_page_with_filters(request, qs, per_page=25):
-    """Получает страницу с учетом фильтров и корректной обработкой пагинации"""
-    paginator = Paginator(qs, per_page)
-    page_number = request.GET.get('page')
-    
-    try:
-        page_obj = paginator.get_page(page_number)
-    except Exception:
-        # Если страница не существует, возвращаем первую страницу
-        page_obj = paginator.get_page(1)
-    
-    return page_obj
-
-
-def find_message_page_in_stream(message_id, qs, per_page=25):
-    """Находит страницу, на которой находится сообщение с указанным ID"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    try:
-        logger.info(f"find_message_page_in_stream called with message_id={message_id} (type: {type(message_id)}), per_page={per_page}")
-        
-        # Получаем позицию сообщения в отсортированном queryset
-        message_ids = list(qs.values_list('id', flat=True))
-        logger.info(f"Total messages in queryset: {len(message_ids)}")
-        logger.info(f"First 10 message IDs: {message_ids[:10]}")
-        
-        # Преобразуем message_id в int для сравнения
-        message_id_int = int(message_id)
-        
-        if message_id_int in message_ids:
-            position = message_ids.index(message_id_int)
-            page_number = (position // per_page) + 1
-            logger.info(f"Message {message_id_int} found at position {position}, page {page_number}")
-            return page_number
-        else:
-            logger.warning(f"Message {message_id_int} not found in queryset")
-            logger.info(f"Available message IDs: {message_ids}")
-    except Exception as e:
-        logger.error(f"Error in find_message_page_in_stream: {e}")
-    
-    logger.info("Returning page 1 as fallback")
-    return 1
+    """Получает страницу потока по курсору (after/before) или вокруг сообщения (anchor)"""
+    return get_keyset_page(
+        qs,
+        per_page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        anchor=request.GET.get('anchor'),
+    )
 
 
 @login_required
@@ -223,12 +147,10 @@ def dashboard(request):
     """Главная страница с дашбордом"""
     # Статистика
     total_tickets = Ticket.objects.count()
-    open_tickets = Ticket.objects.filter(status__is_final=False).count()
-    my_tickets = Ticket.objects.filter(assigned_to=request.user, status__is_final=False).count()
-    overdue_tickets = Ticket.objects.filter(
-        status__is_final=False,
-        created_at__lt=timezone.now() - timezone.timedelta(hours=24)
-    ).count()
+    open_tickets = Ticket.objects.filter(status_is_final__in=[False]).count()
+    my_tickets = Ticket.objects.filter(assigned_to=request.user, status_is_final__in=[False]).count()
+    # Просрочка с учетом SLA категории — диапазон по индексу (status_is_final, sla_deadline)
+    overdue_tickets = Ticket.objects.filter(Ticket.overdue_filter()).count()
     
     # Последние обращения
     recent_tickets = Ticket.objects.select_related(
@@ -298,12 +220,7 @@ def ticket_list(request):
             pass
     
     if search_query:
-        tickets = tickets.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(client__name__icontains=search_query) |
-            Q(tags__icontains=search_query)
-        )
+        tickets = search.filter_tickets(tickets, search_query)
     
     # Пагинация
     paginator = Paginator(tickets, 25)
@@ -311,7 +228,7 @@ def ticket_list(request):
     page_obj = paginator.get_page(page_number)
     
     # Данные для фильтров (категории больше не нужны для select)
-    statuses = TicketStatus.objects.exclude(name='Закрыто').order_by('order')
+    statuses = [status for status in caches.get_statuses() if status.name != 'Закрыто']
     
     context = {
         'page_obj': page_obj,
@@ -329,6 +246,62 @@ def ticket_list(request):
     return render(request, 'tickets/ticket_list.html', context)
 
 
+def enrich_comments(comments, chat_id, user):
+    """Добавляет к комментариям сведения из потока Telegram: цитату исходного сообщения и признак отправки ботом.
+
+    Сообщения комментариев и исходные сообщения ответов загружаются двумя запросами IN
+    (в чате обращения), независимо от числа комментариев; не найденные в потоке ищутся
+    в архиве (archive_stream).
+    """
+    comments = list(comments)
+    message_ids = {comment.telegram_message_id for comment in comments if comment.telegram_message_id}
+
+    def messages_by_id(ids):
+        # При нескольких сообщениях с одним ID берём последнее (порядок модели)
+        result = {}
+        if ids:
+            for msg in TelegramMessage.objects.filter(chat_id=chat_id, message_id__in=ids).only(
+                'message_id', 'reply_to_message_id', 'from_user_id', 'from_username', 'from_fullname', 'text',
+                'message_date',
+            ):
+                result.setdefault(msg.message_id, msg)
+            missing = set(ids) - set(result)
+            if missing:
+                for msg in archive.find_messages(missing, chat_id=chat_id):
+                    result[msg.message_id] = msg
+        return result
+
+    telegram_messages = messages_by_id(message_ids)
+    originals = messages_by_id({msg.reply_to_message_id for msg in telegram_messages.values() if msg.reply_to_message_id})
+
+    enriched_comments = []
+    for comment in comments:
+        comment_data = {
+            'comment': comment,
+            'is_reply': False,
+            'reply_info': None,
+            'from_bot': False
+        }
+        telegram_msg = telegram_messages.get(comment.telegram_message_id) if comment.telegram_message_id else None
+
+        if telegram_msg and telegram_msg.reply_to_message_id:
+            # Исходное сообщение для отображения цитаты
+            original_msg = originals.get(telegram_msg.reply_to_message_id)
+            if original_msg:
+                comment_data['is_reply'] = True
+                comment_data['reply_info'] = {
+                    'original_text': original_msg.text,
+                    'original_author': original_msg.from_fullname or original_msg.from_username or 'Неизвестный'
+                }
+
+        # Комментарий отправлен ботом от имени текущего пользователя системы
+        if comment.author_type == 'user' and comment.author_id and telegram_msg:
+            comment_data['from_bot'] = telegram_msg.from_user_id == str(user.id)
+
+        enriched_comments.append(comment_data)
+    return enriched_comments
+
+
 @login_required
 def ticket_detail(request, ticket_id):
     """Детальная страница обращения"""
@@ -379,61 +352,29 @@ def ticket_detail(request, ticket_id):
                 if reply_in_chat and ticket.telegram_chat_id and ticket.external_message_id:
                     try:
                         import logging
-                        import asyncio
-                        from telegram.ext import Application
-                        from django.conf import settings
                         
                         logger = logging.getLogger(__name__)
                         logger.info(f"Attempting to send Telegram comment from ticket detail: chat_id={ticket.telegram_chat_id}, message_id={ticket.external_message_id}")
                         
-                        bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                        if bot_token:
-                            # Создаем асинхронную функцию для отправки комментария
-                            async def send_telegram_comment():
-                                application = Application.builder().token(bot_token).build()
-                                result = await application.bot.send_message(
-                                    chat_id=ticket.telegram_chat_id,
-                                    text=comment.content,
-                                    reply_to_message_id=int(ticket.external_message_id)
-                                )
-                                return result
-                            
-                            # Запускаем асинхронную функцию
-                            result = asyncio.run(send_telegram_comment())
-                            logger.info(f"Telegram comment sent successfully: {result.message_id}")
-                            
-                            # Сохраняем ID сообщения в комментарии
-                            comment.telegram_message_id = str(result.message_id)
-                            comment.save()
-                            
-                            # Добавляем отправленное сообщение в поток
-                            try:
-                                TelegramMessage.objects.create(
-                                    message_id=str(result.message_id),
-                                    chat_id=str(ticket.telegram_chat_id),
-                                    chat_title=ticket.telegram_chat_title or '',
-                                    from_user_id=str(request.user.id),
-                                    from_username=request.user.username,
-                                    from_fullname=request.user.get_full_name() or request.user.username,
-                                    text=comment.content,
-                                    message_date=timezone.now(),
-                                    created_at=timezone.now(),
-                                    linked_ticket=ticket,
-                                    linked_action='add_comment',
-                                    reply_to_message_id=str(ticket.external_message_id)
-                                )
-                                logger.info(f"Added comment message to stream: {result.message_id}")
-                            except Exception as stream_error:
-                                logger.error(f"Failed to add comment message to stream: {stream_error}", exc_info=True)
-                            
-                            messages.success(request, 'Комментарий добавлен и отправлен в Telegram')
+                        if outbox.is_configured():
+                            # ID сообщения в комментарии и запись в потоке заполнит обработчик очереди
+                            item = outbox.enqueue_send(
+                                ticket,
+                                text=comment.content,
+                                reply_to_message_id=ticket.external_message_id,
+                                linked_action='add_comment',
+                                author=request.user,
+                                comment=comment,
+                            )
+                            logger.info(f"Telegram comment queued: outbox_id={item.id}")
+                            messages.success(request, 'Комментарий добавлен и поставлен в очередь отправки в Telegram')
                         else:
                             logger.error("TELEGRAM_BOT_TOKEN not configured")
                             messages.success(request, 'Комментарий добавлен (Telegram бот не настроен)')
                     except Exception as e:
                         import logging
                         logger = logging.getLogger(__name__)
-                        logger.error(f"Failed to send Telegram comment: {e}", exc_info=True)
+                        logger.error(f"Failed to queue Telegram comment: {e}", exc_info=True)
                         messages.success(request, 'Комментарий добавлен (не удалось отправить в Telegram)')
                 else:
                     messages.success(request, 'Комментарий добавлен')
@@ -486,61 +427,28 @@ def ticket_detail(request, ticket_id):
             if send_to_telegram and original_comment.telegram_message_id and ticket.telegram_chat_id:
                 try:
                     import logging
-                    import asyncio
-                    from telegram.ext import Application
-                    from django.conf import settings
                     
                     logger = logging.getLogger(__name__)
                     logger.info(f"Attempting to send Telegram reply: chat_id={ticket.telegram_chat_id}, reply_to_message_id={original_comment.telegram_message_id}")
                     
-                    bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                    if bot_token:
-                        # Создаем асинхронную функцию для отправки ответа
-                        async def send_telegram_reply():
-                            application = Application.builder().token(bot_token).build()
-                            result = await application.bot.send_message(
-                                chat_id=ticket.telegram_chat_id,
-                                text=reply_content,
-                                reply_to_message_id=int(original_comment.telegram_message_id)
-                            )
-                            return result
-                        
-                        # Запускаем асинхронную функцию
-                        result = asyncio.run(send_telegram_reply())
-                        logger.info(f"Telegram reply sent successfully: {result.message_id}")
-                        
-                        # Сохраняем ID сообщения в комментарии
-                        reply_comment.telegram_message_id = str(result.message_id)
-                        reply_comment.save()
-                        
-                        # Добавляем отправленное сообщение в поток
-                        try:
-                            TelegramMessage.objects.create(
-                                message_id=str(result.message_id),
-                                chat_id=str(ticket.telegram_chat_id),
-                                chat_title=ticket.telegram_chat_title or '',
-                                from_user_id=str(request.user.id),
-                                from_username=request.user.username,
-                                from_fullname=request.user.get_full_name() or request.user.username,
-                                text=reply_content,
-                                message_date=timezone.now(),
-                                created_at=timezone.now(),
-                                linked_ticket=ticket,
-                                linked_action='add_comment',
-                                reply_to_message_id=str(original_comment.telegram_message_id)
-                            )
-                            logger.info(f"Added reply message to stream: {result.message_id}")
-                        except Exception as stream_error:
-                            logger.error(f"Failed to add reply message to stream: {stream_error}", exc_info=True)
-                        
-                        messages.success(request, 'Ответ добавлен и отправлен в Telegram')
+                    if outbox.is_configured():
+                        item = outbox.enqueue_send(
+                            ticket,
+                            text=reply_content,
+                            reply_to_message_id=original_comment.telegram_message_id,
+                            linked_action='add_comment',
+                            author=request.user,
+                            comment=reply_comment,
+                        )
+                        logger.info(f"Telegram reply queued: outbox_id={item.id}")
+                        messages.success(request, 'Ответ добавлен и поставлен в очередь отправки в Telegram')
                     else:
                         logger.error("TELEGRAM_BOT_TOKEN not configured")
                         messages.success(request, 'Ответ добавлен (Telegram бот не настроен)')
                 except Exception as e:
                     import logging
                     logger = logging.getLogger(__name__)
-                    logger.error(f"Failed to send Telegram reply: {e}", exc_info=True)
+                    logger.error(f"Failed to queue Telegram reply: {e}", exc_info=True)
                     messages.success(request, 'Ответ добавлен (не удалось отправить в Telegram)')
             else:
                 messages.success(request, 'Ответ добавлен')
@@ -592,51 +500,7 @@ def ticket_detail(request, ticket_id):
             can_reply_in_telegram = False
     
     # Обогащаем комментарии дополнительной информацией
-    enriched_comments = []
-    
-    for comment in comments:
-        comment_data = {
-            'comment': comment,
-            'is_reply': False,
-            'reply_info': None,
-            'from_bot': False
-        }
-        
-        if comment.telegram_message_id:
-            # Проверяем, является ли комментарий ответом
-            telegram_msg = TelegramMessage.objects.filter(
-                message_id=comment.telegram_message_id,
-                chat_id=ticket.telegram_chat_id
-            ).first()
-            
-            if telegram_msg and telegram_msg.reply_to_message_id:
-                # Ищем исходное сообщение для отображения цитаты
-                original_msg = TelegramMessage.objects.filter(
-                    message_id=telegram_msg.reply_to_message_id,
-                    chat_id=ticket.telegram_chat_id
-                ).first()
-                if original_msg:
-                    comment_data['is_reply'] = True
-                    comment_data['reply_info'] = {
-                        'original_text': original_msg.text,
-                        'original_author': original_msg.from_fullname or original_msg.from_username or 'Неизвестный'
-                    }
-            
-            # Проверяем, отправлен ли комментарий ботом (от пользователя системы)
-            from_bot = False
-            if comment.author_type == 'user' and comment.telegram_message_id and comment.author:
-                # Дополнительно проверяем, что в Telegram сообщении from_user_id соответствует текущему пользователю
-                telegram_msg = TelegramMessage.objects.filter(
-                    message_id=comment.telegram_message_id,
-                    chat_id=ticket.telegram_chat_id
-                ).first()
-                
-                if telegram_msg and telegram_msg.from_user_id == str(request.user.id):
-                    from_bot = True
-            
-            comment_data['from_bot'] = from_bot
-        
-        enriched_comments.append(comment_data)
+    enriched_comments = enrich_comments(comments, ticket.telegram_chat_id, request.user)
     
     context = {
         'ticket': ticket,
@@ -657,8 +521,8 @@ def edit_comment(request, comment_id):
     comment = get_object_or_404(TicketComment, id=comment_id)
     ticket = comment.ticket
     
-    # Проверяем, что комментарий был отправлен в Telegram
-    if not comment.telegram_message_id:
+    # Проверяем, что комментарий отправлен в Telegram или ждёт отправки в очереди
+    if not comment.telegram_message_id and not outbox.has_undelivered_send(comment):
         messages.error(request, 'Редактирование недоступно для данного комментария')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
     
@@ -703,80 +567,16 @@ def edit_comment(request, comment_id):
         if update_in_chat:
             try:
                 import logging
-                import asyncio
-                from telegram.ext import Application
-                from django.conf import settings
                 
                 logger = logging.getLogger(__name__)
                 logger.info(f"Attempting to edit Telegram comment: chat_id={ticket.telegram_chat_id}, message_id={comment.telegram_message_id}")
                 
-                bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                if bot_token:
-                    # Создаем асинхронную функцию для редактирования сообщения
-                    async def edit_telegram_comment():
-                        application = Application.builder().token(bot_token).build()
-                        try:
-                            # Пытаемся отредактировать существующее сообщение
-                            result = await application.bot.edit_message_text(
-                                chat_id=ticket.telegram_chat_id,
-                                message_id=int(comment.telegram_message_id),
-                                text=new_content
-                            )
-                            return result, 'edited'
-                        except Exception as edit_error:
-                            # Если не удалось отредактировать, отправляем новое сообщение как ответ
-                            logger.warning(f"Could not edit comment, sending new one: {edit_error}")
-                            result = await application.bot.send_message(
-                                chat_id=ticket.telegram_chat_id,
-                                text=new_content,
-                                reply_to_message_id=int(ticket.external_message_id)
-                            )
-                            return result, 'new'
-                    
-                    # Запускаем асинхронную функцию
-                    result, action_type = asyncio.run(edit_telegram_comment())
-                    logger.info(f"Telegram comment {action_type} successfully: {result.message_id}")
-                    
-                    # Обновляем сообщение в потоке
-                    try:
-                        if action_type == 'edited':
-                            # Обновляем существующее сообщение
-                            telegram_message = TelegramMessage.objects.filter(
-                                chat_id=ticket.telegram_chat_id,
-                                message_id=comment.telegram_message_id,
-                                linked_ticket=ticket,
-                                linked_action='add_comment'
-                            ).first()
-                            
-                            if telegram_message:
-                                telegram_message.text = new_content
-                                telegram_message.save()
-                                logger.info(f"Updated comment message in stream: {telegram_message.id}")
-                        else:
-                            # Обновляем ID сообщения в комментарии
-                            comment.telegram_message_id = str(result.message_id)
-                            comment.save()
-                            
-                            # Добавляем новое сообщение в поток
-                            TelegramMessage.objects.create(
-                                message_id=str(result.message_id),
-                                chat_id=str(ticket.telegram_chat_id),
-                                chat_title=ticket.telegram_chat_title or '',
-                                from_user_id=str(request.user.id),
-                                from_username=request.user.username,
-                                from_fullname=request.user.get_full_name() or request.user.username,
-                                text=new_content,
-                                message_date=timezone.now(),
-                                created_at=timezone.now(),
-                                linked_ticket=ticket,
-                                linked_action='add_comment',
-                                reply_to_message_id=str(ticket.external_message_id)
-                            )
-                            logger.info(f"Added new comment message to stream: {result.message_id}")
-                    except Exception as stream_error:
-                        logger.error(f"Failed to update comment message in stream: {stream_error}", exc_info=True)
-                    
-                    messages.success(request, 'Комментарий обновлен и отправлен в Telegram')
+                if outbox.is_configured():
+                    # Отредактировать отправленное сообщение (иначе отправить новое ответом на обращение)
+                    # или, если отправка ещё в очереди, заменить её текст
+                    item = outbox.enqueue_comment_edit(ticket, comment, new_content, author=request.user)
+                    logger.info(f"Telegram comment update queued: outbox_id={item.id}")
+                    messages.success(request, 'Комментарий обновлен и поставлен в очередь отправки в Telegram')
                 else:
                     logger.error("TELEGRAM_BOT_TOKEN not configured")
                     messages.warning(request, 'Telegram бот не настроен')
@@ -836,27 +636,14 @@ def delete_comment(request, comment_id):
     if request.method == 'POST':
         try:
             import logging
-            import asyncio
-            from telegram.ext import Application
-            from django.conf import settings
             
             logger = logging.getLogger(__name__)
             logger.info(f"Attempting to delete Telegram comment: chat_id={ticket.telegram_chat_id}, message_id={comment.telegram_message_id}")
             
-            bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-            if bot_token:
-                # Создаем асинхронную функцию для удаления сообщения
-                async def delete_telegram_message():
-                    application = Application.builder().token(bot_token).build()
-                    result = await application.bot.delete_message(
-                        chat_id=ticket.telegram_chat_id,
-                        message_id=int(comment.telegram_message_id)
-                    )
-                    return result
-                
-                # Запускаем асинхронную функцию
-                result = asyncio.run(delete_telegram_message())
-                logger.info(f"Telegram message deleted successfully: {comment.telegram_message_id}")
+            if outbox.is_configured():
+                if comment.telegram_message_id:
+                    item = outbox.enqueue_delete(ticket, comment.telegram_message_id, author=request.user)
+                    logger.info(f"Telegram message deletion queued: outbox_id={item.id}")
                 
                 # Удаляем сообщение из потока
                 try:
@@ -879,7 +666,7 @@ def delete_comment(request, comment_id):
                 # Удаляем комментарий
                 comment.delete()
                 
-                messages.success(request, 'Комментарий удален из Telegram и потока')
+                messages.success(request, 'Комментарий удален, удаление из Telegram поставлено в очередь')
             else:
                 logger.error("TELEGRAM_BOT_TOKEN not configured")
                 
@@ -933,9 +720,6 @@ def delete_resolution(request, ticket_id):
     if request.method == 'POST':
         try:
             import logging
-            import asyncio
-            from telegram.ext import Application
-            from django.conf import settings
             
             logger = logging.getLogger(__name__)
             # Находим сообщение с решением в потоке
@@ -951,20 +735,9 @@ def delete_resolution(request, ticket_id):
             
             logger.info(f"Attempting to delete Telegram resolution: chat_id={ticket.telegram_chat_id}, message_id={resolution_message.message_id}")
             
-            bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-            if bot_token:
-                # Создаем асинхронную функцию для удаления сообщения
-                async def delete_telegram_message():
-                    application = Application.builder().token(bot_token).build()
-                    result = await application.bot.delete_message(
-                        chat_id=ticket.telegram_chat_id,
-                        message_id=int(resolution_message.message_id)
-                    )
-                    return result
-                
-                # Запускаем асинхронную функцию
-                result = asyncio.run(delete_telegram_message())
-                logger.info(f"Telegram message deleted successfully: {resolution_message.message_id}")
+            if outbox.is_configured():
+                item = outbox.enqueue_delete(ticket, resolution_message.message_id, author=request.user)
+                logger.info(f"Telegram resolution deletion queued: outbox_id={item.id}")
                 
                 # Удаляем сообщение из потока
                 try:
@@ -984,10 +757,10 @@ def delete_resolution(request, ticket_id):
                 # Очищаем решение и меняем статус
                 ticket.resolution = ''
                 ticket.resolved_at = None
-                ticket.status = TicketStatus.objects.get(name='В работе')  # Возвращаем в работу
+                ticket.status = caches.get_status('В работе')  # Возвращаем в работу
                 ticket.save()
                 
-                messages.success(request, 'Решение удалено из Telegram и потока')
+                messages.success(request, 'Решение удалено, удаление из Telegram поставлено в очередь')
             else:
                 logger.error("TELEGRAM_BOT_TOKEN not configured")
                 
@@ -997,7 +770,7 @@ def delete_resolution(request, ticket_id):
                 
                 ticket.resolution = ''
                 ticket.resolved_at = None
-                ticket.status = TicketStatus.objects.get(name='В работе')
+                ticket.status = caches.get_status('В работе')
                 ticket.save()
                 
                 messages.warning(request, 'Решение удалено (Telegram бот не настроен)')
@@ -1035,10 +808,7 @@ def ticket_create(request):
             assigned_to_id_raw = (request.POST.get('assigned_to_id') or '').strip()
             
             if category_id:
-                try:
-                    ticket.category = Category.objects.get(id=category_id)
-                except Category.DoesNotExist:
-                    pass
+                ticket.category = caches.get_category(category_id) or ticket.category
             
             if client_id:
                 try:
@@ -1103,7 +873,7 @@ def ticket_create(request):
     
     context = {
         'form': form,
-        'categories_for_sla': Category.objects.filter(is_active=True).order_by('sla_hours', 'name')[:6],
+        'categories_for_sla': caches.get_sla_categories(),
     }
     
     return render(request, 'tickets/ticket_form.html', context)
@@ -1130,10 +900,7 @@ def ticket_edit(request, ticket_id):
             assigned_to_id_raw = (request.POST.get('assigned_to_id') or '').strip()
             
             if category_id:
-                try:
-                    ticket.category = Category.objects.get(id=category_id)
-                except Category.DoesNotExist:
-                    pass
+                ticket.category = caches.get_category(category_id) or ticket.category
             
             if client_id:
                 try:
@@ -1195,7 +962,7 @@ def ticket_edit(request, ticket_id):
     context = {
         'form': form,
         'ticket': ticket,
-        'categories_for_sla': Category.objects.filter(is_active=True).order_by('sla_hours', 'name')[:6],
+        'categories_for_sla': caches.get_sla_categories(),
     }
     
     return render(request, 'tickets/ticket_form.html', context)
@@ -1212,7 +979,7 @@ def take_ticket(request, ticket_id):
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
     
     # Находим статус "В работе"
-    working_status = TicketStatus.objects.filter(is_working=True).first()
+    working_status = caches.get_working_status()
     if not working_status:
         messages.error(request, 'Статус "В работе" не найден')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
@@ -1255,7 +1022,7 @@ def resolve_ticket(request, ticket_id):
         reply_in_chat = request.POST.get('reply_in_chat') == '1'
         
         # Находим статус "Решено"
-        resolved_status = TicketStatus.objects.filter(name='Решено').first()
+        resolved_status = caches.get_status('Решено')
         if not resolved_status:
             messages.error(request, 'Статус "Решено" не найден')
             return redirect('tickets:ticket_detail', ticket_id=ticket.id)
@@ -1287,54 +1054,20 @@ def resolve_ticket(request, ticket_id):
         if reply_in_chat and ticket.telegram_chat_id and ticket.external_message_id:
             try:
                 import logging
-                import asyncio
-                from telegram.ext import Application
-                from django.conf import settings
                 
                 logger = logging.getLogger(__name__)
                 logger.info(f"Attempting to send Telegram reply: chat_id={ticket.telegram_chat_id}, message_id={ticket.external_message_id}")
                 
-                bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                if bot_token:
-                    # Создаем асинхронную функцию для отправки
-                    async def send_telegram_message():
-                        application = Application.builder().token(bot_token).build()
-                        result = await application.bot.send_message(
-                            chat_id=ticket.telegram_chat_id,
-                            text=resolution,
-                            reply_to_message_id=int(ticket.external_message_id)
-                        )
-                        return result
-                    
-                    # Запускаем асинхронную функцию
-                    result = asyncio.run(send_telegram_message())
-                    logger.info(f"Telegram message sent successfully: {result.message_id}")
-                    
-                    # Добавляем отправленное сообщение в поток
-                    try:
-                        from tickets.models import TelegramMessage
-                        from django.contrib.auth.models import User
-                        
-                        # Создаем запись в потоке о том, что обращение решено
-                        TelegramMessage.objects.create(
-                            message_id=str(result.message_id),
-                            chat_id=str(ticket.telegram_chat_id),
-                            chat_title=ticket.telegram_chat_title or '',
-                            from_user_id=str(request.user.id),
-                            from_username=request.user.username,
-                            from_fullname=request.user.get_full_name() or request.user.username,
-                            text=resolution,
-                            message_date=timezone.now(),
-                            created_at=timezone.now(),
-                            linked_ticket=ticket,
-                            linked_action='resolve_ticket',
-                            reply_to_message_id=str(ticket.external_message_id)
-                        )
-                        logger.info(f"Added resolution message to stream: {result.message_id}")
-                    except Exception as stream_error:
-                        logger.error(f"Failed to add resolution message to stream: {stream_error}", exc_info=True)
-                    
-                    messages.success(request, 'Ответ отправлен в Telegram')
+                if outbox.is_configured():
+                    item = outbox.enqueue_send(
+                        ticket,
+                        text=resolution,
+                        reply_to_message_id=ticket.external_message_id,
+                        linked_action='resolve_ticket',
+                        author=request.user,
+                    )
+                    logger.info(f"Telegram resolution queued: outbox_id={item.id}")
+                    messages.success(request, 'Ответ поставлен в очередь отправки в Telegram')
                 else:
                     logger.error("TELEGRAM_BOT_TOKEN not configured")
                     messages.warning(request, 'Telegram бот не настроен')
@@ -1419,9 +1152,6 @@ def edit_resolution(request, ticket_id):
         if reply_in_chat:
             try:
                 import logging
-                import asyncio
-                from telegram.ext import Application
-                from django.conf import settings
                 
                 logger = logging.getLogger(__name__)
                 # Находим сообщение с решением в потоке
@@ -1437,81 +1167,19 @@ def edit_resolution(request, ticket_id):
                 
                 logger.info(f"Attempting to edit Telegram message: chat_id={ticket.telegram_chat_id}, message_id={resolution_message.message_id}")
                 
-                bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                if bot_token:
-                    # Создаем асинхронную функцию для редактирования сообщения
-                    async def edit_telegram_message():
-                        application = Application.builder().token(bot_token).build()
-                        try:
-                            # Пытаемся отредактировать существующее сообщение с решением
-                            result = await application.bot.edit_message_text(
-                                chat_id=ticket.telegram_chat_id,
-                                message_id=int(resolution_message.message_id),
-                                text=new_resolution
-                            )
-                            return result, 'edited'
-                        except Exception as edit_error:
-                            # Если не удалось отредактировать, удаляем старое сообщение и отправляем новое
-                            logger.warning(f"Could not edit message, deleting old and sending new one: {edit_error}")
-                            try:
-                                await application.bot.delete_message(
-                                    chat_id=ticket.telegram_chat_id,
-                                    message_id=int(resolution_message.message_id)
-                                )
-                                logger.info(f"Deleted old resolution message: {resolution_message.message_id}")
-                            except Exception as delete_error:
-                                logger.warning(f"Could not delete old message: {delete_error}")
-                            
-                            result = await application.bot.send_message(
-                                chat_id=ticket.telegram_chat_id,
-                                text=new_resolution,
-                                reply_to_message_id=int(ticket.external_message_id)
-                            )
-                            return result, 'new'
-                    
-                    # Запускаем асинхронную функцию
-                    result, action_type = asyncio.run(edit_telegram_message())
-                    logger.info(f"Telegram message {action_type} successfully: {result.message_id}")
-                    
-                    # Обновляем сообщение в потоке
-                    try:
-                        if action_type == 'edited':
-                            # Обновляем существующее сообщение
-                            telegram_message = TelegramMessage.objects.filter(
-                                chat_id=ticket.telegram_chat_id,
-                                linked_ticket=ticket,
-                                linked_action='resolve_ticket'
-                            ).first()
-                            
-                            if telegram_message:
-                                telegram_message.text = new_resolution
-                                telegram_message.save()
-                                logger.info(f"Updated resolution message in stream: {telegram_message.id}")
-                        else:
-                            # Удаляем старое сообщение из потока и добавляем новое
-                            old_message_id = resolution_message.message_id
-                            resolution_message.delete()
-                            logger.info(f"Deleted old resolution message from stream: {old_message_id}")
-                            
-                            TelegramMessage.objects.create(
-                                message_id=str(result.message_id),
-                                chat_id=str(ticket.telegram_chat_id),
-                                chat_title=ticket.telegram_chat_title or '',
-                                from_user_id=str(request.user.id),
-                                from_username=request.user.username,
-                                from_fullname=request.user.get_full_name() or request.user.username,
-                                text=new_resolution,
-                                message_date=timezone.now(),
-                                created_at=timezone.now(),
-                                linked_ticket=ticket,
-                                linked_action='resolve_ticket',
-                                reply_to_message_id=str(ticket.external_message_id)
-                            )
-                            logger.info(f"Added new resolution message to stream: {result.message_id}")
-                    except Exception as stream_error:
-                        logger.error(f"Failed to update resolution message in stream: {stream_error}", exc_info=True)
-                    
-                    messages.success(request, 'Решение обновлено и отправлено в Telegram')
+                if outbox.is_configured():
+                    # Если отредактировать не получится, обработчик удалит старое сообщение и отправит новое
+                    item = outbox.enqueue_edit(
+                        ticket,
+                        message_id=resolution_message.message_id,
+                        text=new_resolution,
+                        linked_action='resolve_ticket',
+                        author=request.user,
+                        fallback_reply_to_message_id=ticket.external_message_id,
+                        delete_on_fallback=True,
+                    )
+                    logger.info(f"Telegram resolution update queued: outbox_id={item.id}")
+                    messages.success(request, 'Решение обновлено и поставлено в очередь отправки в Telegram')
                 else:
                     logger.error("TELEGRAM_BOT_TOKEN not configured")
                     messages.warning(request, 'Telegram бот не настроен')
@@ -1540,9 +1208,7 @@ def close_ticket(request, ticket_id):
     ticket = get_object_or_404(Ticket, id=ticket_id)
     
     # Находим статус "Решено" (единственный финальный)
-    resolved_status = TicketStatus.objects.filter(name='Решено').first()
-    if not resolved_status:
-        resolved_status = TicketStatus.objects.filter(is_final=True).first()
+    resolved_status = caches.get_resolved_status()
     if not resolved_status:
         messages.error(request, 'Финальный статус "Решено" не найден')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
@@ -1577,7 +1243,7 @@ def set_waiting(request, ticket_id):
     if not ticket.status.is_working:
         messages.error(request, 'Перевод возможен только из статуса "В работе"')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
-    waiting_status = TicketStatus.objects.filter(name='Ожидает ответа').first()
+    waiting_status = caches.get_status('Ожидает ответа')
     if not waiting_status:
         messages.error(request, 'Статус "Ожидает ответа" не найден')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
@@ -1606,7 +1272,7 @@ def return_to_work(request, ticket_id):
     if ticket.status and ticket.status.name != 'Ожидает ответа':
         messages.error(request, 'Возврат возможен только из статуса "Ожидает ответа"')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
-    working_status = TicketStatus.objects.filter(is_working=True).exclude(name='Ожидает ответа').first()
+    working_status = caches.get_working_status(exclude_waiting=True)
     if not working_status:
         messages.error(request, 'Рабочий статус не найден')
         return redirect('tickets:ticket_detail', ticket_id=ticket.id)
@@ -1634,10 +1300,7 @@ def client_list(request):
     ).order_by('name')
     
     if search_query:
-        clients = clients.filter(
-            Q(name__iregex=search_query) |
-            Q(contact_person__iregex=search_query)
-        )
+        clients = autocomplete.filter_queryset('client', clients, search_query)
     
     # Пагинация
     paginator = Paginator(clients, 25)
@@ -1662,7 +1325,7 @@ def client_detail(request, client_id):
     ).order_by('-created_at')
     # Статистика
     total_tickets = tickets.count()
-    open_tickets = tickets.filter(status__is_final=False).count()
+    open_tickets = tickets.filter(status_is_final__in=[False]).count()
     
     context = {
         'client': client,
@@ -1722,10 +1385,11 @@ def get_template_content(request, template_id):
 def autocomplete_categories(request):
     """AJAX autocomplete для категорий"""
     query = request.GET.get('q', '')
-    base_qs = Category.objects.filter(is_active=True)
+    base_qs = Category.objects.filter(is_active=True).select_related('parent')
     if len(query) >= 1:
-        base_qs = base_qs.filter(Q(name__icontains=query) | Q(description__icontains=query))
-    categories = base_qs.order_by('parent__name', 'name')[:10]
+        categories = autocomplete.search('category', base_qs, query, limit=10)
+    else:
+        categories = base_qs.order_by('parent__name', 'name')[:10]
     
     results = []
     for category in categories:
@@ -1742,17 +1406,12 @@ def autocomplete_categories(request):
 def autocomplete_clients(request):
     """AJAX autocomplete для клиентов"""
     query = request.GET.get('q', '')
-    base_qs = Client.objects.filter(is_active=True)
+    base_qs = Client.objects.filter(is_active=True).select_related('organization')
     if len(query) >= 1:
-        # Используем iregex для регистронезависимого поиска в SQLite
-        base_qs = base_qs.filter(
-            Q(name__iregex=query) |
-            Q(contact_person__iregex=query) |
-            Q(phone__iregex=query) |
-            Q(email__iregex=query) |
-            Q(organization__name__iregex=query)
-        )
-    clients = base_qs.select_related('organization').order_by('name')[:10]
+        # Поиск по началу слов имени, контакта, телефона, email и организации (индекс автокомплита)
+        clients = autocomplete.search('client', base_qs, query, limit=10)
+    else:
+        clients = base_qs.order_by('name')[:10]
     
     results = []
     for client in clients:
@@ -1776,9 +1435,9 @@ def autocomplete_organizations(request):
     query = request.GET.get('q', '')
     base_qs = Organization.objects.all()
     if len(query) >= 1:
-        # Используем iregex для регистронезависимого поиска в SQLite
-        base_qs = base_qs.filter(name__iregex=query)
-    orgs = base_qs.order_by('name')[:10]
+        orgs = autocomplete.search('organization', base_qs, query, limit=10)
+    else:
+        orgs = base_qs.order_by('name')[:10]
     results = [{'id': o.id, 'text': o.name} for o in orgs]
     return JsonResponse({'results': results})
 
@@ -1801,13 +1460,9 @@ def autocomplete_users(request):
     query = request.GET.get('q', '')
     base_qs = User.objects.filter(is_active=True)
     if len(query) >= 1:
-        base_qs = base_qs.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(email__icontains=query)
-        )
-    users = base_qs.order_by('username')[:10]
+        users = autocomplete.search('user', base_qs, query, limit=10)
+    else:
+        users = base_qs.order_by('username')[:10]
     
     results = []
     for user in users:
@@ -1830,11 +1485,9 @@ def autocomplete_groups(request):
     query = request.GET.get('q', '')
     base_qs = TelegramGroup.objects.all()
     if len(query) >= 1:
-        base_qs = base_qs.filter(
-            Q(title__iregex=query) |
-            Q(chat_id__iregex=query)
-        )
-    groups = base_qs.order_by('title', 'chat_id')[:10]
+        groups = autocomplete.search('group', base_qs, query, limit=10)
+    else:
+        groups = base_qs.order_by('title', 'chat_id')[:10]
     
     results = []
     for group in groups:
@@ -1878,20 +1531,19 @@ def queue_view(request):
     # Не назначенные обращения
     unassigned_tickets = Ticket.objects.filter(
         assigned_to__isnull=True,
-        status__is_final=False
+        status_is_final__in=[False]
     ).select_related('client', 'category', 'status').order_by('created_at')
     
     # Мои обращения
     my_tickets = Ticket.objects.filter(
         assigned_to=request.user,
-        status__is_final=False
+        status_is_final__in=[False]
     ).select_related('client', 'category', 'status').order_by('created_at')
     
-    # Просроченные обращения
+    # Просроченные обращения (SLA категории), самые давно просроченные сверху
     overdue_tickets = Ticket.objects.filter(
-        status__is_final=False,
-        created_at__lt=timezone.now() - timezone.timedelta(hours=24)
-    ).select_related('client', 'category', 'status', 'assigned_to').order_by('created_at')
+        Ticket.overdue_filter()
+    ).select_related('client', 'category', 'status', 'assigned_to').order_by('sla_deadline', 'id')
     
     context = {
         'unassigned_tickets': unassigned_tickets,
@@ -1925,11 +1577,17 @@ def analytics(request):
     # Даты по умолчанию: текущий месяц
     from django.utils import timezone as dj_tz
     today = dj_tz.localdate()
+    date_from = date_ranges.parse_date(date_from)
+    date_to = date_ranges.parse_date(date_to)
     if not date_from:
         first_day = today.replace(day=1)
         date_from = first_day.isoformat()
+    else:
+        date_from = date_from.isoformat()
     if not date_to:
         date_to = today.isoformat()
+    else:
+        date_to = date_to.isoformat()
 
     tickets_qs = Ticket.objects.select_related('category', 'client', 'organization', 'status', 'assigned_to').all()
 
@@ -1945,41 +1603,45 @@ def analytics(request):
         tickets_qs = tickets_qs.filter(client_id=int(client_id))
     if organization_id and str(organization_id).isdigit():
         tickets_qs = tickets_qs.filter(organization_id=int(organization_id))
-    if date_from:
-        tickets_qs = tickets_qs.filter(created_at__date__gte=date_from)
-    if date_to:
-        tickets_qs = tickets_qs.filter(created_at__date__lte=date_to)
-
-    # Агрегации (без extra, чтобы избежать конфликтов алиасов)
-    by_day = (
-        tickets_qs
-        .annotate(day=TruncDate('created_at'))
-        .values('day')
-        .order_by('day')
-        .annotate(cnt=Count('id'))
-    )
-    # Подсчет тегов или организаций в зависимости от chart_type
-    if chart_type == 'organizations':
-        from collections import Counter
-        org_counter = Counter()
-        for ticket in tickets_qs.select_related('organization'):
-            if ticket.organization:
-                org_counter[ticket.organization.name] += 1
-        top_orgs = sorted(org_counter.items(), key=lambda x: x[1], reverse=True)[:20]
-        chart_data = [{'name': k, 'count': v} for k, v in top_orgs]
-    else:  # tags
-        by_tags = []
-        # Разбор тегов по запятым
-        for t in tickets_qs.exclude(tags="").values_list('tags', flat=True):
-            for tag in [x.strip() for x in t.split(',') if x.strip()]:
-                by_tags.append(tag)
-        from collections import Counter
-        tags_counter = Counter(by_tags)
-        top_tags = sorted(tags_counter.items(), key=lambda x: x[1], reverse=True)[:20]
-        chart_data = [{'name': k, 'count': v} for k, v in top_tags]
+    # Период — интервал по created_at (индексы обращений), а не created_at__date
+    tickets_qs = date_ranges.filter_dates(tickets_qs, 'created_at', date_from, date_to)
+
+    # Сводки аналитики (tickets/rollups.py) хранят разрезы по дню, категории и организации.
+    # Клиента в сводках нет — с фильтром по клиенту считаем по самим обращениям.
+    use_rollups = not (client_id and str(client_id).isdigit())
+    if use_rollups:
+        rollup_filters = rollups.analytics_filters(category_id, category_text, organization_id, date_from, date_to)
+        stats = rollups.daily_stats(**rollup_filters)
+        by_day_list = rollups.counts_by_day(stats)
+        if chart_type == 'organizations':
+            chart_data = rollups.top_organizations(stats)
+        else:  # tags
+            chart_data = rollups.top_tags(rollups.tag_stats(**rollup_filters))
+        total_count = sum(item['cnt'] for item in by_day_list)
+    else:
+        # Агрегации (без extra, чтобы избежать конфликтов алиасов)
+        by_day = (
+            tickets_qs
+            .annotate(day=TruncDate('created_at'))
+            .values('day')
+            .order_by('day')
+            .annotate(cnt=Count('id'))
+        )
+        # Подсчет тегов или организаций в зависимости от chart_type — группировкой в БД
+        if chart_type == 'organizations':
+            chart_data = [
+                {'name': row['organization__name'], 'count': row['cnt']}
+                for row in tickets_qs.filter(organization__isnull=False)
+                .values('organization__name')
+                .annotate(cnt=Count('id'))
+                .order_by('-cnt', 'organization__name')[:20]
+            ]
+        else:  # tags
+            chart_data = tagging.top_tags(tickets_qs)
+        by_day_list = list(by_day)
+        total_count = tickets_qs.count()
 
     # Сериализация для фронта
-    by_day_list = list(by_day)
     by_day_serialized = [
         {'day': (item['day'].isoformat() if item['day'] else None), 'cnt': item['cnt']}
         for item in by_day_list
@@ -1989,12 +1651,14 @@ def analytics(request):
     chart_data_json = json.dumps(chart_data)
 
     # Краткая сводка для подписи под графиком
-    total_count = tickets_qs.count()
     day_count = len(by_day_list)
     avg_per_day = round(total_count / day_count, 1) if day_count else 0
 
     # Пагинация списка
     paginator = Paginator(tickets_qs.order_by('-created_at'), 25)
+    if use_rollups:
+        # Число обращений уже известно из сводок — без COUNT(*) по всем обращениям периода
+        paginator.count = total_count
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -2003,7 +1667,7 @@ def analytics(request):
     client_name = None
     organization_name = None
     if category_id and str(category_id).isdigit():
-        c = Category.objects.filter(id=int(category_id)).first()
+        c = caches.get_category(category_id)
         if c:
             category_name = str(c)
     if client_id and str(client_id).isdigit():
@@ -2027,6 +1691,15 @@ def analytics(request):
             'date_from': date_from or '',
             'date_to': date_to or '',
         },
+        # Параметры ссылок выгрузки (формат добавляется в шаблоне)
+        'export_query': urlencode({
+            'category_id': category_id or '',
+            'category': category_text or '',
+            'client_id': client_id or '',
+            'organization_id': organization_id or '',
+            'date_from': date_from or '',
+            'date_to': date_to or '',
+        }),
         'chart_by_day_json': chart_by_day_json,
         'chart_data_json': chart_data_json,
         'chart_type': chart_type,
@@ -2140,76 +1813,59 @@ def api_create_organization(request):
 
 @login_required
 def analytics_export_xlsx(request):
-    """Экспорт выборки аналитики в XLSX по текущим фильтрам."""
-    # Повторяем фильтрацию как в analytics
-    def first_non_empty(param_name):
-        values = request.GET.getlist(param_name)
-        for v in values:
-            if v not in (None, '', 'None', 'null', 'NULL'):
-                return v
-        return None
+    """Ставит выгрузку аналитики по текущим фильтрам в очередь (format: xlsx, csv, columnar).
 
-    category_id = first_non_empty('category_id')
-    category_text = first_non_empty('category')
-    client_id = first_non_empty('client_id') or first_non_empty('client')
-    organization_id = first_non_empty('organization_id') or first_non_empty('organization')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
+    Файл готовит команда export_worker; пользователь попадает на страницу задания,
+    где видно прогресс и появляется ссылка на скачивание.
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    job = export_jobs.enqueue(request.user, params.get('format') or 'xlsx', exports.analytics_filters(params))
+    messages.info(request, f'Выгрузка #{job.id} поставлена в очередь')
+    return redirect('tickets:export_job_detail', job_id=job.id)
 
-    qs = Ticket.objects.select_related('category', 'client', 'organization', 'status', 'assigned_to')
-    if category_id and str(category_id).isdigit():
-        cid = int(category_id)
-        qs = qs.filter(Q(category_id=cid) | Q(category__parent_id=cid))
-    elif category_text:
-        qs = qs.filter(Q(category__name__icontains=category_text) | Q(category__parent__name__icontains=category_text))
-    if client_id and str(client_id).isdigit():
-        qs = qs.filter(client_id=int(client_id))
-    if organization_id and str(organization_id).isdigit():
-        qs = qs.filter(organization_id=int(organization_id))
-    if date_from:
-        qs = qs.filter(created_at__date__gte=date_from)
-    if date_to:
-        qs = qs.filter(created_at__date__lte=date_to)
-
-    # Формируем XLSX
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Обращения'
-    headers = ['ID', 'Заголовок', 'Клиент', 'Контактное лицо', 'Организация', 'Категория', 'Статус', 'Исполнитель', 'Создано', 'Дата выполнения', 'Теги']
-    ws.append(headers)
-    for t in qs.order_by('-created_at'):
-        ws.append([
-            t.id,
-            t.title,
-            t.client.name if t.client else '',
-            t.client.contact_person if t.client else '',
-            t.organization.name if t.organization else '',
-            t.category.name if t.category else '',
-            t.status.name if t.status else '',
-            (t.assigned_to.get_full_name() or t.assigned_to.username) if t.assigned_to else '',
-            t.created_at.strftime('%d.%m.%Y %H:%M'),
-            t.resolved_at.strftime('%d.%m.%Y %H:%M') if t.resolved_at else '',
-            t.tags if t.tags else '',
-        ])
-
-    # Автоширина
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            max_len = max(max_len, len(str(cell.value)) if cell.value else 0)
-        ws.column_dimensions[col_letter].width = min(max(10, max_len + 2), 60)
-
-    from datetime import datetime
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-
-    resp = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = f'attachment; filename="analytics_export_{timestamp}.xlsx"'
-    wb.save(resp)
-    return resp
+
+def _get_export_job(request, job_id):
+    """Задание выгрузки: видно автору и персоналу"""
+    jobs = ExportJob.objects.all()
+    if not request.user.is_staff:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=job_id)
+
+
+def _export_job_state(job):
+    state = export_jobs.as_dict(job)
+    state['download_url'] = reverse('tickets:export_job_download', args=[job.id]) if state['ready'] else ''
+    return state
+
+
+@login_required
+def export_job_detail(request, job_id):
+    """Страница задания выгрузки с прогрессом"""
+    job = _get_export_job(request, job_id)
+    return render(request, 'tickets/export_job.html', {
+        'job': job,
+        'state': _export_job_state(job),
+    })
+
+
+@login_required
+def export_job_status(request, job_id):
+    """Состояние задания выгрузки (для опроса со страницы)"""
+    return JsonResponse(_export_job_state(_get_export_job(request, job_id)))
+
+
+@login_required
+def export_job_download(request, job_id):
+    """Скачивание готовой выгрузки"""
+    job = _get_export_job(request, job_id)
+    if job.status != 'done' or not job.file:
+        raise Http404('Выгрузка ещё не готова')
+    try:
+        fileobj = job.file.open('rb')
+    except FileNotFoundError:
+        raise Http404('Файл выгрузки удалён')
+    _, content_type = exports.FORMATS[job.format]
+    return FileResponse(fileobj, as_attachment=True, filename=os.path.basename(job.file.name), content_type=content_type)
 
 
 @login_required
@@ -2232,24 +1888,10 @@ def stream(request):
     if group_id and group_id not in (None, '', 'None', 'null', 'NULL'):
         qs = qs.filter(chat_id=group_id)
     if q:
-        qs = qs.filter(Q(text__icontains=q) | Q(from_username__icontains=q) | Q(from_fullname__icontains=q))
-    
-    # Фильтры по дате создания
-    if date_from:
-        try:
-            from datetime import datetime
-            date_from_dt = datetime.strptime(date_from, '%Y-%m-%d')
-            qs = qs.filter(message_date__date__gte=date_from_dt.date())
-        except ValueError:
-            pass
+        qs = search.filter_messages(qs, q)
     
-    if date_to:
-        try:
-            from datetime import datetime
-            date_to_dt = datetime.strptime(date_to, '%Y-%m-%d')
-            qs = qs.filter(message_date__date__lte=date_to_dt.date())
-        except ValueError:
-            pass
+    # Фильтры по дате создания: локальные дни -> интервал по message_date (индекс)
+    qs = date_ranges.filter_dates(qs, 'message_date', date_from, date_to)
 
     # Действие: создать тикет из сообщения
     if request.method == 'POST' and request.POST.get('action') == 'create_ticket':
@@ -2273,11 +1915,7 @@ def stream(request):
         
         # Если клиент не найден, ищем по from_user_id или создаем неизвестного
         if not client:
-            client = Client.objects.filter(external_id=msg.from_user_id).first()
-            if not client:
-                client = Client.objects.filter(name='Неизвестный клиент').first()
-                if not client:
-                    client = Client.objects.create(name='Неизвестный клиент')
+            client = Client.objects.filter(external_id=msg.from_user_id).first() or caches.get_unknown_client()
 
         # Поиск организации
         organization = None
@@ -2290,8 +1928,7 @@ def stream(request):
         # Поиск маршрута для этой группы, клиента и организации
         route = None
         try:
-            from .models import TelegramGroup
-            telegram_group = TelegramGroup.objects.filter(chat_id=msg.chat_id).first()
+            telegram_group = caches.get_groups([msg.chat_id]).get(msg.chat_id)
             route = TelegramRoute.find_route(telegram_group=telegram_group, client=client, organization=organization)
         except:
             pass
@@ -2302,11 +1939,9 @@ def stream(request):
         
         # Сначала проверяем, выбрал ли пользователь категорию вручную
         if category_id:
-            try:
-                category = Category.objects.get(id=category_id)
+            category = caches.get_category(category_id)
+            if category:
                 print(f"Using user-selected category: {category.name}")
-            except Category.DoesNotExist:
-                pass
         
         # Если пользователь не выбрал категорию, используем маршрутизацию
         if not category:
@@ -2329,14 +1964,14 @@ def stream(request):
                     )
             else:
                 # Используем логику по умолчанию
-                category = Category.objects.filter(name__icontains='Обращения от поставщиков', parent__isnull=True).first() or Category.objects.first()
+                category = caches.get_default_category()
                 print(f"Using default category: {category.name}")
                 
                 if not title:
                     title = msg.text[:100] if msg.text else 'Сообщение из Telegram'
 
         # Статус по умолчанию
-        status = TicketStatus.objects.filter(is_final=False).order_by('order').first() or TicketStatus.objects.first()
+        status = caches.get_initial_status()
 
         ticket = Ticket(
             title=title,
@@ -2353,6 +1988,7 @@ def stream(request):
         ticket.telegram_chat_title = msg.chat_title
         ticket.created_at = msg.message_date
         ticket.save()
+        TelegramMessageLink.remember(msg.chat_id, msg.message_id, ticket)
 
         msg.linked_ticket = ticket
         msg.linked_action = 'create_ticket'
@@ -2387,7 +2023,7 @@ def stream(request):
         ticket = get_object_or_404(Ticket, id=ticket_id)
 
         # Находим финальный/"Решено" статус
-        resolved_status = TicketStatus.objects.filter(name='Решено').first() or TicketStatus.objects.filter(is_final=True).first()
+        resolved_status = caches.get_resolved_status()
         if not resolved_status:
             messages.error(request, 'Статус "Решено" не найден')
             return redirect(build_stream_url_with_params(request))
@@ -2402,12 +2038,7 @@ def stream(request):
         
         # Если исполнитель не назначен, назначаем автора сообщения или текущего пользователя
         if not ticket.assigned_to:
-            from .models import UserTelegramAccess
-            uta = UserTelegramAccess.objects.select_related('user').filter(telegram_user_id=msg.from_user_id, is_allowed=True).first()
-            if uta:
-                ticket.assigned_to = uta.user
-            else:
-                ticket.assigned_to = request.user
+            ticket.assigned_to = (msg.from_user_id and caches.get_access_user(msg.from_user_id)) or request.user
         
         ticket.save()
 
@@ -2445,29 +2076,7 @@ def stream(request):
         msg = get_object_or_404(TelegramMessage, id=msg_id)
         ticket = get_object_or_404(Ticket, id=int(ticket_id))
 
-        # Определяем автора
-        author_type = 'user'
-        author = None
-        author_client = None
-        # Если есть маппинг на пользователя системы
-        from .models import UserTelegramAccess  # локальный импорт во избежание циклов
-        uta = UserTelegramAccess.objects.select_related('user').filter(telegram_user_id=msg.from_user_id, is_allowed=True).first()
-        if uta:
-            author_type = 'user'
-            author = uta.user
-        else:
-            # Если есть клиент по external_id
-            cl = Client.objects.filter(external_id=msg.from_user_id).first()
-            if cl:
-                author_type = 'client'
-                author_client = cl
-            else:
-                # Иначе "Неизвестный клиент"
-                author_type = 'client'
-                author_client = Client.objects.filter(name='Неизвестный клиент').first()
-                if not author_client:
-                    author_client = Client.objects.create(name='Неизвестный клиент')
-
+        # Комментарий пишет оператор от своего имени, автор сообщения не нужен
         comment = TicketComment(
             ticket=ticket,
             content=comment_text,
@@ -2488,50 +2097,20 @@ def stream(request):
         if reply_in_chat and ticket.telegram_chat_id and ticket.external_message_id:
             try:
                 import logging
-                import asyncio
-                from telegram.ext import Application
-                from django.conf import settings
                 
                 logger = logging.getLogger(__name__)
                 logger.info(f"Attempting to send Telegram comment: chat_id={ticket.telegram_chat_id}, message_id={msg.message_id}")
                 
-                bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-                if bot_token:
-                    # Создаем асинхронную функцию для отправки комментария
-                    async def send_telegram_comment():
-                        application = Application.builder().token(bot_token).build()
-                        result = await application.bot.send_message(
-                            chat_id=ticket.telegram_chat_id,
-                            text=comment_text,
-                            reply_to_message_id=int(msg.message_id)
-                        )
-                        return result
-                    
-                    # Запускаем асинхронную функцию
-                    result = asyncio.run(send_telegram_comment())
-                    logger.info(f"Telegram comment sent successfully: {result.message_id}")
-                    
-                    # Добавляем отправленное сообщение в поток
-                    try:
-                        TelegramMessage.objects.create(
-                            message_id=str(result.message_id),
-                            chat_id=str(ticket.telegram_chat_id),
-                            chat_title=ticket.telegram_chat_title or '',
-                            from_user_id=str(request.user.id),
-                            from_username=request.user.username,
-                            from_fullname=request.user.get_full_name() or request.user.username,
-                            text=comment_text,
-                            message_date=timezone.now(),
-                            created_at=timezone.now(),
-                            linked_ticket=ticket,
-                            linked_action='add_comment',
-                            reply_to_message_id=str(msg.message_id)
-                        )
-                        logger.info(f"Added comment message to stream: {result.message_id}")
-                    except Exception as stream_error:
-                        logger.error(f"Failed to add comment message to stream: {stream_error}", exc_info=True)
-                    
-                    messages.success(request, mark_safe(f'Комментарий добавлен и отправлен в Telegram в обращение <a href="{reverse("tickets:ticket_detail", args=[ticket.id])}" target="_blank">#{ticket.id}</a>'))
+                if outbox.is_configured():
+                    item = outbox.enqueue_send(
+                        ticket,
+                        text=comment_text,
+                        reply_to_message_id=msg.message_id,
+                        linked_action='add_comment',
+                        author=request.user,
+                    )
+                    logger.info(f"Telegram comment queued: outbox_id={item.id}")
+                    messages.success(request, mark_safe(f'Комментарий добавлен и поставлен в очередь отправки в Telegram в обращение <a href="{reverse("tickets:ticket_detail", args=[ticket.id])}" target="_blank">#{ticket.id}</a>'))
                 else:
                     logger.error("TELEGRAM_BOT_TOKEN not configured")
                     messages.success(request, mark_safe(f'Комментарий добавлен в обращение <a href="{reverse("tickets:ticket_detail", args=[ticket.id])}" target="_blank">#{ticket.id}</a> (Telegram бот не настроен)'))
@@ -2560,48 +2139,41 @@ def stream(request):
             messages.error(request, 'Укажите корректный ID тикета для массового комментария')
             return redirect(build_stream_url_with_params(request))
         ticket = get_object_or_404(Ticket, id=int(ticket_id))
-        msgs = TelegramMessage.objects.filter(id__in=ids).order_by('message_date')
-        created = 0
-        for msg in msgs:
-            # Получаем флаг "внутренний" для конкретного сообщения
-            is_internal = request.POST.get(f'is_internal_{msg.id}') == 'on'
-            author_type = 'user'
-            author = None
-            author_client = None
-            from .models import UserTelegramAccess
-            uta = UserTelegramAccess.objects.select_related('user').filter(telegram_user_id=msg.from_user_id, is_allowed=True).first()
-            if uta:
-                author_type = 'user'
-                author = uta.user
-            else:
-                cl = Client.objects.filter(external_id=msg.from_user_id).first()
-                if cl:
-                    author_type = 'client'
-                    author_client = cl
-                else:
-                    author_type = 'client'
-                    author_client = Client.objects.filter(name='Неизвестный клиент').first()
-                    if not author_client:
-                        author_client = Client.objects.create(name='Неизвестный клиент')
-
-            TicketComment.objects.create(
-                ticket=ticket,
-                content=msg.text or '',
-                is_internal=is_internal,
-                created_at=msg.message_date,
-                author_type=author_type,
-                author=author,
-                author_client=author_client,
-                telegram_message_id=msg.message_id,  # Сохраняем ID сообщения для связи
+        msgs = list(TelegramMessage.objects.filter(id__in=ids).order_by('message_date'))
+        now = timezone.now()
+        with transaction.atomic():
+            # Авторы всех сообщений — двумя запросами (допуски и клиенты), новые клиенты — одним bulk_create
+            authors = resolve_authors(message_senders(msgs))
+            comments = []
+            for msg in msgs:
+                author_type, author, author_client = authors.get(msg.from_user_id, ('client', None, None))
+                if author_type == 'client' and not author_client:
+                    author_client = caches.get_unknown_client()
+                comments.append(TicketComment(
+                    ticket=ticket,
+                    content=msg.text or '',
+                    # Флаг "внутренний" для конкретного сообщения
+                    is_internal=request.POST.get(f'is_internal_{msg.id}') == 'on',
+                    created_at=msg.message_date,
+                    author_type=author_type,
+                    author=author,
+                    author_client=author_client,
+                    telegram_message_id=msg.message_id,  # Сохраняем ID сообщения для связи
+                ))
+            TicketComment.objects.bulk_create(comments)
+            TelegramMessageLink.remember_many(
+                (msg.chat_id, msg.message_id, ticket, comment) for msg, comment in zip(msgs, comments)
             )
-            
-            # Обновляем сообщение в потоке
-            msg.linked_ticket = ticket
-            msg.linked_action = 'add_comment'
-            msg.processed_at = timezone.now()
-            msg.save()
-            
-            created += 1
+
+            # Обновляем сообщения в потоке
+            for msg in msgs:
+                msg.linked_ticket = ticket
+                msg.linked_action = 'add_comment'
+                msg.processed_at = now
+            TelegramMessage.objects.bulk_update(msgs, ['linked_ticket', 'linked_action', 'processed_at'], batch_size=500)
+        # bulk_create не вызывает сигналы — индексируем комментарии для поиска сами
+        search.index_comments(comments)
+        created = len(comments)
         messages.success(request, mark_safe(f'Добавлено комментариев: {created} в обращение <a href="{reverse("tickets:ticket_detail", args=[ticket.id])}" target="_blank">#{ticket.id}</a>'))
         return redirect(build_stream_url_with_params(request))
 
@@ -2622,18 +2194,25 @@ def stream(request):
             messages.error(request, 'Укажите период для очистки')
             return redirect(build_stream_url_with_params(request))
         
-        # Базовый фильтр по датам
-        qs_to_delete = TelegramMessage.objects.filter(
-            message_date__date__gte=date_from, 
-            message_date__date__lte=date_to
-        )
-        
-        # Если галка "Даже обработанные" не нажата, удаляем только необработанные
-        if not include_processed:
-            qs_to_delete = qs_to_delete.filter(linked_ticket__isnull=True)
-        
-        cnt, _ = qs_to_delete.delete()
+        from datetime import date
+        try:
+            start, end = date_ranges.day_range(date.fromisoformat(date_from), date.fromisoformat(date_to))
+        except ValueError:
+            messages.error(request, 'Неверный формат даты')
+            return redirect(build_stream_url_with_params(request))
+
+        # Границы периода — datetime (индекс по message_date); удаляем короткими пачками,
+        # бот может писать в поток между ними. Если галка "Даже обработанные" не нажата,
+        # удаляем только необработанные. За запрос — не больше нескольких пачек,
+        # большой период чистит команда cleanup_stream
+        qs_to_delete = retention.messages_in_period(start, end)
+        cnt, more = retention.purge_some(qs_to_delete, keep_linked=not include_processed)
         messages.success(request, f'Удалено записей из потока: {cnt}')
+        if more:
+            command = f'python manage.py cleanup_stream --date-from {date_from} --date-to {date_to}'
+            if include_processed:
+                command += ' --include-linked'
+            messages.warning(request, f'В периоде остались сообщения. Повторите очистку или выполните на сервере: {command}')
         return redirect(build_stream_url_with_params(request))
 
     # Пагинация с поддержкой per_page
@@ -2672,6 +2251,18 @@ def stream(request):
                 'from_user_id': reply['from_user_id']
             }
 
+        # Исходные сообщения, уже перенесённые в архив
+        page_keys = {f"{m.chat_id}_{m.reply_to_message_id}" for m in page_obj.object_list if m.reply_to_message_id}
+        if page_keys - set(reply_messages_map):
+            for reply in archive.find_messages(reply_to_ids):
+                key = f"{reply.chat_id}_{reply.message_id}"
+                if key in page_keys:
+                    reply_messages_map.setdefault(key, {
+                        'text': reply.text,
+                        'author': reply.from_username or reply.from_fullname or 'Неизвестный',
+                        'from_user_id': reply.from_user_id
+                    })
+
     # Получаем название группы для отображения в фильтре
     group_name = ''
     if group_id:
@@ -2681,8 +2272,8 @@ def stream(request):
             group_name = group.title or group.chat_id
 
     # Данные для предзаполнения модального окна создания обращения
-    default_category = Category.objects.filter(name__icontains='Обращения от поставщиков', parent__isnull=True).first() or Category.objects.first()
-    unknown_client = Client.objects.filter(name='Неизвестный клиент').first()
+    default_category = caches.get_default_category()
+    unknown_client = caches.get_unknown_client()
     
     # Загружаем активные маршруты для предзаполнения
     active_routes = {}
@@ -2750,9 +2341,8 @@ def stream(request):
             return redirect(build_stream_url_with_params(request))
         
         # Получаем статус "В работе"
-        try:
-            working_status = TicketStatus.objects.get(name='В работе')
-        except TicketStatus.DoesNotExist:
+        working_status = caches.get_status('В работе')
+        if not working_status:
             messages.error(request, 'Статус "В работе" не найден в системе')
             return redirect(build_stream_url_with_params(request))
         
@@ -2767,56 +2357,10 @@ def stream(request):
         
         ticket.save()
         
-        # Создаем комментарий с текстом сообщения из потока от имени клиента
-        # Определяем автора сообщения
-        author_type = 'client'
-        author_client = None
-        author_user = None
-        
-        # Проверяем, является ли отправитель системным пользователем
-        if msg.from_user_id:
-            try:
-                from tickets.models import UserTelegramAccess
-                telegram_access = UserTelegramAccess.objects.filter(
-                    telegram_user_id=msg.from_user_id,
-                    is_allowed=True
-                ).select_related('user').first()
-                
-                if telegram_access:
-                    # Это системный пользователь
-                    author_type = 'user'
-                    author_user = telegram_access.user
-                else:
-                    # Это клиент, ищем по external_id
-                    author_client = Client.objects.filter(external_id=msg.from_user_id).first()
-                    if not author_client:
-                        # Если клиент не найден, создаем комментарий от неизвестного клиента
-                        existing_unknown = Client.objects.filter(
-                            name='Неизвестный клиент',
-                            external_id=msg.from_user_id
-                        ).first()
-                        
-                        if existing_unknown:
-                            author_client = existing_unknown
-                        else:
-                            # Создаем нового клиента с уникальным именем
-                            author_client = Client.objects.create(
-                                name=f'Неизвестный клиент ({msg.from_username or msg.from_user_id})',
-                                external_id=msg.from_user_id,
-                                contact_person=msg.from_fullname or msg.from_username or 'Не указано'
-                            )
-            except Exception as e:
-                # Если произошла ошибка, создаем комментарий от неизвестного клиента
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Error determining author for message {msg.id}: {e}")
-                author_client = Client.objects.create(
-                    name=f'Неизвестный клиент ({msg.from_username or msg.from_user_id})',
-                    external_id=msg.from_user_id,
-                    contact_person=msg.from_fullname or msg.from_username or 'Не указано'
-                )
-        
-        TicketComment.objects.create(
+        # Создаем комментарий с текстом сообщения из потока от имени его автора
+        author_type, author_user, author_client = resolve_message_author(msg)
+
+        message_comment = TicketComment.objects.create(
             ticket=ticket,
             author=author_user,
             author_client=author_client,
@@ -2826,6 +2370,7 @@ def stream(request):
             telegram_message_id=msg.message_id,
             created_at=msg.message_date
         )
+        TelegramMessageLink.remember(msg.chat_id, msg.message_id, ticket, message_comment)
         
         # Создаем комментарий с пользовательским текстом (если есть)
         if comment:
@@ -2895,9 +2440,8 @@ def stream(request):
             return redirect(build_stream_url_with_params(request))
         
         # Получаем статус "Ожидает ответа"
-        try:
-            waiting_status = TicketStatus.objects.get(name='Ожидает ответа')
-        except TicketStatus.DoesNotExist:
+        waiting_status = caches.get_status('Ожидает ответа')
+        if not waiting_status:
             messages.error(request, 'Статус "Ожидает ответа" не найден в системе')
             return redirect(build_stream_url_with_params(request))
         
@@ -2911,56 +2455,10 @@ def stream(request):
         
         ticket.save()
         
-        # Создаем комментарий с текстом сообщения из потока от имени клиента
-        # Определяем автора сообщения
-        author_type = 'client'
-        author_client = None
-        author_user = None
-        
-        # Проверяем, является ли отправитель системным пользователем
-        if msg.from_user_id:
-            try:
-                from tickets.models import UserTelegramAccess
-                telegram_access = UserTelegramAccess.objects.filter(
-                    telegram_user_id=msg.from_user_id,
-                    is_allowed=True
-                ).select_related('user').first()
-                
-                if telegram_access:
-                    # Это системный пользователь
-                    author_type = 'user'
-                    author_user = telegram_access.user
-                else:
-                    # Это клиент, ищем по external_id
-                    author_client = Client.objects.filter(external_id=msg.from_user_id).first()
-                    if not author_client:
-                        # Если клиент не найден, создаем комментарий от неизвестного клиента
-                        existing_unknown = Client.objects.filter(
-                            name='Неизвестный клиент',
-                            external_id=msg.from_user_id
-                        ).first()
-                        
-                        if existing_unknown:
-                            author_client = existing_unknown
-                        else:
-                            # Создаем нового клиента с уникальным именем
-                            author_client = Client.objects.create(
-                                name=f'Неизвестный клиент ({msg.from_username or msg.from_user_id})',
-                                external_id=msg.from_user_id,
-                                contact_person=msg.from_fullname or msg.from_username or 'Не указано'
-                            )
-            except Exception as e:
-                # Если произошла ошибка, создаем комментарий от неизвестного клиента
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Error determining author for message {msg.id}: {e}")
-                author_client = Client.objects.create(
-                    name=f'Неизвестный клиент ({msg.from_username or msg.from_user_id})',
-                    external_id=msg.from_user_id,
-                    contact_person=msg.from_fullname or msg.from_username or 'Не указано'
-                )
-        
-        TicketComment.objects.create(
+        # Создаем комментарий с текстом сообщения из потока от имени его автора
+        author_type, author_user, author_client = resolve_message_author(msg)
+
+        message_comment = TicketComment.objects.create(
             ticket=ticket,
             author=author_user,
             author_client=author_client,
@@ -2970,6 +2468,7 @@ def stream(request):
             telegram_message_id=msg.message_id,
             created_at=msg.message_date
         )
+        TelegramMessageLink.remember(msg.chat_id, msg.message_id, ticket, message_comment)
         
         # Создаем комментарий с пользовательским текстом (если есть)
         if comment:
@@ -3022,16 +2521,12 @@ def get_active_tickets(request):
     """API: получить все активные обращения для выбора (только для решения)"""
     query = request.GET.get('q', '')
     tickets = Ticket.objects.filter(
-        status__is_final=False
+        status_is_final__in=[False]
     ).select_related('client', 'status', 'category').order_by('-created_at')
     
     if query:
-        tickets = tickets.filter(
-            Q(id__icontains=query) |
-            Q(title__icontains=query) |
-            Q(client__name__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        # Полнотекстовый поиск по номеру, тексту обращения и комментариям — лучшие совпадения первыми
+        tickets = search.filter_tickets(tickets, query, ranked=True)
     
     # Ограничиваем количество результатов
     tickets = tickets[:50]
@@ -3057,12 +2552,8 @@ def get_all_tickets(request):
     tickets = Ticket.objects.all().select_related('client', 'status', 'category').order_by('-created_at')
     
     if query:
-        tickets = tickets.filter(
-            Q(id__icontains=query) |
-            Q(title__icontains=query) |
-            Q(client__name__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        # Полнотекстовый поиск по номеру, тексту обращения и комментариям — лучшие совпадения первыми
+        tickets = search.filter_tickets(tickets, query, ranked=True)
     
     # Ограничиваем количество результатов
     tickets = tickets[:50]
@@ -3085,16 +2576,12 @@ def get_unresolved_tickets(request):
     """API: получить все нерешенные обращения для выбора"""
     query = request.GET.get('q', '')
     tickets = Ticket.objects.filter(
-        status__is_final=False
+        status_is_final__in=[False]
     ).select_related('client', 'status', 'category').order_by('-created_at')
     
     if query:
-        tickets = tickets.filter(
-            Q(id__icontains=query) |
-            Q(title__icontains=query) |
-            Q(client__name__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        # Полнотекстовый поиск по номеру, тексту обращения и комментариям — лучшие совпадения первыми
+        tickets = search.filter_tickets(tickets, query, ranked=True)
     
     # Ограничиваем количество результатов
     tickets = tickets[:50]
@@ -3126,12 +2613,8 @@ def get_working_tickets(request):
     ).select_related('client', 'category', 'status', 'assigned_to').order_by('-created_at')
     
     if query:
-        tickets = tickets.filter(
-            Q(id__icontains=query) |
-            Q(title__iregex=query) |
-            Q(client__name__iregex=query) |
-            Q(category__name__iregex=query)
-        )
+        # Полнотекстовый поиск по номеру, тексту обращения и комментариям — лучшие совпадения первыми
+        tickets = search.filter_tickets(tickets, query, ranked=True)
     
     results = []
     for ticket in tickets:
@@ -3161,12 +2644,8 @@ def get_waiting_tickets(request):
     ).select_related('client', 'category', 'status', 'assigned_to').order_by('-created_at')
     
     if query:
-        tickets = tickets.filter(
-            Q(id__icontains=query) |
-            Q(title__iregex=query) |
-            Q(client__name__iregex=query) |
-            Q(category__name__iregex=query)
-        )
+        # Полнотекстовый поиск по номеру, тексту обращения и комментариям — лучшие совпадения первыми
+        tickets = search.filter_tickets(tickets, query, ranked=True)
     
     results = []
     for ticket in tickets:
@@ -3192,10 +2671,7 @@ def organization_list(request):
     organizations = Organization.objects.filter(is_active=True)
     
     if search_query:
-        organizations = organizations.filter(
-            Q(name__iregex=search_query) |
-            Q(comment__iregex=search_query)
-        )
+        organizations = autocomplete.filter_queryset('organization', organizations, search_query)
     
     # Добавляем количество обращений для каждой организации
     organizations = organizations.annotate(
@@ -3227,7 +2703,7 @@ def organization_detail(request, organization_id):
     
     # Статистика
     total_tickets = tickets.count()
-    open_tickets = tickets.filter(status__is_final=False).count()
+    open_tickets = tickets.filter(status_is_final__in=[False]).count()
     
     # Пагинация обращений
     paginator = Paginator(tickets, 20)
@@ -0,0 +1,159 @@
+"""Приём обновлений Telegram через webhook.
+
+Telegram отправляет обновления POST-запросом на ``/tickets/telegram/webhook/``.
+Представление проверяет секрет из заголовка ``X-Telegram-Bot-Api-Secret-Token``,
+отбрасывает уже принятые обновления (уникальный update_id в TelegramUpdate —
+общий для всех реплик за балансировщиком) и обрабатывает обновление в процессоре
+приложения бота: параллельно для разных чатов (TELEGRAM_BOT_CONCURRENT_UPDATES),
+по порядку внутри чата. Ответ Telegram отдаётся после обработки: если обработчик
+упал, отметка update_id снимается и Telegram получает 500 — повторная доставка
+обновления будет обработана, а не отброшена как дубль.
+
+Сообщения групп пишутся в поток через буфер (tickets/ingest.py); в режиме
+webhook обработчик ждёт, пока пачка с сообщением будет записана в БД или
+сброшена на диск (TELEGRAM_STREAM_SPILL_DIR), — только потом Telegram получает
+200. Пачки копятся TELEGRAM_WEBHOOK_STREAM_FLUSH_MS. Остающееся окно потери:
+если TELEGRAM_STREAM_SPILL_DIR пуст и БД недоступна дольше таймаута Telegram,
+повторная доставка будет принята как дубль, пока исходный запрос ещё ждёт.
+
+Приложение бота запускается при первом обновлении и останавливается
+по событию lifespan ASGI-сервера (см. vv_help_system/asgi.py).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from telegram import Update
+
+from .models import TelegramUpdate
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять старые отметки update_id, сек
+PRUNE_INTERVAL = 600
+
+_application = None
+_application_lock = asyncio.Lock()
+# update_id обновлений, обработчик которых упал (заполняет _on_error)
+_failed_updates = set()
+_last_prune = 0.0
+
+
+async def get_application():
+    """Запускает приложение бота в текущем процессе (один раз)"""
+    global _application
+    if _application is None:
+        async with _application_lock:
+            if _application is None:
+                from tickets.management.commands.bot import Command
+
+                application = Command().build_application(settings.TELEGRAM_BOT_TOKEN, webhook=True)
+                application.add_error_handler(_on_error)
+                await application.initialize()
+                if application.post_init:
+                    await application.post_init(application)
+                await application.start()
+                _application = application
+                logger.info("Telegram webhook application started")
+    return _application
+
+
+async def shutdown_application():
+    """Останавливает приложение бота и дописывает буфер потока"""
+    global _application
+    application, _application = _application, None
+    if application is None:
+        return
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    logger.info("Telegram webhook application stopped")
+
+
+async def _on_error(update, context):
+    """Обработчик ошибок приложения: запоминает упавшее обновление для ответа 500"""
+    if isinstance(update, Update):
+        _failed_updates.add(update.update_id)
+    logger.error(f"Telegram webhook: update handler failed: {context.error}", exc_info=context.error)
+
+
+async def process_update(application, update) -> bool:
+    """Обрабатывает обновление в процессоре приложения. False — обработчик упал"""
+    _failed_updates.discard(update.update_id)
+    await application.update_processor.process_update(update, application.process_update(update))
+    if update.update_id in _failed_updates:
+        _failed_updates.discard(update.update_id)
+        return False
+    return True
+
+
+def _remember_update(update_id: int) -> bool:
+    """Отмечает обновление как принятое. False — его уже приняла эта или другая реплика"""
+    try:
+        TelegramUpdate.objects.create(update_id=update_id)
+    except IntegrityError:
+        return False
+    _prune_updates()
+    return True
+
+
+def _forget_update(update_id: int):
+    """Снимает отметку: обновление не обработано, повторная доставка должна пройти"""
+    TelegramUpdate.objects.filter(update_id=update_id).delete()
+
+
+def _prune_updates(force: bool = False):
+    """Удаляет отметки старше TELEGRAM_WEBHOOK_DEDUP_HOURS (не чаще раза в PRUNE_INTERVAL)"""
+    global _last_prune
+    if not force and time.monotonic() - _last_prune < PRUNE_INTERVAL:
+        return 0
+    _last_prune = time.monotonic()
+    # Повторная доставка бывает только в первые часы
+    hours = getattr(settings, 'TELEGRAM_WEBHOOK_DEDUP_HOURS', 24)
+    deleted, _ = TelegramUpdate.objects.filter(received_at__lt=timezone.now() - timezone.timedelta(hours=hours)).delete()
+    return deleted
+
+
+@csrf_exempt
+@require_POST
+async def telegram_webhook(request):
+    secret = getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', None)
+    if not secret or not getattr(settings, 'TELEGRAM_BOT_TOKEN', None):
+        return HttpResponseNotFound()
+
+    received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(received.encode(), secret.encode()):
+        logger.warning("Telegram webhook: invalid secret token")
+        return HttpResponseForbidden()
+
+    try:
+        data = json.loads(request.body)
+        update_id = int(data['update_id'])
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest()
+
+    if not await sync_to_async(_remember_update)(update_id):
+        logger.info(f"Telegram webhook: duplicate update {update_id} skipped")
+        return HttpResponse()
+
+    try:
+        application = await get_application()
+        processed = await process_update(application, Update.de_json(data, application.bot))
+    except Exception as e:
+        logger.error(f"Telegram webhook: update {update_id} failed: {e}", exc_info=True)
+        processed = False
+    if not processed:
+        await sync_to_async(_forget_update)(update_id)
+        return HttpResponse(status=500)
+    return HttpResponse()
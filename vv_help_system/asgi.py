@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vv_help_system.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Django + обработка lifespan: при остановке сервера корректно завершаем webhook-бота"""
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+
+    from tickets.webhook import shutdown_application
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown_application()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -86,6 +86,18 @@ DATABASES = {
     }
 }
 
+# Режим SQLite для процессов, которые пишут в БД из нескольких потоков одновременно
+# (бот, webhook, telegram_outbox, export_worker): транзакции сразу берут блокировку
+# записи (IMMEDIATE) и ждут её до SQLITE_BUSY_TIMEOUT сек, а не падают с "database is locked";
+# журнал WAL не блокирует чтение на время записи. Включается явно: SQLITE_CONCURRENT_WRITES=true
+SQLITE_CONCURRENT_WRITES = os.getenv('SQLITE_CONCURRENT_WRITES', 'False').lower() == 'true'
+if SQLITE_CONCURRENT_WRITES:
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+        'init_command': 'PRAGMA journal_mode=WAL;',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,6 +152,57 @@ LOGOUT_REDIRECT_URL = '/admin/login/'
 # Telegram Bot
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
+# Исходящие запросы к Telegram из веб-процесса (общий пул соединений)
+TELEGRAM_CONNECTION_POOL_SIZE = int(os.getenv('TELEGRAM_CONNECTION_POOL_SIZE', '8'))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_CONNECT_TIMEOUT', '5'))
+TELEGRAM_READ_TIMEOUT = float(os.getenv('TELEGRAM_READ_TIMEOUT', '10'))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv('TELEGRAM_WRITE_TIMEOUT', '10'))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv('TELEGRAM_POOL_TIMEOUT', '5'))
+# Адрес Bot API (можно указать локальный Bot API сервер)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+
+# Запись сообщений групп в поток пачками (manage.py bot)
+TELEGRAM_STREAM_BATCH_SIZE = int(os.getenv('TELEGRAM_STREAM_BATCH_SIZE', '100'))
+TELEGRAM_STREAM_FLUSH_MS = int(os.getenv('TELEGRAM_STREAM_FLUSH_MS', '250'))
+# Сколько раз подряд повторять неудачную запись пачки, прежде чем сбросить её на диск
+TELEGRAM_STREAM_FLUSH_RETRIES = int(os.getenv('TELEGRAM_STREAM_FLUSH_RETRIES', '5'))
+# Куда сбрасывать незаписанные пачки; бот дописывает их в поток при запуске
+TELEGRAM_STREAM_SPILL_DIR = os.getenv('TELEGRAM_STREAM_SPILL_DIR', str(BASE_DIR / 'spool' / 'stream'))
+
+# Параллельная обработка обновлений ботом: разные чаты одновременно, один чат — по порядку
+TELEGRAM_BOT_CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_BOT_CONCURRENT_UPDATES', '8'))
+# Потоков для обращений к БД из обработчиков (по умолчанию — по числу параллельных обновлений)
+TELEGRAM_BOT_DB_THREADS = int(os.getenv('TELEGRAM_BOT_DB_THREADS', '0')) or None
+
+# Время жизни кэша групп и допусков Telegram в процессе бота, сек
+TELEGRAM_BOT_CACHE_TTL = int(os.getenv('TELEGRAM_BOT_CACHE_TTL', '60'))
+# Сколько авторов сообщений (отправитель → пользователь или клиент) держать в кэше процесса
+TELEGRAM_AUTHOR_CACHE_SIZE = int(os.getenv('TELEGRAM_AUTHOR_CACHE_SIZE', '10000'))
+
+# Как часто перестраивать индекс маршрутов Telegram, даже если в этом процессе они не менялись, сек
+TELEGRAM_ROUTE_INDEX_TTL = int(os.getenv('TELEGRAM_ROUTE_INDEX_TTL', '300'))
+
+# Режим webhook (ASGI, /tickets/telegram/webhook/); регистрация: manage.py bot --set-webhook URL
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', '40'))
+# Сколько часов помнить принятые update_id
+TELEGRAM_WEBHOOK_DEDUP_HOURS = int(os.getenv('TELEGRAM_WEBHOOK_DEDUP_HOURS', '24'))
+# Пауза перед записью пачки потока в режиме webhook, мс: ответ Telegram ждёт записи сообщения
+TELEGRAM_WEBHOOK_STREAM_FLUSH_MS = int(os.getenv('TELEGRAM_WEBHOOK_STREAM_FLUSH_MS', '20'))
+
+# Очередь исходящих сообщений (manage.py telegram_outbox)
+TELEGRAM_OUTBOX_CONCURRENCY = int(os.getenv('TELEGRAM_OUTBOX_CONCURRENCY', '4'))
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_OUTBOX_MAX_ATTEMPTS', '8'))
+
+# Архив старых сообщений потока (manage.py archive_stream): каталог сегментов и возраст сообщений, дней
+TELEGRAM_ARCHIVE_DIR = os.getenv('TELEGRAM_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'telegram'))
+TELEGRAM_ARCHIVE_AFTER_DAYS = int(os.getenv('TELEGRAM_ARCHIVE_AFTER_DAYS', '90'))
+
+# Фоновые выгрузки аналитики (manage.py export_worker)
+EXPORT_WORKER_PROCESSES = int(os.getenv('EXPORT_WORKER_PROCESSES', '2'))
+# Сколько дней хранить готовые файлы выгрузок
+EXPORT_KEEP_DAYS = int(os.getenv('EXPORT_KEEP_DAYS', '7'))
+
 # Logging configuration
 LOGGING = {
     'version': 1,